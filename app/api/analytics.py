@@ -1,34 +1,83 @@
-from fastapi import APIRouter, Depends
-from fastapi.responses import FileResponse, JSONResponse
-from sqlalchemy.orm import Session
-from collections import defaultdict
+from datetime import date
+from typing import Literal, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import FileResponse, StreamingResponse
+import logging
 import os
 
-from app.database import SessionLocal
-from app.models.prediction_record import PredictionRecord
+from app.services.analytics_service import AnalyticsService
+from app.services.export_service import ExportService
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+analytics_service = AnalyticsService()
+export_service = ExportService()
+
+_EXPORT_MEDIA_TYPES = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
 
 # Serve the chart HTML
 @router.get("/trends")
 def get_trends_page():
     return FileResponse(os.path.join("frontend", "trendchart.html"))
 
+
 # Serve JSON data
 @router.get("/trends/data")
-def get_trends_data(db: Session = Depends(get_db)):
-    records = db.query(PredictionRecord).all()
-    
-    trends = defaultdict(lambda: defaultdict(int))
-    for r in records:
-        day = r.timestamp.date().isoformat()
-        trends[day][r.disease] += 1
-
-    return JSONResponse(trends)
+def get_trends_data(
+    start: Optional[date] = Query(None, alias="from", description="First day to include (YYYY-MM-DD)"),
+    end: Optional[date] = Query(None, alias="to", description="Last day to include (YYYY-MM-DD)"),
+    granularity: Literal["day", "week", "month"] = "day",
+):
+    """
+    Prediction counts per diagnosis, aggregated in SQL over an optional date range.
+    Long ranges are automatically downsampled to a coarser granularity; ranges longer
+    than ANALYTICS_MAX_POINTS months are rejected.
+    """
+    if start and end and start > end:
+        raise HTTPException(status_code=400, detail="'from' must be on or before 'to'.")
+
+    logger.info(f"Analytics trend data requested: from={start} to={end} granularity={granularity}")
+    try:
+        return analytics_service.get_trends(start, end, granularity)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        logger.error(f"Service Error: {e}")
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error fetching analytics trends: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Could not fetch trend data.")
+
+
+@router.get("/export/{table}")
+def export_table(
+    table: Literal["predictions", "chatbot_queries"],
+    format: Literal["csv", "parquet"] = "csv",
+    start: Optional[date] = Query(None, alias="from", description="First day to include (YYYY-MM-DD)"),
+    end: Optional[date] = Query(None, alias="to", description="Last day to include (YYYY-MM-DD)"),
+):
+    """
+    Streams a table as CSV or Parquet for offline analysis.
+    Rows are read in fixed-size pages, so memory use is constant regardless of table size.
+    """
+    if start and end and start > end:
+        raise HTTPException(status_code=400, detail="'from' must be on or before 'to'.")
+
+    if format == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise HTTPException(status_code=501, detail="Parquet export requires pyarrow to be installed.")
+        content = export_service.stream_parquet(table, start, end)
+    else:
+        content = export_service.stream_csv(table, start, end)
+
+    logger.info(f"Exporting '{table}' as {format}: from={start} to={end}")
+    filename = f"{table}.{format}"
+    return StreamingResponse(
+        content,
+        media_type=_EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -1,7 +1,9 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from app.core.schemas import ChatRequest, ChatResponse, SummarizeRequest, SummarizeResponse
 from app.services.chatbot_service import ChatbotService
 import logging
+import math
 
 # Initialize the router and logger
 router = APIRouter()
@@ -14,6 +16,11 @@ except Exception as e:
     logger.error(f"FATAL: Failed to initialize ChatbotService on startup: {e}", exc_info=True)
     chatbot_service = None
 
+def _retry_after(error: Exception) -> dict:
+    """Retry-After header for errors that know when the LLM backend is worth retrying."""
+    retry_after = getattr(error, "retry_after", None)
+    return {"Retry-After": str(math.ceil(retry_after))} if retry_after else None
+
 @router.post("/chat", response_model=ChatResponse)
 async def handle_chat(request: ChatRequest):
     """
@@ -24,8 +31,15 @@ async def handle_chat(request: ChatRequest):
     
     logger.info(f"Received chat request: '{request.question}'")
     try:
-        result = chatbot_service.get_chat_response(request.question, request.chat_history)
+        # The chain blocks on Gemini and Pinecone; keep the event loop free for other requests
+        result = await run_in_threadpool(chatbot_service.get_chat_response, request.question, request.chat_history)
         return ChatResponse(answer=result['answer'])
+    except RuntimeError as e:
+        logger.error(f"Service Error: {e}")
+        raise HTTPException(status_code=503, detail=str(e), headers=_retry_after(e))
+    except ValueError as e:
+        logger.warning(f"Invalid chat request: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error in chat endpoint: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="An error occurred while processing the chat request.")
@@ -40,8 +54,16 @@ async def handle_summarize(request: SummarizeRequest):
     
     logger.info("Received summarization request.")
     try:
-        result = chatbot_service.get_summary(pdf_base64=request.pdf_base64, raw_text=request.raw_text)
+        result = await run_in_threadpool(
+            chatbot_service.get_summary, pdf_base64=request.pdf_base64, raw_text=request.raw_text
+        )
         return SummarizeResponse(summary=result['output_text'])
+    except RuntimeError as e:
+        logger.error(f"Service Error: {e}")
+        raise HTTPException(status_code=503, detail=str(e), headers=_retry_after(e))
+    except ValueError as e:
+        logger.warning(f"Invalid summarize request: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error in summarize endpoint: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="An error occurred during summarization.")
@@ -58,6 +80,9 @@ def get_common_queries():
     try:
         topics = chatbot_service.get_query_topics()
         return topics
+    except RuntimeError as e:
+        logger.error(f"Service Error: {e}")
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching query topics: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Could not fetch query topic data.")
\ No newline at end of file
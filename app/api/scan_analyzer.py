@@ -1,8 +1,19 @@
-from fastapi import APIRouter, HTTPException
+import json
+from fastapi import APIRouter, File, HTTPException, Request, UploadFile
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from app.core.schemas import (
     ScanAnalysisRequest,
     ScanAnalysisResponse,
-)  
+)
+from app.core.config import BULK_MAX_FILES, BULK_MAX_UPLOAD_BYTES, MAX_UPLOAD_BYTES
+from app.core.uploads import (
+    UploadTooLargeError,
+    iter_upload_files,
+    iter_zip_images,
+    read_stream_limited,
+    read_upload_file,
+)
 from app.services.image_service import ImageService
 import logging
 
@@ -12,14 +23,10 @@ logger = logging.getLogger(__name__)
 image_service = ImageService()
 
 
-@router.post("/", response_model=ScanAnalysisResponse)
-async def analyze_scan(request: ScanAnalysisRequest):
-    """
-    Takes a Base64 encoded image and returns an AI-powered analysis.
-    """
-    logger.info("Received request for image analysis.")
+async def _run_analysis(analysis) -> ScanAnalysisResponse:
+    """Awaits an ImageService analysis and maps service errors to HTTP errors."""
     try:
-        prediction, confidence = await image_service.analyze(request.image_base64)
+        prediction, confidence = await analysis
         return ScanAnalysisResponse(
             predicted_condition=prediction, confidence_score=confidence
         )
@@ -35,3 +42,111 @@ async def analyze_scan(request: ScanAnalysisRequest):
             status_code=500,
             detail="An internal server error occurred during image analysis.",
         )
+
+
+@router.post("/", response_model=ScanAnalysisResponse)
+async def analyze_scan(request: ScanAnalysisRequest):
+    """
+    Takes a Base64 encoded image and returns an AI-powered analysis.
+    """
+    logger.info("Received request for image analysis.")
+    return await _run_analysis(image_service.analyze(request.image_base64))
+
+
+@router.post("/upload", response_model=ScanAnalysisResponse)
+async def analyze_scan_upload(file: UploadFile = File(...)):
+    """
+    Takes a multipart/form-data image upload (field name "file") and returns an analysis.
+    Avoids the 33% base64 overhead of the JSON endpoint.
+    """
+    logger.info(f"Received multipart upload for image analysis: {file.filename}")
+    try:
+        image_buffer = await read_upload_file(file, limit=MAX_UPLOAD_BYTES)
+    except UploadTooLargeError as e:
+        logger.warning(f"Rejected upload: {e}")
+        raise HTTPException(status_code=413, detail=str(e))
+    finally:
+        await file.close()
+    return await _run_analysis(image_service.analyze_bytes(image_buffer))
+
+
+@router.post("/raw", response_model=ScanAnalysisResponse)
+async def analyze_scan_raw(request: Request):
+    """
+    Takes the raw image bytes as the request body (e.g. Content-Type: image/png)
+    and returns an analysis. The body is streamed in with a hard size limit.
+    """
+    logger.info("Received raw upload for image analysis.")
+    content_length = request.headers.get("content-length")
+    size_hint = int(content_length) if content_length and content_length.isdigit() else None
+    try:
+        image_buffer = await read_stream_limited(
+            request.stream(), limit=MAX_UPLOAD_BYTES, size_hint=size_hint
+        )
+    except UploadTooLargeError as e:
+        logger.warning(f"Rejected upload: {e}")
+        raise HTTPException(status_code=413, detail=str(e))
+    if not image_buffer:
+        raise HTTPException(status_code=400, detail="Request body is empty.")
+    return await _run_analysis(image_service.analyze_bytes(image_buffer))
+
+
+@router.post("/bulk")
+async def analyze_scans_bulk(request: Request):
+    """
+    Analyzes many images in one request and streams results back as NDJSON
+    (one JSON object per line, in completion order).
+
+    Accepts either a zip archive (raw body with Content-Type: application/zip,
+    or a single multipart file ending in .zip) or a multipart list of image files.
+    Each line is {"filename", "predicted_condition", "confidence_score"} or, for
+    files that fail validation, {"filename", "error"}.
+    """
+    if not image_service.is_ready():
+        raise HTTPException(
+            status_code=503,
+            detail="Image analysis model is not available. Check server startup logs for errors.",
+        )
+
+    content_type = request.headers.get("content-type", "")
+    form = None
+    try:
+        if content_type.startswith("multipart/form-data"):
+            form = await request.form(max_files=BULK_MAX_FILES)
+            uploads = [value for _, value in form.multi_items() if not isinstance(value, str)]
+            if not uploads:
+                raise ValueError("No files were uploaded.")
+            if len(uploads) == 1 and (uploads[0].filename or "").lower().endswith(".zip"):
+                archive = await read_upload_file(uploads[0], limit=BULK_MAX_UPLOAD_BYTES)
+                images = iter_zip_images(archive, max_files=BULK_MAX_FILES)
+            else:
+                images = iter_upload_files(uploads)
+        else:
+            content_length = request.headers.get("content-length")
+            size_hint = int(content_length) if content_length and content_length.isdigit() else None
+            archive = await read_stream_limited(
+                request.stream(), limit=BULK_MAX_UPLOAD_BYTES, size_hint=size_hint
+            )
+            images = iter_zip_images(archive, max_files=BULK_MAX_FILES)
+    except UploadTooLargeError as e:
+        logger.warning(f"Rejected bulk upload: {e}")
+        if form is not None:
+            await form.close()
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        logger.warning(f"Invalid bulk upload: {e}")
+        if form is not None:
+            await form.close()
+        raise HTTPException(status_code=400, detail=str(e))
+
+    logger.info("Received bulk image analysis request.")
+
+    async def _ndjson():
+        async for result in image_service.analyze_many(images):
+            yield json.dumps(result) + "\n"
+
+    return StreamingResponse(
+        _ndjson(),
+        media_type="application/x-ndjson",
+        background=BackgroundTask(form.close) if form is not None else None,
+    )
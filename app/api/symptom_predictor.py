@@ -38,6 +38,9 @@ def get_prediction_trends():
     try:
         trends = prediction_service.get_trends()
         return trends
+    except RuntimeError as e:
+        logger.error(f"Service Error: {e}")
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching trends: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Could not fetch trend data.")
@@ -0,0 +1,202 @@
+"""
+Admission control for the expensive endpoints (CNN analysis, RAG chat, summarization).
+
+Each limited route gets a RouteLimiter: at most `concurrency` requests run at once, up to
+`queue_size` more wait in FIFO order, and everything else is rejected straight away instead of
+piling up inside TensorFlow or Gemini calls:
+
+- queue full                                      -> 429 Too Many Requests
+- no slot within the request's deadline, or the
+  expected wait plus service time exceeds it       -> 503 Service Unavailable
+
+Both carry Retry-After, estimated from the queue length and the observed service time.
+Limits are per worker process; cheap endpoints (/predict, /analytics, ...) are never queued.
+"""
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from dataclasses import dataclass
+
+from starlette.responses import JSONResponse
+
+from app.core.config import (
+    ADMISSION_ANALYZE_CONCURRENCY,
+    ADMISSION_ANALYZE_DEADLINE_SECONDS,
+    ADMISSION_ANALYZE_QUEUE,
+    ADMISSION_CHAT_CONCURRENCY,
+    ADMISSION_CHAT_DEADLINE_SECONDS,
+    ADMISSION_CHAT_QUEUE,
+    ADMISSION_SUMMARIZE_CONCURRENCY,
+    ADMISSION_SUMMARIZE_DEADLINE_SECONDS,
+    ADMISSION_SUMMARIZE_QUEUE,
+)
+from app.core.metrics import ADMISSION_REJECTIONS, QUEUE_DEPTH
+
+logger = logging.getLogger(__name__)
+
+# Weight of the newest sample in the service-time moving average
+_EWMA_ALPHA = 0.2
+
+
+@dataclass(frozen=True)
+class RouteLimit:
+    """Limits for one group of routes, matched by exact request path."""
+    name: str
+    paths: tuple
+    concurrency: int
+    queue_size: int
+    deadline_seconds: float
+
+
+# /analyze/bulk is not listed: it streams for as long as the archive takes and is bounded by
+# its own process pool (BULK_WORKERS), so it would only distort the analyze service time.
+DEFAULT_LIMITS = (
+    RouteLimit(
+        "analyze", ("/analyze/", "/analyze/upload", "/analyze/raw"),
+        ADMISSION_ANALYZE_CONCURRENCY, ADMISSION_ANALYZE_QUEUE, ADMISSION_ANALYZE_DEADLINE_SECONDS,
+    ),
+    RouteLimit(
+        "chat", ("/assistant/chat",),
+        ADMISSION_CHAT_CONCURRENCY, ADMISSION_CHAT_QUEUE, ADMISSION_CHAT_DEADLINE_SECONDS,
+    ),
+    RouteLimit(
+        "summarize", ("/assistant/summarize",),
+        ADMISSION_SUMMARIZE_CONCURRENCY, ADMISSION_SUMMARIZE_QUEUE, ADMISSION_SUMMARIZE_DEADLINE_SECONDS,
+    ),
+)
+
+
+class AdmissionRejected(Exception):
+    """Raised by RouteLimiter.acquire when a request is shed."""
+
+    def __init__(self, status_code: int, reason: str, retry_after: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+        self.detail = detail
+
+
+class RouteLimiter:
+    """
+    Concurrency limit with a bounded FIFO wait queue. A released slot is handed directly to
+    the oldest waiter, so queued requests cannot be overtaken by new arrivals.
+    """
+
+    def __init__(self, limit: RouteLimit):
+        self.limit = limit
+        self.in_flight = 0
+        self._waiters = deque()
+        # Moving average of how long an admitted request holds its slot (seconds)
+        self.service_time = 0.0
+        self._in_flight_gauge = QUEUE_DEPTH.labels(queue=f"admission_{limit.name}_in_flight")
+        self._waiting_gauge = QUEUE_DEPTH.labels(queue=f"admission_{limit.name}_waiting")
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        """Seconds until the current backlog is expected to clear (at least 1)."""
+        backlog = (self.waiting + 1) * self.service_time / self.limit.concurrency
+        return max(1, math.ceil(backlog))
+
+    def _reject(self, status_code: int, reason: str, detail: str):
+        ADMISSION_REJECTIONS.labels(route=self.limit.name, reason=reason).inc()
+        retry_after = self.retry_after()
+        logger.warning(
+            f"Admission control rejected a {self.limit.name} request ({reason}): "
+            f"{self.in_flight} in flight, {self.waiting} waiting, retry after {retry_after}s"
+        )
+        raise AdmissionRejected(status_code, reason, retry_after, detail)
+
+    async def acquire(self, arrived_at: float):
+        """Waits for a slot; raises AdmissionRejected if the request should be shed instead."""
+        if self.in_flight < self.limit.concurrency and not self._waiters:
+            self._admit()
+            return
+        if self.waiting >= self.limit.queue_size:
+            self._reject(429, "queue_full", "Server is busy. Please retry later.")
+
+        remaining = arrived_at + self.limit.deadline_seconds - time.monotonic()
+        rounds = math.ceil((self.waiting + 1) / self.limit.concurrency)
+        if remaining <= 0 or (rounds + 1) * self.service_time > remaining:
+            self._reject(503, "deadline", "Server is overloaded. Please retry later.")
+
+        slot = asyncio.get_running_loop().create_future()
+        self._waiters.append(slot)
+        self._waiting_gauge.inc()
+        try:
+            await asyncio.wait_for(asyncio.shield(slot), timeout=remaining)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if slot.done():
+                # The slot was handed over just as we gave up: pass it on
+                self._release_slot()
+            else:
+                slot.cancel()
+                self._waiters.remove(slot)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self._reject(503, "deadline", "Server is overloaded. Please retry later.")
+        finally:
+            self._waiting_gauge.dec()
+        self._in_flight_gauge.inc()
+
+    def _admit(self):
+        self.in_flight += 1
+        self._in_flight_gauge.inc()
+
+    def release(self, admitted_at: float):
+        """Returns the slot and records how long it was held."""
+        held = time.monotonic() - admitted_at
+        self.service_time += _EWMA_ALPHA * (held - self.service_time) if self.service_time else held
+        self._in_flight_gauge.dec()
+        self._release_slot()
+
+    def _release_slot(self):
+        while self._waiters:
+            slot = self._waiters.popleft()
+            if not slot.done():
+                slot.set_result(None)  # in_flight is unchanged: the slot changes hands
+                return
+        self.in_flight -= 1
+
+
+class AdmissionControlMiddleware:
+    """
+    ASGI middleware applying RouteLimiters by request path. The slot is held until the
+    response has been fully sent, so streamed responses count for their whole duration.
+    """
+
+    def __init__(self, app, limits=DEFAULT_LIMITS):
+        self.app = app
+        self.limiters = {}
+        for limit in limits:
+            if limit.concurrency <= 0:
+                continue
+            limiter = RouteLimiter(limit)
+            for path in limit.paths:
+                self.limiters[path] = limiter
+
+    async def __call__(self, scope, receive, send):
+        limiter = self.limiters.get(scope["path"]) if scope["type"] == "http" else None
+        if limiter is None or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await limiter.acquire(time.monotonic())
+        except AdmissionRejected as e:
+            response = JSONResponse(
+                {"detail": e.detail}, status_code=e.status_code, headers={"Retry-After": str(e.retry_after)}
+            )
+            await response(scope, receive, send)
+            return
+
+        admitted_at = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release(admitted_at)
@@ -0,0 +1,155 @@
+"""
+Runtime settings for the API.
+Every value can be overridden with an environment variable of the same name.
+"""
+import os
+
+# --- Symptom normalization ---
+# Minimum difflib similarity (0-1) for matching a misspelled symptom to the vocabulary when no
+# exact or alias match exists; 1 disables fuzzy matching.
+SYMPTOM_FUZZY_CUTOFF = float(os.getenv("SYMPTOM_FUZZY_CUTOFF", "0.85"))
+
+# --- Scan Analyzer uploads ---
+# Largest X-ray accepted by the raw/multipart upload endpoints (bytes).
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+# Chunk size used when streaming an upload body into memory.
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(256 * 1024)))
+
+# --- Bulk scan analysis ---
+# Maximum number of images accepted in one bulk request (zip entries or multipart files).
+BULK_MAX_FILES = int(os.getenv("BULK_MAX_FILES", "500"))
+# Largest zip archive accepted by the bulk endpoint (bytes).
+BULK_MAX_UPLOAD_BYTES = int(os.getenv("BULK_MAX_UPLOAD_BYTES", str(512 * 1024 * 1024)))
+# Worker processes used to decode and validate bulk images.
+BULK_WORKERS = int(os.getenv("BULK_WORKERS", str(os.cpu_count() or 1)))
+# Number of images sent to the CNN in one predict call.
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "32"))
+
+# --- CNN inference ---
+# TensorFlow intra-op threads per process. Defaults to the CPU count split across gunicorn
+# workers, so workers don't oversubscribe the cores (0 lets TensorFlow decide).
+TF_INTRA_OP_THREADS = int(os.getenv(
+    "TF_INTRA_OP_THREADS", str(max(1, (os.cpu_count() or 1) // int(os.getenv("WEB_CONCURRENCY", "1"))))
+))
+# TensorFlow inter-op threads (independent ops run in parallel; the CNN is a single chain).
+TF_INTER_OP_THREADS = int(os.getenv("TF_INTER_OP_THREADS", "1"))
+# Load the CNN in each worker after fork instead of at import (set by gunicorn.conf.py:
+# TensorFlow's runtime hangs if it is initialized in the parent and used in a forked child).
+CNN_LOAD_AFTER_FORK = os.getenv("CNN_LOAD_AFTER_FORK", "false").lower() in ("1", "true", "yes")
+# Run one dummy inference at load time so the first request doesn't pay for graph tracing.
+CNN_WARMUP = os.getenv("CNN_WARMUP", "true").lower() in ("1", "true", "yes")
+
+# --- Embeddings ---
+# "huggingface" (sentence-transformers on PyTorch) or "onnx" (int8-quantized ONNX export of the
+# same MiniLM model, run with onnxruntime; PyTorch is never imported).
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "huggingface").lower()
+# Output of `python -m app.services.onnx_embeddings` (model_quantized.onnx + tokenizer.json).
+ONNX_EMBEDDING_DIR = os.getenv("ONNX_EMBEDDING_DIR", os.path.join("ml_models", "minilm-onnx"))
+# Texts per ONNX inference call when embedding documents.
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+# onnxruntime intra-op threads per process (same per-worker share as TensorFlow by default).
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", str(TF_INTRA_OP_THREADS)))
+
+# --- Image result cache ---
+# Maximum cached X-ray results (0 disables the cache).
+IMAGE_CACHE_MAX_ENTRIES = int(os.getenv("IMAGE_CACHE_MAX_ENTRIES", "4096"))
+# Upper bound on the memory held by the cache (bytes).
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(4 * 1024 * 1024)))
+# Also match re-encoded copies of an image by perceptual hash (off by default: distinct
+# scans that look alike could share a result).
+IMAGE_CACHE_PERCEPTUAL = os.getenv("IMAGE_CACHE_PERCEPTUAL", "false").lower() in ("1", "true", "yes")
+# Perceptual hash grid size; the hash has size*size bits.
+IMAGE_CACHE_HASH_SIZE = int(os.getenv("IMAGE_CACHE_HASH_SIZE", "16"))
+
+# --- Analytics ---
+# Above this many points per series, trend queries switch to a coarser granularity.
+ANALYTICS_MAX_POINTS = int(os.getenv("ANALYTICS_MAX_POINTS", "400"))
+# Rows per page (and per Parquet row group) when streaming table exports.
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "10000"))
+
+# --- Storage ---
+# SQLite database file shared by predictions, chatbot queries and analytics.
+DB_PATH = os.getenv("DB_PATH", "predictions.db")
+# Read-only connections kept open per process (writes share one serialized connection).
+STORAGE_READERS = int(os.getenv("STORAGE_READERS", "4"))
+# How long a read waits for a pooled connection when all are in use before failing with a 503.
+STORAGE_READER_WAIT_SECONDS = float(os.getenv("STORAGE_READER_WAIT_SECONDS", "5"))
+# How long a connection waits on a locked database before raising (milliseconds).
+STORAGE_BUSY_TIMEOUT_MS = int(os.getenv("STORAGE_BUSY_TIMEOUT_MS", "5000"))
+# Seconds between database backups when a leader process owns them (multi-worker serving).
+DB_BACKUP_INTERVAL_SECONDS = float(os.getenv("DB_BACKUP_INTERVAL_SECONDS", "30"))
+# "eager" restores from GCS before the first service initializes; "lazy" restores on a background
+# thread while the models load, and database calls wait for it (see DB_RESTORE_WAIT_SECONDS).
+DB_RESTORE_MODE = os.getenv("DB_RESTORE_MODE", "eager").lower()
+# How long a database call waits for a lazy restore before failing (503).
+DB_RESTORE_WAIT_SECONDS = float(os.getenv("DB_RESTORE_WAIT_SECONDS", "30"))
+# Backups are stored as content-addressed blocks of this size; only changed blocks are uploaded,
+# and a restore only downloads blocks a local copy does not already have.
+GCS_BLOCK_SIZE_BYTES = int(os.getenv("GCS_BLOCK_SIZE_BYTES", str(1024 * 1024)))
+# Parallel block uploads/downloads per backup or restore.
+GCS_TRANSFER_THREADS = int(os.getenv("GCS_TRANSFER_THREADS", "8"))
+
+# --- Data retention ---
+# Raw prediction and chatbot query rows older than this many days are deleted by the compaction
+# job; their daily rollups (used by every chart) are kept. 0 (the default) keeps raw rows forever.
+# Once set, /analytics/export only covers this window: deleted rows cannot be exported.
+RETENTION_DAYS = int(os.getenv("RETENTION_DAYS", "0"))
+# Rows deleted per write transaction, so concurrent writers are only briefly blocked.
+RETENTION_DELETE_BATCH = int(os.getenv("RETENTION_DELETE_BATCH", "5000"))
+# Seconds between compaction runs in the backup leader process (0 disables the scheduled job).
+RETENTION_INTERVAL_SECONDS = float(os.getenv("RETENTION_INTERVAL_SECONDS", "86400"))
+
+# --- Admission control ---
+# Per-route limits for the expensive endpoints, per worker process. CONCURRENCY requests run at
+# once (0 disables the limit), up to QUEUE more wait for a slot (beyond that: 429), and a request
+# that cannot start within DEADLINE_SECONDS of arriving, or is not expected to finish by then
+# given the observed service time, is shed with 503. Rejections carry Retry-After.
+ADMISSION_ANALYZE_CONCURRENCY = int(os.getenv("ADMISSION_ANALYZE_CONCURRENCY", "2"))
+ADMISSION_ANALYZE_QUEUE = int(os.getenv("ADMISSION_ANALYZE_QUEUE", "16"))
+ADMISSION_ANALYZE_DEADLINE_SECONDS = float(os.getenv("ADMISSION_ANALYZE_DEADLINE_SECONDS", "30"))
+ADMISSION_CHAT_CONCURRENCY = int(os.getenv("ADMISSION_CHAT_CONCURRENCY", "8"))
+ADMISSION_CHAT_QUEUE = int(os.getenv("ADMISSION_CHAT_QUEUE", "32"))
+ADMISSION_CHAT_DEADLINE_SECONDS = float(os.getenv("ADMISSION_CHAT_DEADLINE_SECONDS", "60"))
+ADMISSION_SUMMARIZE_CONCURRENCY = int(os.getenv("ADMISSION_SUMMARIZE_CONCURRENCY", "2"))
+ADMISSION_SUMMARIZE_QUEUE = int(os.getenv("ADMISSION_SUMMARIZE_QUEUE", "8"))
+ADMISSION_SUMMARIZE_DEADLINE_SECONDS = float(os.getenv("ADMISSION_SUMMARIZE_DEADLINE_SECONDS", "120"))
+
+# --- LLM client ---
+# "gemini" (Google Generative AI) or "fake" (the local server in app/services/fake_llm.py).
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini").lower()
+# Where the fake LLM server listens when LLM_BACKEND=fake.
+FAKE_LLM_URL = os.getenv("FAKE_LLM_URL", "http://127.0.0.1:8089")
+# Time allowed for one LLM attempt (including a hedged duplicate) before it counts as failed.
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "20"))
+# Attempts per LLM call (1 disables retries); retries back off with full jitter.
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "3"))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "0.5"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "4"))
+# Send a duplicate request when the first has not answered within the recent p95 latency
+# (off by default: it adds up to ~5% extra LLM calls to cut the slowest ones).
+LLM_HEDGE = os.getenv("LLM_HEDGE", "false").lower() in ("1", "true", "yes")
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+# Never hedge earlier than this, and not before this many latencies have been observed.
+LLM_HEDGE_MIN_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", "0.5"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+# Consecutive failed attempts that open the circuit, and how long it stays open before a trial call.
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+# Build the LLM and Pinecone clients in each worker after fork instead of at import (set by
+# gunicorn.conf.py: gRPC channels and HTTP connection pools must not be shared across fork()).
+LLM_LOAD_AFTER_FORK = os.getenv("LLM_LOAD_AFTER_FORK", "false").lower() in ("1", "true", "yes")
+
+# --- Chat history compaction ---
+# Token budget for the whole RAG prompt (template, retrieved context, history and question).
+CHAT_PROMPT_TOKEN_BUDGET = int(os.getenv("CHAT_PROMPT_TOKEN_BUDGET", "3000"))
+# Part of the budget held back for the prompt template and the retrieved documents.
+CHAT_CONTEXT_RESERVE_TOKENS = int(os.getenv("CHAT_CONTEXT_RESERVE_TOKENS", "1200"))
+# Most recent turns kept verbatim (as far as they fit); older turns are folded into a summary.
+CHAT_RECENT_TURNS = int(os.getenv("CHAT_RECENT_TURNS", "4"))
+# Upper bound on the rolling summary of older turns.
+CHAT_SUMMARY_MAX_TOKENS = int(os.getenv("CHAT_SUMMARY_MAX_TOKENS", "300"))
+# Rolling summaries kept per process, keyed by the turns they cover.
+CHAT_SUMMARY_CACHE_SIZE = int(os.getenv("CHAT_SUMMARY_CACHE_SIZE", "1024"))
+# tiktoken encoding used to count tokens (an estimate for Gemini; ~4 characters per token
+# is assumed if the encoding cannot be loaded).
+CHAT_TOKEN_ENCODING = os.getenv("CHAT_TOKEN_ENCODING", "cl100k_base")
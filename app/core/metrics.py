@@ -0,0 +1,143 @@
+"""
+Prometheus metrics for the API, exposed at /metrics.
+
+- healthcare_stage_duration_seconds{stage}: latency histogram for every pipeline stage
+  (see STAGES), so tail latency can be attributed to decode, model, DB, GCS or LLM time.
+- healthcare_request_duration_seconds{method, route, status}: end-to-end request latency.
+- healthcare_errors_total{stage}: exceptions raised inside a tracked stage.
+- healthcare_cache_requests_total{cache, result}: cache hits and misses.
+- healthcare_queue_depth{queue}: work currently waiting or in flight.
+- healthcare_admission_rejections_total{route, reason}: requests shed by admission control.
+- healthcare_llm_requests_total{client, outcome}: LLM attempts, retries, hedges and failures.
+- healthcare_llm_circuit_open{client}: 1 while the LLM circuit breaker is open.
+- healthcare_model_loaded{model}: 1 if the model/chain loaded at startup, else 0.
+
+Under gunicorn (see gunicorn.conf.py) PROMETHEUS_MULTIPROC_DIR is set, every worker writes
+its samples there and /metrics aggregates all workers, whichever one serves the scrape.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# Stage names used with track_stage()
+STAGES = (
+    "base64_decode",
+    "image_validation",
+    "preprocessing",
+    "cnn_predict",
+    "cnn_warmup",
+    "feature_assembly",
+    "sklearn_predict",
+    "sqlite_insert",
+    "gcs_upload",
+    "gcs_download",
+    "topic_extraction_llm",
+    "condense_question_llm",
+    "history_summary_llm",
+    "retrieval",
+    "generation",
+    "summarization",
+)
+
+# 1ms .. ~60s, dense enough around 10ms-2s where most stages live
+_LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75,
+    1.0, 2.5, 5.0, 7.5, 10.0, 30.0, 60.0,
+)
+
+STAGE_LATENCY = Histogram(
+    "healthcare_stage_duration_seconds",
+    "Time spent in each request-processing stage.",
+    ["stage"],
+    buckets=_LATENCY_BUCKETS,
+)
+REQUEST_LATENCY = Histogram(
+    "healthcare_request_duration_seconds",
+    "End-to-end HTTP request latency.",
+    ["method", "route", "status"],
+    buckets=_LATENCY_BUCKETS,
+)
+ERRORS = Counter(
+    "healthcare_errors_total",
+    "Exceptions raised inside a tracked stage.",
+    ["stage"],
+)
+CACHE_REQUESTS = Counter(
+    "healthcare_cache_requests_total",
+    "Cache lookups by result (hit or miss).",
+    ["cache", "result"],
+)
+QUEUE_DEPTH = Gauge(
+    "healthcare_queue_depth",
+    "Work items currently queued or in flight.",
+    ["queue"],
+    multiprocess_mode="livesum",
+)
+ADMISSION_REJECTIONS = Counter(
+    "healthcare_admission_rejections_total",
+    "Requests rejected by admission control (queue_full -> 429, deadline -> 503).",
+    ["route", "reason"],
+)
+LLM_REQUESTS = Counter(
+    "healthcare_llm_requests_total",
+    "LLM client events: success, error, timeout, retry, hedge, circuit_open.",
+    ["client", "outcome"],
+)
+LLM_CIRCUIT_OPEN = Gauge(
+    "healthcare_llm_circuit_open",
+    "1 while the LLM circuit breaker rejects calls, else 0.",
+    ["client"],
+    multiprocess_mode="max",
+)
+MODEL_LOADED = Gauge(
+    "healthcare_model_loaded",
+    "1 if the model or chain loaded successfully, else 0.",
+    ["model"],
+    multiprocess_mode="max",
+)
+
+
+@contextmanager
+def track_stage(stage: str):
+    """Times the enclosed block into STAGE_LATENCY and counts exceptions in ERRORS."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        ERRORS.labels(stage=stage).inc()
+        raise
+    finally:
+        STAGE_LATENCY.labels(stage=stage).observe(time.perf_counter() - start)
+
+
+def observe_stage(stage: str, seconds: float):
+    """Records a stage duration measured elsewhere (e.g. by a callback)."""
+    STAGE_LATENCY.labels(stage=stage).observe(seconds)
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.labels(cache=cache, result="hit" if hit else "miss").inc()
+
+
+def set_model_loaded(model: str, loaded: bool):
+    MODEL_LOADED.labels(model=model).set(1 if loaded else 0)
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """Returns the Prometheus text exposition and its content type."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,113 @@
+"""
+Helpers for reading binary uploads straight off the wire.
+Bodies are streamed into a single buffer with a hard size limit and handed
+on as a memoryview, so no base64 or JSON copies are ever made.
+"""
+import os
+import zipfile
+import zlib
+from typing import AsyncIterator, Iterator, Optional
+
+from fastapi import UploadFile
+
+from app.core.config import MAX_UPLOAD_BYTES, UPLOAD_CHUNK_BYTES
+from app.services.image_validator import BufferReader
+
+
+class UploadTooLargeError(ValueError):
+    """Raised when an upload exceeds the configured size limit."""
+
+    def __init__(self, limit: int):
+        super().__init__(f"Upload too large. Maximum size: {limit} bytes")
+        self.limit = limit
+
+
+async def read_stream_limited(
+    chunks: AsyncIterator[bytes],
+    limit: int = MAX_UPLOAD_BYTES,
+    size_hint: Optional[int] = None,
+) -> memoryview:
+    """
+    Reads an async byte stream into one buffer, enforcing `limit`.
+    A declared size (`size_hint`) over the limit is rejected before anything is read. It is
+    not used to preallocate: the client controls it, so memory only grows with bytes received.
+    """
+    if size_hint is not None and size_hint > limit:
+        raise UploadTooLargeError(limit)
+
+    buffer = bytearray()
+    async for chunk in chunks:
+        if len(buffer) + len(chunk) > limit:
+            raise UploadTooLargeError(limit)
+        buffer += chunk
+    return memoryview(buffer)
+
+
+async def read_upload_file(upload: UploadFile, limit: int = MAX_UPLOAD_BYTES) -> memoryview:
+    """Reads a multipart `UploadFile` in fixed-size chunks, enforcing `limit`."""
+
+    async def _chunks():
+        while True:
+            chunk = await upload.read(UPLOAD_CHUNK_BYTES)
+            if not chunk:
+                break
+            yield chunk
+
+    return await read_stream_limited(_chunks(), limit=limit, size_hint=upload.size)
+
+
+def iter_zip_images(buffer, max_files: int, max_entry_bytes: int = MAX_UPLOAD_BYTES) -> Iterator[tuple]:
+    """
+    Lazily yields (name, bytes) for every file in a zip archive held in memory.
+    Entries larger than `max_entry_bytes` yield an UploadTooLargeError instead of bytes, and
+    entries that cannot be extracted (corrupt, encrypted, unsupported compression) a ValueError.
+    Raises ValueError if the archive is invalid or holds more than `max_files` files.
+    """
+    try:
+        archive = zipfile.ZipFile(BufferReader(buffer))
+    except zipfile.BadZipFile as e:
+        raise ValueError(f"Invalid zip archive: {e}")
+
+    entries = [
+        info for info in archive.infolist()
+        if not info.is_dir()
+        and not info.filename.startswith("__MACOSX/")
+        and not os.path.basename(info.filename).startswith(".")
+    ]
+    if len(entries) > max_files:
+        archive.close()
+        raise ValueError(f"Too many files in archive. Maximum: {max_files}")
+
+    def _entries():
+        with archive:
+            for info in entries:
+                if info.file_size > max_entry_bytes:
+                    yield info.filename, UploadTooLargeError(max_entry_bytes)
+                    continue
+                try:
+                    data = archive.read(info)
+                except (zipfile.BadZipFile, zlib.error, RuntimeError, NotImplementedError, EOFError) as e:
+                    # RuntimeError: encrypted entry; NotImplementedError: unsupported compression method
+                    yield info.filename, ValueError(f"Could not extract file from archive: {e}")
+                    continue
+                yield info.filename, data
+
+    return _entries()
+
+
+def iter_upload_files(uploads: list, max_entry_bytes: int = MAX_UPLOAD_BYTES) -> Iterator[tuple]:
+    """
+    Lazily yields (name, bytes) for a list of multipart `UploadFile`s.
+    Files larger than `max_entry_bytes` yield an UploadTooLargeError instead of bytes.
+    """
+    for upload in uploads:
+        if upload.size is not None and upload.size > max_entry_bytes:
+            yield upload.filename, UploadTooLargeError(max_entry_bytes)
+            continue
+        # The spooled file is already local (memory or temp file), so a plain read is cheap
+        upload.file.seek(0)
+        data = upload.file.read(max_entry_bytes + 1)
+        if len(data) > max_entry_bytes:
+            yield upload.filename, UploadTooLargeError(max_entry_bytes)
+        else:
+            yield upload.filename, data
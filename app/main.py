@@ -1,11 +1,14 @@
 import logging
-from fastapi import FastAPI
+import time
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 
 load_dotenv()
 
-from app.api import symptom_predictor, scan_analyzer, health_assistant 
+from app.api import symptom_predictor, scan_analyzer, health_assistant, analytics
+from app.core.admission import AdmissionControlMiddleware
+from app.core.metrics import REQUEST_LATENCY, render_metrics
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
@@ -29,6 +32,9 @@ origins = [
     "null"
 ]
 
+# Added first so it runs inside CORS: 429/503 rejections still carry CORS headers
+app.add_middleware(AdmissionControlMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -37,14 +43,41 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    """Records end-to-end latency per route template (not raw path, to keep label cardinality bounded)."""
+    start = time.perf_counter()
+    status = "500"
+    try:
+        response = await call_next(request)
+        status = str(response.status_code)
+        return response
+    finally:
+        route = request.scope.get("route")
+        REQUEST_LATENCY.labels(
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=status,
+        ).observe(time.perf_counter() - start)
+
+
 # API Routers (Prefixes are correct as they are)
 app.include_router(
     symptom_predictor.router, prefix="/predict", tags=["Symptom Predictor"]
 )
 app.include_router(scan_analyzer.router, prefix="/analyze", tags=["Scan Analyzer"])
 app.include_router(health_assistant.router, prefix="/assistant", tags=["AI Assistant"])
+app.include_router(analytics.router, prefix="/analytics", tags=["Analytics"])
 
 @app.get("/", tags=["Health Check"])
 def read_root():
     logger.info("Health check endpoint was called.")
-    return {"status": "ok", "message": "Welcome to the Healthcare AI API!"}
\ No newline at end of file
+    return {"status": "ok", "message": "Welcome to the Healthcare AI API!"}
+
+
+@app.get("/metrics", tags=["Health Check"], include_in_schema=False)
+def metrics():
+    """Prometheus scrape endpoint with per-stage latency histograms, counters and gauges."""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
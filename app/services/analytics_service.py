@@ -0,0 +1,149 @@
+import logging
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+from app.core.config import ANALYTICS_MAX_POINTS
+from app.services.prediction_service import DEFAULT_COLOR, DIAGNOSIS_COLORS
+from app.services.storage import Storage, get_storage
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = ("day", "week", "month")
+
+# SQL expressions mapping a 'YYYY-MM-DD' day to its bucket start. Weeks start on Monday.
+_BUCKET_SQL = {
+    "day": "day",
+    "week": "date(day, '-6 days', 'weekday 1')",
+    "month": "substr(day, 1, 7) || '-01'",
+}
+
+
+def bucket_start(day: date, granularity: str) -> date:
+    """Returns the first day of the bucket containing `day`."""
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(start: date, granularity: str) -> date:
+    """Returns the first day of the bucket after the one starting at `start`."""
+    if granularity == "week":
+        return start + timedelta(days=7)
+    if granularity == "month":
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def count_buckets(start: date, end: date, granularity: str) -> int:
+    """Number of buckets needed to cover [start, end] at `granularity`."""
+    if granularity == "week":
+        return (bucket_start(end, "week") - bucket_start(start, "week")).days // 7 + 1
+    if granularity == "month":
+        return (end.year - start.year) * 12 + (end.month - start.month) + 1
+    return (end - start).days + 1
+
+
+def choose_granularity(start: date, end: date, requested: str, max_points: int = ANALYTICS_MAX_POINTS) -> str:
+    """
+    Coarsens `requested` until the range fits in `max_points` buckets.
+    Raises ValueError if it does not fit even by month, the coarsest granularity.
+    """
+    for granularity in GRANULARITIES[GRANULARITIES.index(requested):]:
+        if count_buckets(start, end, granularity) <= max_points:
+            return granularity
+    raise ValueError(f"Date range too long: at most {max_points} months can be charted.")
+
+
+class AnalyticsService:
+    """
+    Aggregates prediction counts in SQL for the analytics charts.
+    Queries read the `predictions_daily` rollup (at most one row per day and diagnosis,
+    maintained by an insert trigger; see storage migrations), so a multi-year range
+    costs about as much as a one-week view.
+    """
+
+    def __init__(self, storage: Optional[Storage] = None):
+        self._storage = storage
+
+    @property
+    def storage(self) -> Storage:
+        if self._storage is None:
+            self._storage = get_storage()
+        return self._storage
+
+    def _date_bounds(self, conn) -> tuple[Optional[date], Optional[date]]:
+        first, last = conn.execute("SELECT MIN(day), MAX(day) FROM predictions_daily").fetchone()
+        if first is None:
+            return None, None
+        return date.fromisoformat(first), date.fromisoformat(last)
+
+    def get_trends(
+        self,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        granularity: str = "day",
+        max_points: int = ANALYTICS_MAX_POINTS,
+    ) -> Dict:
+        """
+        Returns Chart.js-ready prediction counts per diagnosis between `start` and `end`
+        (inclusive, defaulting to the full history), bucketed by `granularity`.
+        If the range would exceed `max_points` buckets, a coarser granularity is used
+        and "downsampled" is set in the response; ranges longer than `max_points` months
+        raise ValueError.
+        """
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+
+        with self.storage.read() as conn:
+            if start is None or end is None:
+                first, last = self._date_bounds(conn)
+                start = start or first
+                end = end or last
+            if start is None or end is None or start > end:
+                return {"labels": [], "datasets": [], "granularity": granularity, "downsampled": False}
+
+            chosen = choose_granularity(start, end, granularity, max_points)
+            query = (
+                f"SELECT {_BUCKET_SQL[chosen]} AS bucket, diagnosis, SUM(count) "
+                "FROM predictions_daily WHERE day >= ? AND day <= ? "
+                "GROUP BY bucket, diagnosis"
+            )
+            rows = conn.execute(query, (start.isoformat(), end.isoformat())).fetchall()
+
+        logger.info(f"Aggregated {len(rows)} trend rows for {start}..{end} by {chosen}.")
+        return self._to_chart(rows, start, end, granularity, chosen)
+
+    def _to_chart(self, rows: List[tuple], start: date, end: date, requested: str, chosen: str) -> Dict:
+        # Step exactly once per bucket: stepping past `end` overflows near date.max (9999-12-31)
+        labels = []
+        bucket = bucket_start(start, chosen)
+        for i in range(count_buckets(start, end, chosen)):
+            if i:
+                bucket = next_bucket(bucket, chosen)
+            labels.append(bucket.isoformat())
+        positions = {label: i for i, label in enumerate(labels)}
+
+        series: Dict[str, List[int]] = {}
+        for bucket_label, diagnosis, count in rows:
+            values = series.setdefault(diagnosis, [0] * len(labels))
+            if bucket_label in positions:
+                values[positions[bucket_label]] += count
+
+        datasets = [
+            {
+                "label": diagnosis,
+                "data": series[diagnosis],
+                "borderColor": DIAGNOSIS_COLORS.get(diagnosis, DEFAULT_COLOR),
+                "fill": False,
+                "tension": 0.1,
+            }
+            for diagnosis in sorted(series)
+        ]
+        return {
+            "labels": labels,
+            "datasets": datasets,
+            "granularity": chosen,
+            "downsampled": chosen != requested,
+        }
@@ -3,118 +3,238 @@ import logging
 import base64
 import io
 import tempfile
-import sqlite3
+import time
 from datetime import datetime
-from typing import List, Dict
+from typing import Any, List, Dict, Optional
 import pandas as pd
 
-# Import GCS storage for data persistence
-from app.services.gcs_storage import restore_db_from_gcs, backup_db_to_gcs
+from app.core.config import EMBEDDING_BACKEND, FAKE_LLM_URL, LLM_BACKEND, LLM_LOAD_AFTER_FORK, LLM_TIMEOUT_SECONDS
+from app.services import fake_llm
+from app.services.history_compactor import HistoryCompactor
+from app.services.llm_client import ResilientLLMClient
+from app.services.storage import get_storage
+from app.core.metrics import ERRORS, observe_stage, set_model_loaded, track_stage
 
 # LangChain components
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_pinecone import PineconeVectorStore
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.chains import ConversationalRetrievalChain, load_summarize_chain
-from langchain.memory import ConversationBufferMemory
 from langchain.prompts import PromptTemplate
 from langchain.docstore.document import Document
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, get_buffer_string
+from langchain_core.outputs import ChatGeneration, ChatResult
 
-# Setup logger and database path
+# Setup logger
 logger = logging.getLogger(__name__)
-DB_PATH = "predictions.db"
+
+
+class _StageTimingHandler(BaseCallbackHandler):
+    """
+    Times the retrieval and LLM calls made inside the RAG chain (one handler per request).
+    LLM calls that start before retrieval are the condense-question step; later ones are generation.
+    """
+
+    def __init__(self):
+        self._starts = {}
+        self._retrieved = False
+
+    def _start(self, run_id, stage: str):
+        self._starts[run_id] = (stage, time.perf_counter())
+
+    def _finish(self, run_id, failed: bool = False):
+        stage, start = self._starts.pop(run_id, (None, None))
+        if stage is None:
+            return
+        observe_stage(stage, time.perf_counter() - start)
+        if failed:
+            ERRORS.labels(stage=stage).inc()
+
+    def on_retriever_start(self, serialized, query, *, run_id, **kwargs):
+        self._start(run_id, "retrieval")
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        self._retrieved = True
+        self._finish(run_id)
+
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, failed=True)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id, "generation" if self._retrieved else "condense_question_llm")
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._finish(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, failed=True)
+
+class ResilientChatModel(BaseChatModel):
+    """
+    Wraps a chat model so every call made by the chains goes through a ResilientLLMClient
+    (timeouts, jittered retries, hedging, circuit breaker). Callbacks fire once per logical
+    call on this wrapper, not per attempt, so stage timings include retries.
+    """
+
+    inner: BaseChatModel
+    client: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return f"resilient-{self.inner._llm_type}"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+        return self.client.call(self.inner._generate, messages, stop=stop, **kwargs)
+
+
+class FakeServerChatModel(BaseChatModel):
+    """Chat model backed by the local fake LLM server (LLM_BACKEND=fake)."""
+
+    url: str
+    timeout: float
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-llm-server"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+        text = fake_llm.generate(self.url, get_buffer_string(messages), timeout=self.timeout)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+
+def build_embeddings():
+    """
+    Query embeddings for the Pinecone retriever. Both backends produce the same MiniLM vectors;
+    the ONNX one avoids importing PyTorch (see app/services/onnx_embeddings.py).
+    """
+    if EMBEDDING_BACKEND == "onnx":
+        from app.services.onnx_embeddings import OnnxMiniLMEmbeddings
+
+        logger.info("Using the int8 ONNX MiniLM embedding backend.")
+        return OnnxMiniLMEmbeddings()
+    # Imported here so the ONNX backend never loads PyTorch
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    return HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+
+
+def build_chat_model() -> BaseChatModel:
+    """The configured LLM backend behind the resilience layer. The backend's own retries are off."""
+    if LLM_BACKEND == "fake":
+        logger.info(f"Using the fake LLM server at {FAKE_LLM_URL}.")
+        inner = FakeServerChatModel(url=FAKE_LLM_URL, timeout=LLM_TIMEOUT_SECONDS)
+    else:
+        inner = ChatGoogleGenerativeAI(
+            model="gemini-2.5-flash", temperature=0.3, timeout=LLM_TIMEOUT_SECONDS, max_retries=0
+        )
+    return ResilientChatModel(inner=inner, client=ResilientLLMClient(LLM_BACKEND))
+
 
 class ChatbotService:
     _qa_chain = None
     _summarize_chain = None
-    _db_connection = None
+    _storage = None
+    _embeddings = None
     _llm = None
+    _history_compactor = None
 
     def __init__(self):
         if ChatbotService._qa_chain is None:
-            logger.info("Initializing AI Assistant Service...")
+            if LLM_LOAD_AFTER_FORK:
+                # The embedding model is still loaded here, so workers share it copy-on-write
+                self._load_embeddings()
+                # gRPC (Gemini) and Pinecone's connection pools do not survive fork(): each
+                # worker builds its own clients
+                logger.info("Deferring LLM and Pinecone clients to the worker processes.")
+            else:
+                self.load_chains()
+
+        if ChatbotService._history_compactor is None:
+            ChatbotService._history_compactor = HistoryCompactor(self._summarize_history)
+
+        if ChatbotService._storage is None:
+            # 5. Shared storage (tables for BOTH charts are created by its migrations)
             try:
-                # 1. Initialize Embeddings and LLM
-                embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-                ChatbotService._llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0.3)
-                
-                # 2. Connect to Pinecone Vector Store
-                index_name = "medicalbotdata" 
-                vectorstore = PineconeVectorStore.from_existing_index(index_name, embeddings)
-                retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
-                logger.info(f"Successfully connected to Pinecone index '{index_name}'.")
-
-                # 3. Build the Conversational RAG Chain
-                memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True)
-                prompt_template = """You are a helpful and honest medical information assistant. Your task is to provide answers based on the provided context. You can also provide an answer based on your knowledge. Your answers should be clear and concise. Do not mention that you are getting the information from a provided text. IMPORTANT: Always end your response with a clear disclaimer: "This information is for educational purposes only. Please consult a healthcare professional for medical advice."
-                Context: {context}
-                Chat History: {chat_history}
-                Question: {question}
-                Helpful Answer:"""
-                PROMPT = PromptTemplate(template=prompt_template, input_variables=["chat_history", "context", "question"])
-                ChatbotService._qa_chain = ConversationalRetrievalChain.from_llm(llm=ChatbotService._llm, retriever=retriever, memory=memory, combine_docs_chain_kwargs={"prompt": PROMPT})
-                logger.info("Conversational RAG chain created successfully.")
-
-                # 4. Build the Summarization Chain
-                summary_prompt_template = """
-                You are an AI assistant that summarizes medical reports for patients in a friendly, simple paragraph.
-
-                **CRITICAL INSTRUCTIONS:**
-                1. BE EXTREMELY CONCISE. The entire summary must be a single, easy-to-read paragraph, no more than 4-5 sentences.
-                2. Address the user directly using "your report".
-                3. DO NOT use bullet points, lists, asterisks (*), or dashes (-). Write in plain paragraph format.
-                4. DO NOT include any personal details like age or gender.
-                5. Focus only on the most important findings that require discussion with a doctor.
-
-                Medical Text:
-                "{text}"
-
-                Concise, friendly, single-paragraph summary:
-                """
-                summary_prompt = PromptTemplate(template=summary_prompt_template, input_variables=["text"])
-                ChatbotService._summarize_chain = load_summarize_chain(llm=ChatbotService._llm, chain_type="stuff", prompt=summary_prompt)
-                logger.info("Summarization chain created successfully.")
-
-                # Restore database from GCS if available (for persistence across restarts)
-                restore_db_from_gcs()
-
-                # 5. Connect to Database and Create Tables for BOTH charts
-                ChatbotService._db_connection = sqlite3.connect(DB_PATH, check_same_thread=False)
-                cursor = ChatbotService._db_connection.cursor()
-                # Table for the trend chart
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS predictions (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        diagnosis TEXT NOT NULL,
-                        timestamp DATETIME NOT NULL
-                    )
-                """)
-                # Table for the common queries chart
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS chatbot_queries (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        topic TEXT NOT NULL,
-                        timestamp DATETIME NOT NULL
-                    )
-                """)
-                ChatbotService._db_connection.commit()
-                logger.info(f"Chatbot service connected to database and ensured tables exist.")
+                ChatbotService._storage = get_storage()
+                logger.info("Chatbot service connected to database.")
+            except Exception as e:
+                logger.error(f"CRITICAL ERROR: Could not open the database: {e}", exc_info=True)
 
+    def _load_embeddings(self):
+        if ChatbotService._embeddings is None:
+            try:
+                ChatbotService._embeddings = build_embeddings()
             except Exception as e:
-                logger.error(f"CRITICAL ERROR: Could not initialize AI Assistant services: {e}", exc_info=True)
+                logger.error(f"CRITICAL ERROR: Could not load the embedding model: {e}", exc_info=True)
+        return ChatbotService._embeddings
+
+    def load_chains(self):
+        """Builds the LLM client, connects to Pinecone and creates the RAG and summarization chains."""
+        logger.info("Initializing AI Assistant Service...")
+        try:
+            # 1. Initialize Embeddings and LLM
+            embeddings = self._load_embeddings()
+            if embeddings is None:
+                raise RuntimeError("Embedding model is not available.")
+            ChatbotService._llm = build_chat_model()
+            
+            # 2. Connect to Pinecone Vector Store
+            index_name = "medicalbotdata" 
+            vectorstore = PineconeVectorStore.from_existing_index(index_name, embeddings)
+            retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
+            logger.info(f"Successfully connected to Pinecone index '{index_name}'.")
+
+            # 3. Build the Conversational RAG Chain
+            # No chain memory: each request carries its own (compacted) history, and a shared
+            # buffer would grow without bound and mix conversations between users
+            prompt_template = """You are a helpful and honest medical information assistant. Your task is to provide answers based on the provided context. You can also provide an answer based on your knowledge. Your answers should be clear and concise. Do not mention that you are getting the information from a provided text. IMPORTANT: Always end your response with a clear disclaimer: "This information is for educational purposes only. Please consult a healthcare professional for medical advice."
+            Context: {context}
+            Chat History: {chat_history}
+            Question: {question}
+            Helpful Answer:"""
+            PROMPT = PromptTemplate(template=prompt_template, input_variables=["chat_history", "context", "question"])
+            ChatbotService._qa_chain = ConversationalRetrievalChain.from_llm(llm=ChatbotService._llm, retriever=retriever, combine_docs_chain_kwargs={"prompt": PROMPT})
+            logger.info("Conversational RAG chain created successfully.")
+
+            # 4. Build the Summarization Chain
+            summary_prompt_template = """
+            You are an AI assistant that summarizes medical reports for patients in a friendly, simple paragraph.
+
+            **CRITICAL INSTRUCTIONS:**
+            1. BE EXTREMELY CONCISE. The entire summary must be a single, easy-to-read paragraph, no more than 4-5 sentences.
+            2. Address the user directly using "your report".
+            3. DO NOT use bullet points, lists, asterisks (*), or dashes (-). Write in plain paragraph format.
+            4. DO NOT include any personal details like age or gender.
+            5. Focus only on the most important findings that require discussion with a doctor.
+
+            Medical Text:
+            "{text}"
+
+            Concise, friendly, single-paragraph summary:
+            """
+            summary_prompt = PromptTemplate(template=summary_prompt_template, input_variables=["text"])
+            ChatbotService._summarize_chain = load_summarize_chain(llm=ChatbotService._llm, chain_type="stuff", prompt=summary_prompt)
+            logger.info("Summarization chain created successfully.")
+
+        except Exception as e:
+            logger.error(f"CRITICAL ERROR: Could not initialize AI Assistant services: {e}", exc_info=True)
+
+        set_model_loaded("rag_chain", ChatbotService._qa_chain is not None)
+        set_model_loaded("summarize_chain", ChatbotService._summarize_chain is not None)
 
     def _save_query_topic(self, topic: str):
-        if self._db_connection is None: return
+        if self._storage is None: return
         try:
             timestamp = datetime.now()
-            cursor = self._db_connection.cursor()
-            cursor.execute("INSERT INTO chatbot_queries (topic, timestamp) VALUES (?, ?)", (topic, timestamp))
-            self._db_connection.commit()
+            with track_stage("sqlite_insert"):
+                with self._storage.write() as conn:
+                    conn.execute("INSERT INTO chatbot_queries (topic, timestamp) VALUES (?, ?)", (topic, timestamp))
             logger.info(f"Saved query topic '{topic}' to database.")
             
             # Backup to GCS after save for persistence
-            backup_db_to_gcs()
+            self._storage.backup_after_write()
         except Exception as e:
             logger.error(f"Failed to save query topic: {e}", exc_info=True)
             
@@ -123,19 +243,39 @@ class ChatbotService:
         try:
             extraction_prompt = PromptTemplate.from_template('Analyze the user question and extract the primary medical topic. Respond with ONLY the topic name or "None". Question: "{user_question}" Topic:')
             extraction_chain = extraction_prompt | self._llm
-            extracted_topic = extraction_chain.invoke({"user_question": question}).content
+            with track_stage("topic_extraction_llm"):
+                extracted_topic = extraction_chain.invoke({"user_question": question}).content
             if "none" in extracted_topic.lower(): return None
             return extracted_topic.strip().capitalize()
         except Exception as e:
             logger.error(f"Error during topic extraction: {e}")
             return None
 
+    def _summarize_history(self, previous_summary: str or None, turns: list) -> str:
+        """Folds older chat turns into the rolling summary used by the history compactor."""
+        if not self._llm: raise RuntimeError("LLM is not available.")
+        conversation = "\n".join(f"Human: {q}\nAssistant: {a}" for q, a in turns)
+        prompt = (
+            "Summarize this conversation between a patient and a medical information assistant in at most "
+            "5 sentences. Keep symptoms, conditions, medications and open questions; drop pleasantries.\n"
+            f"Summary so far: {previous_summary or '(none)'}\n"
+            f"New turns:\n{conversation}\n"
+            "Updated summary:"
+        )
+        with track_stage("history_summary_llm"):
+            return self._llm.invoke(prompt).content
+
     def get_chat_response(self, question: str, history: list) -> dict:
         if not self._qa_chain: raise RuntimeError("Conversational QA chain is not available.")
+        # First, so a malformed history is rejected (ValueError) before any LLM call
+        history = self._history_compactor.compact(history, question)
         topic = self._extract_topic_with_llm(question)
         if topic: self._save_query_topic(topic)
         logger.info(f"Invoking RAG chain with question: {question}")
-        return self._qa_chain.invoke({"question": question, "chat_history": history})
+        return self._qa_chain.invoke(
+            {"question": question, "chat_history": history},
+            config={"callbacks": [_StageTimingHandler()]},
+        )
 
     def get_summary(self, pdf_base64: str = None, raw_text: str = None) -> dict:
         if not self._summarize_chain: raise RuntimeError("Summarization chain is not available.")
@@ -155,14 +295,16 @@ class ChatbotService:
                 logger.error(f"Failed to process uploaded PDF: {e}")
                 raise ValueError("Could not read the uploaded PDF file.")
         if not docs_to_summarize: raise ValueError("No content provided for summarization.")
-        return self._summarize_chain.invoke(docs_to_summarize)
+        with track_stage("summarization"):
+            return self._summarize_chain.invoke(docs_to_summarize)
 
     def get_query_topics(self) -> Dict:
-        if self._db_connection is None: raise RuntimeError("Database connection is not available.")
+        if self._storage is None: raise RuntimeError("Database connection is not available.")
         logger.info("Fetching top 5 query topics from database.")
         try:
-            query = "SELECT topic, COUNT(topic) as count FROM chatbot_queries GROUP BY topic ORDER BY count DESC LIMIT 5"
-            df_topics = pd.read_sql_query(query, self._db_connection)
+            query = "SELECT topic, SUM(count) as count FROM chatbot_queries_daily GROUP BY topic ORDER BY count DESC LIMIT 5"
+            with self._storage.read() as conn:
+                df_topics = pd.read_sql_query(query, conn)
             if df_topics.empty:
                 return {"labels": [], "datasets": []}
             chart_data = {
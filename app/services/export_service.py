@@ -0,0 +1,151 @@
+"""
+Streaming export of the analytics tables as CSV or Parquet.
+Rows are read in fixed-size keyset pages (WHERE id > last_id LIMIT n), so memory
+stays constant regardless of table size and no read lock is held between pages,
+which keeps concurrent prediction writes flowing during long exports.
+When retention is enabled (RETENTION_DAYS), raw rows older than that window have been
+deleted and are not part of the export.
+"""
+import csv
+import io
+import logging
+from datetime import date, timedelta
+from typing import Iterator, List, Optional
+
+from app.core.config import EXPORT_CHUNK_ROWS
+from app.services.storage import Storage, get_storage
+
+logger = logging.getLogger(__name__)
+
+# Exportable tables and their columns (whitelisted: names are interpolated into SQL)
+EXPORT_TABLES = {
+    "predictions": ("id", "diagnosis", "timestamp"),
+    "chatbot_queries": ("id", "topic", "timestamp"),
+}
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that buffers what the Parquet writer emits until it is drained."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class ExportService:
+    def __init__(self, storage: Optional[Storage] = None):
+        self._storage = storage
+
+    @property
+    def storage(self) -> Storage:
+        if self._storage is None:
+            self._storage = get_storage()
+        return self._storage
+
+    def iter_row_chunks(
+        self,
+        table: str,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        chunk_rows: int = EXPORT_CHUNK_ROWS,
+    ) -> Iterator[List[tuple]]:
+        """Yields lists of at most `chunk_rows` rows, ordered by id, within [start, end]."""
+        if table not in EXPORT_TABLES:
+            raise ValueError(f"Unknown table '{table}'.")
+        columns = ", ".join(EXPORT_TABLES[table])
+
+        filters, params = [], []
+        if start is not None:
+            filters.append("timestamp >= ?")
+            params.append(start.isoformat())
+        if end is not None:
+            filters.append("timestamp < ?")
+            params.append((end + timedelta(days=1)).isoformat())
+        where = "".join(f" AND {f}" for f in filters)
+
+        # A dedicated connection, so a slow client never holds one of the pooled readers
+        with self.storage.dedicated_reader() as conn:
+            # Narrow the id range once (uses the timestamp index), then page by id
+            first_id, last_id = conn.execute(
+                f"SELECT MIN(id), MAX(id) FROM {table} WHERE 1 = 1{where}", params
+            ).fetchone()
+            if first_id is None:
+                return
+            query = f"SELECT {columns} FROM {table} WHERE id > ? AND id <= ?{where} ORDER BY id LIMIT ?"
+            cursor_id = first_id - 1
+            while True:
+                # Each page is its own short statement: the read lock is released in between
+                rows = conn.execute(query, (cursor_id, last_id, *params, chunk_rows)).fetchall()
+                if not rows:
+                    break
+                yield rows
+                cursor_id = rows[-1][0]
+
+    def stream_csv(
+        self,
+        table: str,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        chunk_rows: int = EXPORT_CHUNK_ROWS,
+    ) -> Iterator[bytes]:
+        """Yields the export as CSV, one encoded chunk per page of rows."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_TABLES[table])
+        for rows in self.iter_row_chunks(table, start, end, chunk_rows):
+            writer.writerows(rows)
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode("utf-8")
+        logger.info(f"Finished CSV export of '{table}'.")
+
+    def stream_parquet(
+        self,
+        table: str,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        chunk_rows: int = EXPORT_CHUNK_ROWS,
+    ) -> Iterator[bytes]:
+        """Yields the export as a Parquet file, writing one row group per page of rows."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        id_col, label_col, ts_col = EXPORT_TABLES[table]
+        schema = pa.schema([(id_col, pa.int64()), (label_col, pa.string()), (ts_col, pa.timestamp("us"))])
+        sink = _ChunkSink()
+        writer = pq.ParquetWriter(sink, schema, compression="snappy")
+        try:
+            for rows in self.iter_row_chunks(table, start, end, chunk_rows):
+                ids, labels, timestamps = zip(*rows)
+                batch = pa.table(
+                    [
+                        pa.array(ids, pa.int64()),
+                        pa.array(labels, pa.string()),
+                        pa.array(timestamps, pa.string()).cast(pa.timestamp("us")),
+                    ],
+                    schema=schema,
+                )
+                writer.write_table(batch, row_group_size=len(rows))
+                yield sink.drain()
+        finally:
+            writer.close()
+        yield sink.drain()
+        logger.info(f"Finished Parquet export of '{table}'.")
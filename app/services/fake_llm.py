@@ -0,0 +1,182 @@
+"""
+Local stand-in for the Gemini API with a controllable latency distribution, so timeouts,
+retries, hedging and the circuit breaker can be exercised offline.
+
+    python -m app.services.fake_llm --port 8089 --median-ms 400 --tail-probability 0.05 --tail-ms 8000
+    LLM_BACKEND=fake FAKE_LLM_URL=http://127.0.0.1:8089 uvicorn app.main:app
+
+Protocol: POST /generate with {"prompt": "..."} returns {"text": "..."}; GET /health returns 200.
+Each request sleeps for a seeded log-normal delay (occasionally replaced by a slow `tail_ms`
+outlier) and fails with 503 with probability `error_rate`. Tests can script exact per-request
+delays with `script_ms`, consumed in arrival order before the random distribution takes over.
+Answers are deterministic per prompt; prompts ending in "Topic:" get a topic name.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+TOPICS = ("Fever", "Flu", "Pneumonia", "None")
+
+
+def generate(url: str, prompt: str, timeout: float) -> str:
+    """Client for the fake server. Raises urllib's HTTPError/URLError or TimeoutError like a real API client."""
+    request = urllib.request.Request(
+        f"{url.rstrip('/')}/generate",
+        data=json.dumps({"prompt": prompt}).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())["text"]
+
+
+def fake_answer(prompt: str) -> str:
+    digest = int.from_bytes(hashlib.sha256(prompt.encode()).digest()[:8], "big")
+    if prompt.rstrip().endswith("Topic:"):
+        return TOPICS[digest % len(TOPICS)]
+    return (
+        f"Fake answer ({digest % 1000:03d}). This information is for educational purposes only. "
+        "Please consult a healthcare professional for medical advice."
+    )
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "_Server"
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def _reply(self, status: int, body: dict):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._reply(200, {"status": "ok"})
+        else:
+            self._reply(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/generate":
+            self._reply(404, {"error": "not found"})
+            return
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        try:
+            prompt = json.loads(body)["prompt"]
+        except (ValueError, KeyError):
+            self._reply(400, {"error": "expected {\"prompt\": ...}"})
+            return
+        delay, fail = self.server.fake.next_behavior()
+        time.sleep(delay)
+        if fail:
+            self._reply(503, {"error": "simulated overload"})
+        else:
+            self._reply(200, {"text": fake_answer(prompt)})
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Don't wait for sleeping handlers on shutdown
+    block_on_close = False
+
+
+class FakeLLMServer:
+    """The fake API served from a background thread; usable as a context manager."""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        median_ms: float = 400,
+        sigma: float = 0.4,
+        tail_probability: float = 0.0,
+        tail_ms: float = 5000,
+        error_rate: float = 0.0,
+        script_ms: list = None,
+        seed: int = 0,
+    ):
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self.tail_probability = tail_probability
+        self.tail_ms = tail_ms
+        self.error_rate = error_rate
+        self.script_ms = list(script_ms or [])
+        self.requests = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = _Server((host, port), _Handler)
+        self._httpd.fake = self
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def next_behavior(self) -> tuple[float, bool]:
+        """(delay in seconds, whether to fail) for the next request."""
+        with self._lock:
+            self.requests += 1
+            if self.script_ms:
+                return self.script_ms.pop(0) / 1000, False
+            if self._rng.random() < self.tail_probability:
+                delay_ms = self.tail_ms
+            else:
+                delay_ms = self.median_ms * self._rng.lognormvariate(0.0, self.sigma)
+            return delay_ms / 1000, self._rng.random() < self.error_rate
+
+    def start(self) -> "FakeLLMServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fake-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "FakeLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--median-ms", type=float, default=400)
+    parser.add_argument("--sigma", type=float, default=0.4, help="Log-normal spread of the normal latencies.")
+    parser.add_argument("--tail-probability", type=float, default=0.0, help="Share of requests that take --tail-ms.")
+    parser.add_argument("--tail-ms", type=float, default=5000)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with 503.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    server = FakeLLMServer(
+        args.host, args.port, args.median_ms, args.sigma, args.tail_probability, args.tail_ms,
+        args.error_rate, seed=args.seed,
+    )
+    logger.info(f"Fake LLM listening on {server.url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
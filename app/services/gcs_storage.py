@@ -1,25 +1,164 @@
 """
 Google Cloud Storage backup/restore for SQLite database.
 Ensures analytics data persists across Cloud Run container restarts.
+
+Backups are stored block by block:
+
+    analytics/predictions.manifest.json   file size, block size and the ordered block hashes
+    analytics/blocks/<hash>                one GCS_BLOCK_SIZE_BYTES slice of the database file
+
+Blocks are content-addressed, so a backup uploads only blocks whose content changed since the
+previous backup (new pages at the end of the file and the few B-tree pages a write touches),
+and a restore downloads, in parallel, only the blocks a local copy of the file does not
+already contain. Each manifest lists the blocks it superseded; they are deleted one backup
+later, so a restore that is still reading the previous manifest finds its blocks.
+
+Concurrent backups (several Cloud Run instances) are serialized by object generations: the
+manifest is only replaced if it is still the generation the backup read (if_generation_match),
+otherwise the backup re-reads it and tries again. Unused blocks are deleted with the generation
+they had before the new manifest was written, so a block that another backup uploads again
+after reading that manifest is never deleted from under it.
+
+A bucket that only has the older single-file backup (analytics/predictions.db) is restored
+from that file; the next backup writes the block layout.
+
+GCS_BUCKET_NAME=file:///some/dir uses a local directory as the bucket (LocalDirBucket).
 """
+import hashlib
+import json
 import os
 import logging
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import DB_PATH, GCS_BLOCK_SIZE_BYTES, GCS_TRANSFER_THREADS
+from app.core.metrics import track_stage
 
 logger = logging.getLogger(__name__)
 
 # Configuration
 GCS_BUCKET_NAME = os.getenv("GCS_BUCKET_NAME", "")
-DB_PATH = "predictions.db"
 GCS_DB_PATH = "analytics/predictions.db"
+GCS_MANIFEST_PATH = "analytics/predictions.manifest.json"
+GCS_BLOCK_PREFIX = "analytics/blocks/"
+MANIFEST_FORMAT = 1
+# Backups that lose the race for the manifest re-read it and try again, up to this many times
+MANIFEST_WRITE_ATTEMPTS = 5
+
+
+class PreconditionFailed(Exception):
+    """An if_generation_match precondition did not hold (HTTP 412 from GCS)."""
+
+
+# Raised by blob calls whose generation precondition fails; google's class is added below
+_PRECONDITION_ERRORS: Tuple[type, ...] = (PreconditionFailed,)
+
+
+class LocalDirBlob:
+    def __init__(self, bucket: "LocalDirBucket", name: str, generation: Optional[int] = None):
+        self.bucket = bucket
+        self.name = name
+        self.generation = generation
+        self._path = os.path.join(bucket.root, name)
+
+    def _current_generation(self) -> int:
+        # Every upload writes a new file stamped with a fresh generation; 0 means "does not exist"
+        try:
+            return os.stat(self._path).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def _check(self, if_generation_match: Optional[int]) -> int:
+        current = self._current_generation()
+        if if_generation_match is not None and current != if_generation_match:
+            raise PreconditionFailed(f"{self.name}: generation {current}, expected {if_generation_match}")
+        return current
+
+    def exists(self) -> bool:
+        return os.path.exists(self._path)
+
+    def download_to_filename(self, filename: str):
+        self.bucket.on_request("download", self.name)
+        shutil.copyfile(self._path, filename)
+
+    def download_as_bytes(self, if_generation_match: Optional[int] = None) -> bytes:
+        self.bucket.on_request("download", self.name)
+        with self.bucket._lock:
+            self._check(if_generation_match)
+            with open(self._path, "rb") as f:
+                return f.read()
+
+    def upload_from_filename(self, filename: str):
+        with open(filename, "rb") as f:
+            self.upload_from_string(f.read())
+
+    def upload_from_string(self, data, content_type: str = None, if_generation_match: Optional[int] = None):
+        self.bucket.on_request("upload", self.name)
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        # Write-then-rename, so readers see the old or the new object, never a partial one
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self._path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(data.encode() if isinstance(data, str) else data)
+        with self.bucket._lock:
+            try:
+                current = self._check(if_generation_match)
+            except PreconditionFailed:
+                os.remove(tmp_path)
+                raise
+            generation = max(time.time_ns(), current + 1)
+            os.utime(tmp_path, ns=(generation, generation))
+            os.replace(tmp_path, self._path)
+            self.generation = generation
+
+    def delete(self, if_generation_match: Optional[int] = None):
+        self.bucket.on_request("delete", self.name)
+        with self.bucket._lock:
+            self._check(if_generation_match)
+            os.remove(self._path)
+
+
+class LocalDirBucket:
+    """
+    Stand-in for a google.cloud.storage bucket backed by a local directory. Generation
+    preconditions hold between threads of one process (the lock is not shared across processes).
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def blob(self, name: str) -> LocalDirBlob:
+        return LocalDirBlob(self, name)
+
+    def get_blob(self, name: str) -> Optional[LocalDirBlob]:
+        """The blob with its current generation, or None if it does not exist."""
+        blob = LocalDirBlob(self, name)
+        generation = blob._current_generation()
+        return LocalDirBlob(self, name, generation) if generation else None
+
+    def on_request(self, operation: str, name: str):
+        """Called before every transfer; subclasses add latency or record calls."""
+
 
 # Only import GCS if bucket is configured
 _gcs_available = False
 _client = None
 _bucket = None
 
-if GCS_BUCKET_NAME:
+if GCS_BUCKET_NAME.startswith("file://"):
+    _bucket = LocalDirBucket(GCS_BUCKET_NAME[len("file://"):])
+    _gcs_available = True
+    logger.info(f"Using local directory as the storage bucket: {_bucket.root}")
+elif GCS_BUCKET_NAME:
     try:
+        from google.api_core.exceptions import PreconditionFailed as _GCSPreconditionFailed
         from google.cloud import storage
+        _PRECONDITION_ERRORS = (PreconditionFailed, _GCSPreconditionFailed)
         _client = storage.Client()
         _bucket = _client.bucket(GCS_BUCKET_NAME)
         _gcs_available = True
@@ -28,39 +167,214 @@ if GCS_BUCKET_NAME:
         logger.warning(f"GCS not available: {e}. Data will not persist across restarts.")
 
 
-def restore_db_from_gcs():
+def _resolve_bucket(bucket):
+    if bucket is not None:
+        return bucket
+    return _bucket if _gcs_available else None
+
+
+def block_hash(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=20).hexdigest()
+
+
+def _block_name(digest: str) -> str:
+    return GCS_BLOCK_PREFIX + digest
+
+
+def _file_block_hashes(path: str, block_size: int) -> List[str]:
+    hashes = []
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(block_size)
+            if not data:
+                break
+            hashes.append(block_hash(data))
+    return hashes
+
+
+def _read_manifest(bucket) -> Tuple[Optional[Dict], int]:
+    """The current manifest and its generation; (None, 0) if there is none yet."""
+    blob = bucket.get_blob(GCS_MANIFEST_PATH)
+    if blob is None:
+        return None, 0
+    # Raises a precondition error if another backup replaced the manifest in between
+    manifest = json.loads(blob.download_as_bytes(if_generation_match=blob.generation))
+    if manifest.get("format") != MANIFEST_FORMAT:
+        raise ValueError(f"Unsupported backup manifest format: {manifest.get('format')}")
+    return manifest, blob.generation
+
+
+def _restore_blocks(bucket, manifest: Dict, dest_path: str) -> int:
+    """Assembles the file described by `manifest` at `dest_path`; returns the blocks downloaded."""
+    block_size = manifest["block_size"]
+    positions: Dict[str, List[int]] = {}
+    for index, digest in enumerate(manifest["blocks"]):
+        positions.setdefault(digest, []).append(index * block_size)
+
+    # Blocks the current local file already has (e.g. a container restarted on the same disk)
+    local = {}
+    if os.path.exists(dest_path):
+        for index, digest in enumerate(_file_block_hashes(dest_path, block_size)):
+            if digest in positions:
+                local.setdefault(digest, index * block_size)
+    missing = [digest for digest in positions if digest not in local]
+
+    fd, tmp_path = tempfile.mkstemp(suffix=".restore", dir=os.path.dirname(os.path.abspath(dest_path)))
+    try:
+        def write_block(digest: str, data: bytes):
+            for offset in positions[digest]:
+                os.pwrite(fd, data, offset)
+
+        def download(digest: str):
+            data = bucket.blob(_block_name(digest)).download_as_bytes()
+            if block_hash(data) != digest:
+                raise ValueError(f"Block {digest} is corrupt.")
+            write_block(digest, data)
+
+        if local:
+            with open(dest_path, "rb") as f:
+                for digest, offset in local.items():
+                    f.seek(offset)
+                    write_block(digest, f.read(block_size))
+        if missing:
+            with ThreadPoolExecutor(max_workers=max(1, GCS_TRANSFER_THREADS)) as pool:
+                # list() re-raises the first download error
+                list(pool.map(download, missing))
+        os.ftruncate(fd, manifest["size"])
+        os.fsync(fd)
+        os.close(fd)
+        fd = None
+        os.replace(tmp_path, dest_path)
+    finally:
+        if fd is not None:
+            os.close(fd)
+            os.remove(tmp_path)
+    return len(missing)
+
+
+def restore_db_from_gcs(dest_path: str = DB_PATH, bucket=None):
     """Download database from GCS on startup if it exists."""
-    if not _gcs_available:
+    bucket = _resolve_bucket(bucket)
+    if bucket is None:
         logger.info("GCS not configured, skipping restore.")
         return False
-    
+
     try:
-        blob = _bucket.blob(GCS_DB_PATH)
-        if blob.exists():
-            blob.download_to_filename(DB_PATH)
-            logger.info(f"✓ Restored database from GCS: {GCS_DB_PATH}")
-            return True
-        else:
-            logger.info("No existing database in GCS (first run).")
-            return False
+        with track_stage("gcs_download"):
+            # A backup finishing mid-restore can delete blocks of the manifest we read: retry once
+            for attempt in range(2):
+                try:
+                    manifest, _ = _read_manifest(bucket)
+                except _PRECONDITION_ERRORS:
+                    if attempt == 1:
+                        raise
+                    continue
+                if manifest is None:
+                    break
+                try:
+                    downloaded = _restore_blocks(bucket, manifest, dest_path)
+                except Exception as e:
+                    if attempt == 1:
+                        raise
+                    logger.warning(f"Block restore failed ({e}); re-reading the manifest.")
+                    continue
+                logger.info(
+                    f"✓ Restored database from GCS: {downloaded} of {len(set(manifest['blocks']))} blocks "
+                    f"downloaded ({manifest['size'] / 1e6:.1f} MB file)"
+                )
+                return True
+
+            blob = bucket.blob(GCS_DB_PATH)
+            if blob.exists():
+                blob.download_to_filename(dest_path)
+                logger.info(f"✓ Restored database from GCS: {GCS_DB_PATH}")
+                return True
+        logger.info("No existing database in GCS (first run).")
+        return False
     except Exception as e:
         logger.error(f"Failed to restore from GCS: {e}")
         return False
 
 
-def backup_db_to_gcs():
-    """Upload database to GCS after write operations."""
-    if not _gcs_available:
+def backup_db_to_gcs(source_path: str = DB_PATH, bucket=None, block_size: int = GCS_BLOCK_SIZE_BYTES):
+    """
+    Upload database to GCS after write operations.
+    `source_path` may point at a snapshot of the live database (see Storage.backup).
+    Only blocks that are not already in the bucket are uploaded.
+    """
+    bucket = _resolve_bucket(bucket)
+    if bucket is None:
         return False
-    
-    if not os.path.exists(DB_PATH):
-        logger.warning(f"Database file not found: {DB_PATH}")
+
+    if not os.path.exists(source_path):
+        logger.warning(f"Database file not found: {source_path}")
         return False
-    
+
     try:
-        blob = _bucket.blob(GCS_DB_PATH)
-        blob.upload_from_filename(DB_PATH)
-        logger.info(f"✓ Backed up database to GCS: {GCS_DB_PATH}")
+        with track_stage("gcs_upload"):
+            hashes = _file_block_hashes(source_path, block_size)
+            current = set(hashes)
+            first_offset = {}
+            for index, digest in enumerate(hashes):
+                first_offset.setdefault(digest, index * block_size)
+
+            def upload(digest: str):
+                with open(source_path, "rb") as f:
+                    f.seek(first_offset[digest])
+                    bucket.blob(_block_name(digest)).upload_from_string(f.read(block_size))
+
+            for attempt in range(MANIFEST_WRITE_ATTEMPTS):
+                try:
+                    previous, generation = _read_manifest(bucket)
+                except _PRECONDITION_ERRORS:
+                    continue
+                previous = previous or {"blocks": [], "superseded": []}
+                uploaded = set(previous["blocks"])
+                # Uploaded again if an earlier attempt already sent them: a block only the losing
+                # attempt's manifest would have referenced may have been deleted meanwhile
+                new_blocks = [digest for digest in first_offset if digest not in uploaded]
+                if new_blocks:
+                    with ThreadPoolExecutor(max_workers=max(1, GCS_TRANSFER_THREADS)) as pool:
+                        list(pool.map(upload, new_blocks))
+
+                # Blocks superseded by the previous backup are no longer referenced by any manifest.
+                # Their generations are taken now, before our manifest can be read by anyone.
+                unused = {}
+                for digest in previous["superseded"]:
+                    if digest not in current:
+                        blob = bucket.get_blob(_block_name(digest))
+                        if blob is not None:
+                            unused[digest] = blob.generation
+
+                manifest = {
+                    "format": MANIFEST_FORMAT,
+                    "size": os.path.getsize(source_path),
+                    "block_size": block_size,
+                    "blocks": hashes,
+                    "superseded": sorted(uploaded - current),
+                }
+                try:
+                    bucket.blob(GCS_MANIFEST_PATH).upload_from_string(
+                        json.dumps(manifest), content_type="application/json", if_generation_match=generation
+                    )
+                    break
+                except _PRECONDITION_ERRORS:
+                    logger.warning("Backup manifest was replaced by another instance; retrying on the new one.")
+            else:
+                raise RuntimeError(f"Manifest kept changing over {MANIFEST_WRITE_ATTEMPTS} attempts.")
+
+            for digest, block_generation in unused.items():
+                try:
+                    # Fails if another backup uploaded the block again after reading our manifest
+                    bucket.blob(_block_name(digest)).delete(if_generation_match=block_generation)
+                except _PRECONDITION_ERRORS:
+                    logger.info(f"Backup block {digest} was uploaded again; keeping it.")
+                except Exception as e:
+                    logger.warning(f"Could not delete unused backup block {digest}: {e}")
+        logger.info(
+            f"✓ Backed up database to GCS: {len(new_blocks)} of {len(first_offset)} blocks uploaded "
+            f"({GCS_MANIFEST_PATH})"
+        )
         return True
     except Exception as e:
         logger.error(f"Failed to backup to GCS: {e}")
@@ -0,0 +1,174 @@
+"""
+Keeps the chat history sent to the RAG chain within a token budget.
+
+The client sends the whole conversation with every request, and both the condense-question
+step and the answer step put it into their prompts. HistoryCompactor.compact():
+
+1. returns the history unchanged if it fits the budget left after the question and the
+   reserve for the template and retrieved documents;
+2. otherwise keeps up to CHAT_RECENT_TURNS of the latest turns verbatim (as many as fit), and
+   replaces everything older with one summary turn.
+
+Summaries are rolling: each is cached under a hash of the turns it covers, so when the next
+request arrives with one more turn, only the newly aged-out turns are folded into the cached
+summary (one short LLM call) instead of re-summarizing the whole conversation. If the LLM
+call fails, the older turns are dropped rather than failing the chat.
+"""
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional, Sequence
+
+from app.core.config import (
+    CHAT_CONTEXT_RESERVE_TOKENS,
+    CHAT_PROMPT_TOKEN_BUDGET,
+    CHAT_RECENT_TURNS,
+    CHAT_SUMMARY_CACHE_SIZE,
+    CHAT_SUMMARY_MAX_TOKENS,
+    CHAT_TOKEN_ENCODING,
+)
+from app.core.metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_TURN_QUESTION = "(Summary of our earlier conversation)"
+# Per-turn overhead of the "Human: ...\nAssistant: ..." rendering used by the chain
+_TURN_OVERHEAD_TOKENS = 6
+# Fallback estimate when the tiktoken encoding is unavailable
+_CHARS_PER_TOKEN = 4
+
+
+class TokenCounter:
+    """Counts tokens with tiktoken, loaded on first use; falls back to a character estimate."""
+
+    def __init__(self, encoding_name: str = CHAT_TOKEN_ENCODING):
+        self.encoding_name = encoding_name
+        self._encoding = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _get_encoding(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    try:
+                        import tiktoken
+
+                        self._encoding = tiktoken.get_encoding(self.encoding_name)
+                    except Exception as e:
+                        logger.warning(
+                            f"tiktoken encoding '{self.encoding_name}' unavailable ({e}); "
+                            f"estimating {_CHARS_PER_TOKEN} characters per token."
+                        )
+                    self._loaded = True
+        return self._encoding
+
+    def count(self, text: str) -> int:
+        encoding = self._get_encoding()
+        if encoding is None:
+            return -(-len(text) // _CHARS_PER_TOKEN)
+        return len(encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """The longest prefix of `text` with at most `max_tokens` tokens."""
+        encoding = self._get_encoding()
+        if encoding is None:
+            return text[: max_tokens * _CHARS_PER_TOKEN]
+        tokens = encoding.encode(text, disallowed_special=())
+        return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+
+
+class HistoryCompactor:
+    """
+    `summarize(previous_summary, turns)` must return a summary of the previous summary (may be
+    None) followed by the given (question, answer) turns.
+    """
+
+    def __init__(
+        self,
+        summarize: Callable[[Optional[str], list], str],
+        budget_tokens: int = CHAT_PROMPT_TOKEN_BUDGET,
+        reserve_tokens: int = CHAT_CONTEXT_RESERVE_TOKENS,
+        recent_turns: int = CHAT_RECENT_TURNS,
+        summary_max_tokens: int = CHAT_SUMMARY_MAX_TOKENS,
+        cache_size: int = CHAT_SUMMARY_CACHE_SIZE,
+        counter: Optional[TokenCounter] = None,
+    ):
+        self.summarize = summarize
+        self.budget_tokens = budget_tokens
+        self.reserve_tokens = reserve_tokens
+        self.recent_turns = recent_turns
+        self.summary_max_tokens = summary_max_tokens
+        self.cache_size = cache_size
+        self.counter = counter or TokenCounter()
+        self._summaries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def turn_tokens(self, turn: tuple) -> int:
+        return self.counter.count(turn[0]) + self.counter.count(turn[1]) + _TURN_OVERHEAD_TOKENS
+
+    def history_budget(self, question: str) -> int:
+        return max(0, self.budget_tokens - self.reserve_tokens - self.counter.count(question))
+
+    def compact(self, history: Sequence[Sequence[str]], question: str) -> list:
+        """
+        Returns (question, answer) tuples, as the chain expects, within the history budget.
+        Raises ValueError if a turn is not a (question, answer) pair.
+        """
+        if any(len(turn) != 2 for turn in history):
+            raise ValueError("Each chat_history turn must be a [question, answer] pair.")
+        turns = [(str(turn[0]), str(turn[1])) for turn in history]
+        budget = self.history_budget(question)
+        sizes = [self.turn_tokens(turn) for turn in turns]
+        if sum(sizes) <= budget:
+            return turns
+
+        # Newest turns first, as long as they fit next to a full-size summary
+        recent_budget = budget - self.summary_max_tokens - _TURN_OVERHEAD_TOKENS
+        keep, used = 0, 0
+        for size in reversed(sizes[len(sizes) - self.recent_turns:] if self.recent_turns > 0 else []):
+            if used + size > recent_budget:
+                break
+            keep, used = keep + 1, used + size
+        older, recent = turns[: len(turns) - keep], turns[len(turns) - keep:]
+
+        summary = self._summary_for(older)
+        if summary is None:
+            logger.warning(f"Dropping {len(older)} older chat turns that could not be summarized.")
+            return recent
+        logger.info(f"Compacted chat history: {len(older)} turns summarized, {len(recent)} kept verbatim.")
+        return [(SUMMARY_TURN_QUESTION, summary)] + recent
+
+    def _summary_for(self, older: list) -> Optional[str]:
+        """Rolling summary of `older`, extending the longest already-summarized prefix."""
+        prefix_keys = []
+        digest = b""
+        for question, answer in older:
+            digest = hashlib.blake2b(digest + question.encode() + b"\0" + answer.encode() + b"\1", digest_size=16).digest()
+            prefix_keys.append(digest)
+
+        start, previous = 0, None
+        with self._lock:
+            for covered in range(len(older), 0, -1):
+                cached = self._summaries.get(prefix_keys[covered - 1])
+                if cached is not None:
+                    self._summaries.move_to_end(prefix_keys[covered - 1])
+                    start, previous = covered, cached
+                    break
+        record_cache("chat_history_summary", start == len(older))
+        if start == len(older):
+            return previous
+
+        try:
+            summary = self.summarize(previous, older[start:])
+        except Exception as e:
+            logger.error(f"Chat history summarization failed: {e}")
+            return previous
+        summary = self.counter.truncate(summary.strip(), self.summary_max_tokens)
+
+        with self._lock:
+            self._summaries[prefix_keys[-1]] = summary
+            while len(self._summaries) > self.cache_size:
+                self._summaries.popitem(last=False)
+        return summary
@@ -0,0 +1,111 @@
+"""
+Bounded LRU cache of X-ray analysis results, so re-submitted scans skip decoding and the CNN.
+
+- Exact keys are a BLAKE2b digest of the uploaded image bytes, checked before any decoding.
+- Optional perceptual keys (difference hash of the decoded image) also match re-encoded
+  copies of the same scan, e.g. the same X-ray saved again as JPEG. These hits still pay
+  for decoding and validation, but skip preprocessing and inference.
+
+The cache is capped both by entry count and by estimated memory, and reports hits and
+misses to healthcare_cache_requests_total{cache="image_results"}.
+"""
+import hashlib
+import logging
+import sys
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+from PIL import Image
+
+from app.core.config import (
+    IMAGE_CACHE_HASH_SIZE,
+    IMAGE_CACHE_MAX_BYTES,
+    IMAGE_CACHE_MAX_ENTRIES,
+    IMAGE_CACHE_PERCEPTUAL,
+)
+from app.core.metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+# Per-entry bookkeeping not visible to sys.getsizeof (OrderedDict links and hash slot)
+_ENTRY_OVERHEAD = 120
+
+
+def exact_key(image_bytes: bytes | memoryview) -> str:
+    """Content key for the raw image bytes (no copy of a memoryview is made)."""
+    return "b:" + hashlib.blake2b(image_bytes, digest_size=16).hexdigest()
+
+
+def perceptual_key(img: Image.Image, hash_size: int = IMAGE_CACHE_HASH_SIZE) -> str:
+    """
+    Difference hash: grayscale, shrink to (hash_size + 1) x hash_size, and record whether
+    each pixel is brighter than its right neighbour. Survives re-encoding and resizing.
+    """
+    small = img.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = np.packbits(pixels[:, 1:] > pixels[:, :-1])
+    return "p:" + bits.tobytes().hex()
+
+
+class ImageResultCache:
+    """Thread-safe LRU mapping a key to an analysis result (predicted_class, confidence)."""
+
+    def __init__(
+        self,
+        max_entries: int = IMAGE_CACHE_MAX_ENTRIES,
+        max_bytes: int = IMAGE_CACHE_MAX_BYTES,
+        perceptual: bool = IMAGE_CACHE_PERCEPTUAL,
+        name: str = "image_results",
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.perceptual = perceptual
+        self.name = name
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.max_bytes > 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def get(self, key: Optional[str]) -> Optional[tuple[str, float]]:
+        if not self.enabled or key is None:
+            return None
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+        record_cache(self.name, value is not None)
+        return value
+
+    def put(self, key: Optional[str], value: tuple[str, float]):
+        if not self.enabled or key is None:
+            return
+        size = self._entry_size(key, value)
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entry_size(key, self._entries.pop(key))
+            self._entries[key] = value
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                old_key, old_value = self._entries.popitem(last=False)
+                self._bytes -= self._entry_size(old_key, old_value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    @staticmethod
+    def _entry_size(key: str, value: tuple) -> int:
+        return sys.getsizeof(key) + sys.getsizeof(value) + sum(sys.getsizeof(v) for v in value) + _ENTRY_OVERHEAD
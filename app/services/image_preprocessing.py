@@ -0,0 +1,49 @@
+"""
+Image decoding, validation and preprocessing helpers.
+Kept free of TensorFlow so they can run cheaply inside bulk-analysis worker processes.
+"""
+import logging
+
+import numpy as np
+from PIL import Image
+
+from app.services.image_cache import perceptual_key
+from app.services.image_validator import ImageValidator
+
+logger = logging.getLogger(__name__)
+
+IMG_SIZE = (150, 150)
+
+# One validator per process (workers build their own on first use)
+_validator = None
+
+
+def preprocess_image(img: Image.Image, size: tuple = IMG_SIZE) -> np.ndarray:
+    """
+    Converts an opened image to the model's input format:
+    RGB, resized to `size`, float32 scaled to [0, 1], shape (height, width, 3).
+    """
+    img = img.convert("RGB").resize(size)
+    return np.asarray(img, dtype=np.float32) / 255.0
+
+
+def prepare_image(name: str, image_bytes: bytes, hash_size: int = 0) -> tuple:
+    """
+    Bulk worker entry point: validates and preprocesses one image.
+    Returns (name, array, None, key) on success or (name, None, error_message, None) on
+    failure, so a bad file never fails the whole batch. `key` is the image's perceptual
+    cache key when `hash_size` is set, else None.
+    """
+    global _validator
+    if _validator is None:
+        _validator = ImageValidator()
+
+    try:
+        is_valid, error_msg, validated_img = _validator.validate_image_bytes(image_bytes)
+        if not is_valid:
+            return name, None, error_msg, None
+        key = perceptual_key(validated_img, hash_size) if hash_size else None
+        return name, preprocess_image(validated_img), None, key
+    except Exception as e:
+        logger.error(f"Failed to prepare image '{name}': {e}")
+        return name, None, "Failed to process image. It might be corrupted or in an unsupported format.", None
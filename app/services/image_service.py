@@ -1,25 +1,70 @@
+import asyncio
 import base64
-import io
 import logging
+import multiprocessing
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import AsyncIterator, Iterable
 from PIL import Image
 import tensorflow as tf
 import os
+from app.core.config import (
+    BULK_BATCH_SIZE,
+    BULK_WORKERS,
+    CNN_LOAD_AFTER_FORK,
+    CNN_WARMUP,
+    IMAGE_CACHE_HASH_SIZE,
+    TF_INTER_OP_THREADS,
+    TF_INTRA_OP_THREADS,
+)
+from app.core.metrics import QUEUE_DEPTH, set_model_loaded, track_stage
+from app.services.image_cache import ImageResultCache, exact_key, perceptual_key
+from app.services.image_preprocessing import IMG_SIZE, prepare_image, preprocess_image
 from app.services.image_validator import ImageValidator
 
 # Setup logger for this service
 logger = logging.getLogger(__name__)
 
 
+def configure_tensorflow_threads(intra_op: int = TF_INTRA_OP_THREADS, inter_op: int = TF_INTER_OP_THREADS):
+    """Sets TensorFlow's thread pools. Only effective before the TF runtime is initialized."""
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(intra_op)
+        tf.config.threading.set_inter_op_parallelism_threads(inter_op)
+        logger.info(f"TensorFlow threads: intra_op={intra_op}, inter_op={inter_op}")
+    except RuntimeError as e:
+        logger.warning(f"TensorFlow threads already initialized, keeping current settings: {e}")
+
+
+def compile_inference(model, img_size: tuple = IMG_SIZE):
+    """
+    Wraps the model's forward pass in a tf.function with a fixed input signature, so every
+    call reuses one traced graph instead of going through Keras predict()'s data adapter
+    and loop machinery. The batch dimension is left open for bulk batches.
+    """
+    height, width = img_size[1], img_size[0]
+
+    @tf.function(input_signature=[tf.TensorSpec([None, height, width, 3], tf.float32)])
+    def infer(images):
+        return model(images, training=False)
+
+    return infer
+
+
 class ImageService:
     """
     This service loads the trained deep learning model and performs image analysis.
-    Includes image validation to reject non-X-ray images.
+    Includes image validation to reject non-X-ray images, and a result cache so
+    re-submitted scans skip the model.
     """
 
     _model = None
+    _infer = None
     _validator = None
-    _img_size = (150, 150)
+    _cache = None
+    _bulk_pool = None
+    _img_size = IMG_SIZE
     _class_names = ["NORMAL", "Pneumonia"]
 
     def __init__(self):
@@ -27,46 +72,76 @@ class ImageService:
         if ImageService._validator is None:
             ImageService._validator = ImageValidator()
             logger.info("Image validator initialized")
+
+        if ImageService._cache is None:
+            ImageService._cache = ImageResultCache()
+            logger.info(
+                f"Image result cache: {ImageService._cache.max_entries} entries, "
+                f"{ImageService._cache.max_bytes} bytes, perceptual={ImageService._cache.perceptual}"
+            )
     
         if ImageService._model is None:
-            logger.info("Attempting to load deep learning model for the first time...")
-            try:
-                # Construct the full path to the model file
-                model_path = os.path.join("ml_models", "cnn19.h5")
-                logger.info(f"Looking for model at path: {os.path.abspath(model_path)}")
-
-                if not os.path.exists(model_path):
-                    logger.error(
-                        f"CRITICAL ERROR: Model file not found at '{model_path}'."
-                    )
-                    raise FileNotFoundError(f"Model file not found at {model_path}")
+            if CNN_LOAD_AFTER_FORK:
+                # TensorFlow's runtime does not survive fork(): each worker loads its own copy
+                logger.info("Deferring image model load to the worker processes.")
+            else:
+                self.load_model()
 
-                ImageService._model = tf.keras.models.load_model(model_path)
-                logger.info(
-                    f"Successfully loaded image analysis model from: {model_path}"
-                )
+    def load_model(self):
+        """Loads the CNN, compiles its inference function and warms it up."""
+        logger.info("Attempting to load deep learning model for the first time...")
+        try:
+            # Construct the full path to the model file
+            model_path = os.path.join("ml_models", "cnn19.h5")
+            logger.info(f"Looking for model at path: {os.path.abspath(model_path)}")
 
-            except Exception as e:
-                # Log the full error with traceback for detailed debugging
+            if not os.path.exists(model_path):
                 logger.error(
-                    f"CRITICAL ERROR: Could not load image model. {e}", exc_info=True
+                    f"CRITICAL ERROR: Model file not found at '{model_path}'."
                 )
-        
-                ImageService._model = None
+                raise FileNotFoundError(f"Model file not found at {model_path}")
 
-    def _preprocess_image_bytes(self, image_bytes: bytes) -> np.ndarray:
-        """
-        Preprocesses an image from a byte stream to be ready for the model.
-        """
-        logger.info("Opening image from byte stream...")
-        img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+            configure_tensorflow_threads()
+            ImageService._model = tf.keras.models.load_model(model_path)
+            logger.info(
+                f"Successfully loaded image analysis model from: {model_path}"
+            )
+
+            # staticmethod: a tf.function stored on the class would otherwise bind to `self`
+            ImageService._infer = staticmethod(compile_inference(ImageService._model, self._img_size))
+            if CNN_WARMUP:
+                self._warm_up()
+
+        except Exception as e:
+            # Log the full error with traceback for detailed debugging
+            logger.error(
+                f"CRITICAL ERROR: Could not load image model. {e}", exc_info=True
+            )
+    
+            ImageService._model = None
+            ImageService._infer = None
+
+        set_model_loaded("cnn", ImageService._model is not None)
+
+    def _warm_up(self):
+        """Traces the compiled graph once so the first real request runs at full speed."""
+        height, width = self._img_size[1], self._img_size[0]
+        with track_stage("cnn_warmup"):
+            self._run_model(np.zeros((1, height, width, 3), dtype=np.float32))
+        logger.info("Image model warmed up.")
 
-        logger.info(f"Resizing image to {self._img_size}...")
-        img = img.resize(self._img_size)
+    def _run_model(self, images: np.ndarray) -> np.ndarray:
+        """Forward pass over a (batch, height, width, 3) float32 array."""
+        if self._infer is not None:
+            return self._infer(tf.convert_to_tensor(images, dtype=tf.float32)).numpy()
+        return self._model.predict(images, batch_size=len(images), verbose=0)
 
-        logger.info("Converting image to array and normalizing...")
-        img_array = tf.keras.preprocessing.image.img_to_array(img)
-        img_array = img_array / 255.0
+    def _preprocess_image(self, img: Image.Image) -> np.ndarray:
+        """
+        Preprocesses an already-opened (validated) image to be ready for the model.
+        """
+        logger.info(f"Resizing, converting and normalizing image to {self._img_size}...")
+        img_array = preprocess_image(img, self._img_size)
 
         logger.info("Expanding dimensions for batch prediction...")
         img_array = np.expand_dims(img_array, axis=0)
@@ -75,21 +150,47 @@ class ImageService:
 
     async def analyze(self, image_base64: str) -> (str, float):
         """
-        Decodes a base64 image, validates it's an X-ray, preprocesses it, and returns a prediction.
+        Decodes a base64 image and analyzes it. Kept for JSON clients;
+        prefer `analyze_bytes` for raw uploads.
         """
-        if self._model is None:
-            logger.error("Analysis attempted but the image model is not loaded.")
-            raise RuntimeError(
-                "Image analysis model is not available. Check server startup logs for errors."
-            )
+        self._ensure_model_loaded()
 
         try:
             logger.info("Decoding base64 image string...")
-            image_bytes = base64.b64decode(image_base64)
+            with track_stage("base64_decode"):
+                image_bytes = base64.b64decode(image_base64)
+        except Exception as e:
+            logger.error(f"Failed to decode base64 image: {e}")
+            raise ValueError(
+                "Failed to process image. It might be corrupted or in an unsupported format."
+            )
+
+        return await self.analyze_bytes(image_bytes)
 
+    async def analyze_bytes(self, image_bytes: bytes | memoryview) -> (str, float):
+        """
+        Validates the image is an X-ray, preprocesses it, and returns a prediction.
+        Accepts raw bytes or a memoryview over an upload buffer (no copy is made).
+        Repeat submissions are answered from the result cache.
+        """
+        self._ensure_model_loaded()
+
+        content_key = exact_key(image_bytes)
+        cached = self._cache.get(content_key)
+        if cached is not None:
+            logger.info(f"Image result cache hit. Class: {cached[0]}, Confidence: {cached[1]:.4f}")
+            return cached
+
+        # Decoding, validation and the CNN are CPU-bound; run them off the event loop
+        return await asyncio.to_thread(self._analyze_uncached, image_bytes, content_key)
+
+    def _analyze_uncached(self, image_bytes: bytes | memoryview, content_key: str) -> (str, float):
+        """The blocking part of `analyze_bytes`, for images not found by their exact key."""
+        try:
             # VALIDATE: Check if image is likely a chest X-ray
             logger.info("Validating if image is a chest X-ray...")
-            is_valid, error_msg, validated_img = self._validator.validate_image_bytes(image_bytes)
+            with track_stage("image_validation"):
+                is_valid, error_msg, validated_img = self._validator.validate_image_bytes(image_bytes)
             
             if not is_valid:
                 logger.warning(f"Image validation failed: {error_msg}")
@@ -97,20 +198,25 @@ class ImageService:
             
             logger.info("✓ Image validated as likely chest X-ray")
 
-            processed_image = self._preprocess_image_bytes(image_bytes)
+            # A re-encoded copy of a scan we have already analyzed
+            visual_key = perceptual_key(validated_img, IMAGE_CACHE_HASH_SIZE) if self._cache.perceptual else None
+            cached = self._cache.get(visual_key)
+            if cached is not None:
+                logger.info(f"Image result cache hit (perceptual). Class: {cached[0]}")
+                self._cache.put(content_key, cached)
+                return cached
 
-            logger.info("Making prediction on the preprocessed image...")
-            prediction = self._model.predict(processed_image)
+            # Reuse the image the validator already opened instead of decoding it twice
+            with track_stage("preprocessing"):
+                processed_image = self._preprocess_image(validated_img)
 
-            # Interpret the sigmoid output from the model
-            score = float(prediction[0][0])
+            logger.info("Making prediction on the preprocessed image...")
+            with track_stage("cnn_predict"):
+                prediction = self._run_model(processed_image)
 
-            if score > 0.5:
-                predicted_class = self._class_names[1]  # Pneumonia
-                confidence = score
-            else:
-                predicted_class = self._class_names[0]  # Normal
-                confidence = 1 - score
+            predicted_class, confidence = self._interpret_score(float(prediction[0][0]))
+            self._cache.put(content_key, (predicted_class, confidence))
+            self._cache.put(visual_key, (predicted_class, confidence))
 
             logger.info(
                 f"Image prediction successful. Class: {predicted_class}, Confidence: {confidence:.4f}"
@@ -128,4 +234,144 @@ class ImageService:
             # This error will be sent back to the frontend.
             raise ValueError(
                 "Failed to process image. It might be corrupted or in an unsupported format."
-            )
\ No newline at end of file
+            )
+
+    def is_ready(self) -> bool:
+        """True when the image model is loaded and analysis requests can be served."""
+        return self._model is not None
+
+    def _ensure_model_loaded(self):
+        if self._model is None:
+            logger.error("Analysis attempted but the image model is not loaded.")
+            raise RuntimeError(
+                "Image analysis model is not available. Check server startup logs for errors."
+            )
+
+    def _interpret_score(self, score: float) -> tuple[str, float]:
+        """Interprets the sigmoid output from the model."""
+        if score > 0.5:
+            return self._class_names[1], score  # Pneumonia
+        return self._class_names[0], 1 - score  # Normal
+
+    def _get_bulk_pool(self) -> ProcessPoolExecutor:
+        """Lazily starts the worker processes used to decode and validate bulk uploads."""
+        if ImageService._bulk_pool is None:
+            # "spawn" keeps TensorFlow's threads and the loaded model out of the workers
+            ImageService._bulk_pool = ProcessPoolExecutor(
+                max_workers=BULK_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            logger.info(f"Started bulk image worker pool with {BULK_WORKERS} processes.")
+        return ImageService._bulk_pool
+
+    def _replace_bulk_pool(self, broken: ProcessPoolExecutor) -> ProcessPoolExecutor:
+        """Discards a pool whose worker died (unless another request already did) and starts a new one."""
+        if ImageService._bulk_pool is broken:
+            logger.error("A bulk image worker process died; restarting the worker pool.")
+            ImageService._bulk_pool = None
+            broken.shutdown(wait=False, cancel_futures=True)
+        return self._get_bulk_pool()
+
+    def _predict_batch(self, names: list, batch: list, keys: list) -> list:
+        """Runs the model once over a batch of preprocessed images and caches the results."""
+        logger.info(f"Making batch prediction on {len(batch)} images...")
+        with track_stage("cnn_predict"):
+            predictions = self._run_model(np.stack(batch))
+        results = []
+        for name, prediction, image_keys in zip(names, predictions, keys):
+            result = self._interpret_score(float(prediction[0]))
+            for key in image_keys:
+                self._cache.put(key, result)
+            results.append(self._bulk_result(name, result))
+        return results
+
+    @staticmethod
+    def _bulk_result(name: str, result: tuple[str, float]) -> dict:
+        predicted_class, confidence = result
+        return {"filename": name, "predicted_condition": predicted_class, "confidence_score": confidence}
+
+    async def analyze_many(self, images: Iterable[tuple[str, bytes]]) -> AsyncIterator[dict]:
+        """
+        Analyzes many images, yielding one result dict per image as soon as it is ready.
+        Decoding and validation run in worker processes; valid images are sent to the
+        model in batches of BULK_BATCH_SIZE. Invalid images yield {"filename", "error"}.
+        Images already in the result cache are answered without being sent to a worker.
+        `images` yields (name, bytes) pairs; an Exception in place of the bytes is reported inline.
+        """
+        self._ensure_model_loaded()
+
+        loop = asyncio.get_running_loop()
+        pool = self._get_bulk_pool()
+        # Bound the number of images in flight so memory stays flat for large archives
+        max_in_flight = BULK_WORKERS * 2
+        images = iter(images)
+        hash_size = IMAGE_CACHE_HASH_SIZE if self._cache.perceptual else 0
+        pending = {}
+        names, batch, keys = [], [], []
+        exhausted = False
+        in_flight = QUEUE_DEPTH.labels(queue="bulk_image_workers")
+
+        try:
+            while True:
+                while not exhausted and len(pending) < max_in_flight:
+                    # The iterators read (and decompress) uploads synchronously: keep that off the event loop
+                    item = await asyncio.to_thread(next, images, None)
+                    if item is None:
+                        exhausted = True
+                        break
+                    name, image_bytes = item
+                    if isinstance(image_bytes, Exception):
+                        # The caller already rejected this file (e.g. too large); report it inline
+                        yield {"filename": name, "error": str(image_bytes)}
+                        continue
+                    content_key = exact_key(image_bytes)
+                    cached = self._cache.get(content_key)
+                    if cached is not None:
+                        yield self._bulk_result(name, cached)
+                        continue
+                    try:
+                        future = loop.run_in_executor(pool, prepare_image, name, image_bytes, hash_size)
+                    except BrokenProcessPool:
+                        # The pool broke after it was fetched (a worker died): retry on a fresh one
+                        pool = self._replace_bulk_pool(pool)
+                        future = loop.run_in_executor(pool, prepare_image, name, image_bytes, hash_size)
+                    pending[future] = (name, content_key, pool)
+                    in_flight.inc()
+
+                if not pending and not batch:
+                    break
+
+                if pending:
+                    # Wait briefly for more images so partially-filled batches still flush promptly
+                    done, _ = await asyncio.wait(
+                        pending, timeout=0.05, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    in_flight.dec(len(done))
+                    for future in done:
+                        name, content_key, future_pool = pending.pop(future)
+                        try:
+                            name, array, error, visual_key = future.result()
+                        except BrokenProcessPool:
+                            # A worker died (e.g. killed for memory): every image still in that pool fails
+                            pool = self._replace_bulk_pool(future_pool)
+                            yield {"filename": name, "error": "Image processing worker failed. Please retry."}
+                            continue
+                        if error is not None:
+                            yield {"filename": name, "error": error}
+                            continue
+                        cached = self._cache.get(visual_key)
+                        if cached is not None:
+                            self._cache.put(content_key, cached)
+                            yield self._bulk_result(name, cached)
+                            continue
+                        names.append(name)
+                        batch.append(array)
+                        keys.append((content_key, visual_key))
+
+                if batch and (len(batch) >= BULK_BATCH_SIZE or not pending or not done):
+                    for result in await asyncio.to_thread(self._predict_batch, names, batch, keys):
+                        yield result
+                    names, batch, keys = [], [], []
+        finally:
+            # Images still in flight when the client disconnects
+            in_flight.dec(len(pending))
@@ -11,6 +11,51 @@ import logging
 logger = logging.getLogger(__name__)
 
 
+class BufferReader(io.RawIOBase):
+    """Read-only, seekable file object over a memoryview (avoids copying the buffer)."""
+
+    def __init__(self, data):
+        self._view = memoryview(data).cast("B")
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        n = max(0, min(len(b), len(self._view) - self._pos))
+        b[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self._pos = offset
+        elif whence == io.SEEK_CUR:
+            self._pos += offset
+        elif whence == io.SEEK_END:
+            self._pos = len(self._view) + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        self._pos = max(0, self._pos)
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+
+def open_image_buffer(image_bytes) -> Image.Image:
+    """
+    Opens an image from bytes or any buffer (bytearray, memoryview).
+    bytes are shared by BytesIO as-is; other buffers are read through a zero-copy view.
+    """
+    if isinstance(image_bytes, bytes):
+        return Image.open(io.BytesIO(image_bytes))
+    return Image.open(BufferReader(image_bytes))
+
+
 class ImageValidator:
     """
     Validates if uploaded image is likely a chest X-ray.
@@ -101,13 +146,14 @@ class ImageValidator:
             logger.warning(f"Edge detection failed: {e}")
             return True, ""
 
-    def validate_image_bytes(self, image_bytes: bytes) -> tuple[bool, str, Image.Image]:
+    def validate_image_bytes(self, image_bytes: bytes | memoryview) -> tuple[bool, str, Image.Image]:
         """
         Complete validation pipeline.
+        Accepts bytes or a memoryview over an uploaded buffer.
         Returns: (is_valid, error_message, PIL_Image)
         """
         try:
-            img = Image.open(io.BytesIO(image_bytes))
+            img = open_image_buffer(image_bytes)
             
             is_valid, msg = self.validate_basic_properties(img)
             if not is_valid:
@@ -0,0 +1,272 @@
+"""
+Resilient calls to a slow, occasionally failing LLM backend (Gemini, or the local fake server).
+
+ResilientLLMClient.call(fn, *args) runs `fn` with:
+
+- a per-attempt timeout: the caller stops waiting after LLM_TIMEOUT_SECONDS (the backend's own
+  client timeout should match, so the abandoned worker thread does not linger);
+- retries with full-jitter exponential backoff, for timeouts, connection errors and 429/5xx
+  responses only (a bad request fails the same way every time);
+- optional hedging: if the attempt has not answered within the recent p95 latency, a duplicate
+  is sent and whichever answers first wins, which cuts the tail at the cost of ~5% extra calls;
+- a circuit breaker: after LLM_BREAKER_FAILURES consecutive failed attempts, calls fail fast
+  with CircuitOpenError for LLM_BREAKER_RESET_SECONDS, then a single trial call decides whether
+  to close it again.
+
+Errors raised to the caller are RuntimeErrors (the API maps them to 503), except
+non-retryable backend errors, which propagate unchanged.
+"""
+import logging
+import math
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Optional
+
+from app.core.config import (
+    LLM_BACKOFF_BASE_SECONDS,
+    LLM_BACKOFF_MAX_SECONDS,
+    LLM_BREAKER_FAILURES,
+    LLM_BREAKER_RESET_SECONDS,
+    LLM_HEDGE,
+    LLM_HEDGE_MIN_DELAY_SECONDS,
+    LLM_HEDGE_MIN_SAMPLES,
+    LLM_HEDGE_PERCENTILE,
+    LLM_MAX_ATTEMPTS,
+    LLM_TIMEOUT_SECONDS,
+)
+from app.core.metrics import LLM_CIRCUIT_OPEN, LLM_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on concurrent backend calls per process, including hedges and abandoned attempts
+_MAX_THREADS = 32
+# Number of recent latencies the hedge delay is computed from
+_LATENCY_WINDOW = 200
+# HTTP status codes worth retrying
+_RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class LLMTimeoutError(RuntimeError):
+    """No answer within the per-attempt timeout."""
+
+
+class LLMUnavailableError(RuntimeError):
+    """Every attempt failed; the last error is chained as __cause__."""
+
+
+class CircuitOpenError(RuntimeError):
+    """The circuit breaker is open; retry after `retry_after` seconds."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Timeouts, connection problems and 408/429/5xx responses are transient."""
+    if isinstance(error, (LLMTimeoutError, TimeoutError, ConnectionError)):
+        return True
+    status = getattr(error, "code", None) or getattr(error, "status_code", None)
+    if isinstance(status, int):
+        return status in _RETRYABLE_STATUS
+    # urllib.error.URLError and socket errors without a status
+    return isinstance(error, OSError)
+
+
+class CircuitBreaker:
+    """Closed -> open after `failure_threshold` consecutive failures -> half-open after `reset_timeout`."""
+
+    def __init__(self, name: str, failure_threshold: int = LLM_BREAKER_FAILURES, reset_timeout: float = LLM_BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    def before_call(self):
+        """Raises CircuitOpenError unless a call may go through now."""
+        if self.failure_threshold <= 0:
+            return
+        with self._lock:
+            if self._opened_at is None:
+                return
+            waited = time.monotonic() - self._opened_at
+            if waited >= self.reset_timeout and not self._trial_in_flight:
+                self._trial_in_flight = True  # half-open: let exactly one call test the backend
+                return
+        LLM_REQUESTS.labels(client=self.name, outcome="circuit_open").inc()
+        raise CircuitOpenError(
+            f"LLM backend '{self.name}' is failing; calls are suspended.",
+            retry_after=max(1.0, self.reset_timeout - waited),
+        )
+
+    def record_success(self):
+        with self._lock:
+            was_open = self._opened_at is not None
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+        if was_open:
+            logger.info(f"LLM circuit '{self.name}' closed.")
+            LLM_CIRCUIT_OPEN.labels(client=self.name).set(0)
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            trial_failed = self._trial_in_flight
+            self._trial_in_flight = False
+            if self._failures < self.failure_threshold and not trial_failed:
+                return
+            newly_open = self._opened_at is None
+            self._opened_at = time.monotonic()
+        if newly_open:
+            logger.warning(f"LLM circuit '{self.name}' opened after {self._failures} consecutive failures.")
+            LLM_CIRCUIT_OPEN.labels(client=self.name).set(1)
+
+
+class LatencyWindow:
+    """Recent successful latencies, for the hedge delay."""
+
+    def __init__(self, size: int = _LATENCY_WINDOW):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        with self._lock:
+            ordered = sorted(self._samples)
+        if not ordered:
+            return None
+        return ordered[min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+class ResilientLLMClient:
+    """Timeouts, jittered retries, hedging and a circuit breaker around one LLM backend."""
+
+    def __init__(
+        self,
+        name: str,
+        timeout: float = LLM_TIMEOUT_SECONDS,
+        max_attempts: int = LLM_MAX_ATTEMPTS,
+        backoff_base: float = LLM_BACKOFF_BASE_SECONDS,
+        backoff_max: float = LLM_BACKOFF_MAX_SECONDS,
+        hedge: bool = LLM_HEDGE,
+        hedge_percentile: float = LLM_HEDGE_PERCENTILE,
+        hedge_min_delay: float = LLM_HEDGE_MIN_DELAY_SECONDS,
+        hedge_min_samples: int = LLM_HEDGE_MIN_SAMPLES,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.name = name
+        self.timeout = timeout
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_min_samples = hedge_min_samples
+        self.breaker = breaker or CircuitBreaker(name)
+        self.latencies = LatencyWindow()
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._rng = random.Random()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Created on first use, so a gunicorn master that never calls the LLM forks no threads
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=_MAX_THREADS, thread_name_prefix=f"llm-{self.name}")
+            return self._executor
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before sending a duplicate, or None when hedging is off or not yet calibrated."""
+        if not self.hedge or len(self.latencies) < self.hedge_min_samples:
+            return None
+        delay = max(self.hedge_min_delay, self.latencies.percentile(self.hedge_percentile) or 0.0)
+        return delay if delay < self.timeout else None
+
+    def backoff(self, attempt: int) -> float:
+        """Full jitter: uniform in [0, min(max, base * 2^attempt)]."""
+        return self._rng.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def call(self, fn: Callable, *args, **kwargs):
+        """Calls `fn(*args, **kwargs)` on a worker thread with the policies above."""
+        last_error = None
+        for attempt in range(self.max_attempts):
+            self.breaker.before_call()
+            try:
+                result = self._attempt(fn, args, kwargs)
+            except Exception as e:
+                if not is_retryable(e):
+                    # The backend answered; it just rejected this request
+                    self.breaker.record_success()
+                    LLM_REQUESTS.labels(client=self.name, outcome="error").inc()
+                    raise
+                self.breaker.record_failure()
+                last_error = e
+                if attempt + 1 < self.max_attempts:
+                    delay = self.backoff(attempt)
+                    logger.warning(
+                        f"LLM '{self.name}' attempt {attempt + 1}/{self.max_attempts} failed ({e!r}); "
+                        f"retrying in {delay:.2f}s"
+                    )
+                    LLM_REQUESTS.labels(client=self.name, outcome="retry").inc()
+                    time.sleep(delay)
+                continue
+            self.breaker.record_success()
+            LLM_REQUESTS.labels(client=self.name, outcome="success").inc()
+            return result
+
+        logger.error(f"LLM '{self.name}' failed after {self.max_attempts} attempts: {last_error!r}")
+        raise LLMUnavailableError(f"LLM backend '{self.name}' is unavailable: {last_error}") from last_error
+
+    def _timed(self, fn: Callable, args: tuple, kwargs: dict):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        self.latencies.add(time.perf_counter() - start)
+        return result
+
+    def _attempt(self, fn: Callable, args: tuple, kwargs: dict):
+        """One attempt: the request plus, if it is slow, one hedged duplicate. First success wins."""
+        executor = self._get_executor()
+        deadline = time.monotonic() + self.timeout
+        pending = {executor.submit(self._timed, fn, args, kwargs)}
+        hedge_delay = self.hedge_delay()
+        hedged = hedge_delay is None
+        error = None
+
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            wait_for = remaining if hedged else min(remaining, hedge_delay)
+            done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+            if not hedged and not done:
+                # Still waiting at the hedge delay: send a duplicate and take whichever answers first
+                hedged = True
+                LLM_REQUESTS.labels(client=self.name, outcome="hedge").inc()
+                pending.add(executor.submit(self._timed, fn, args, kwargs))
+
+        if pending or error is None:
+            LLM_REQUESTS.labels(client=self.name, outcome="timeout").inc()
+            raise LLMTimeoutError(f"LLM '{self.name}' did not answer within {self.timeout:.1f}s")
+        raise error
@@ -0,0 +1,232 @@
+"""
+all-MiniLM-L6-v2 sentence embeddings from an int8-quantized ONNX export (EMBEDDING_BACKEND=onnx).
+
+HuggingFaceEmbeddings imports PyTorch and sentence-transformers to run this one small model.
+OnnxMiniLMEmbeddings runs the same network with onnxruntime and the Rust `tokenizers` library
+instead, with identical pooling (attention-masked mean, L2-normalized), so the vectors stay
+compatible with the existing Pinecone index.
+
+Build the artifacts once (needs the export-time dependencies: torch, transformers,
+sentence-transformers and onnx), which also runs the parity check:
+
+    python -m app.services.onnx_embeddings --output-dir ml_models/minilm-onnx
+    python -m app.services.onnx_embeddings --check-only     # parity check of an existing export
+
+The parity check embeds medical sentences with both backends and fails if any cosine
+similarity is below --min-cosine or a query's top-3 documents differ.
+
+The onnxruntime session is created on first use in each process (not in a gunicorn master
+before the fork), like the CNN in image_service.
+"""
+import argparse
+import logging
+import os
+import sys
+import threading
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.core.config import EMBEDDING_BATCH_SIZE, EMBEDDING_THREADS, ONNX_EMBEDDING_DIR
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+MODEL_FILE = "model_quantized.onnx"
+FP32_MODEL_FILE = "model.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+# sentence-transformers' max_seq_length for this model (the tokenizer itself allows 512)
+MAX_SEQ_LENGTH = 256
+
+PARITY_DOCUMENTS = [
+    "Fever is a temporary increase in body temperature, often due to an illness.",
+    "Influenza is a viral infection that attacks the respiratory system.",
+    "Pneumonia is an infection that inflames the air sacs in one or both lungs.",
+    "Bronchitis is an inflammation of the lining of the bronchial tubes.",
+    "The common cold is a viral infection of the nose and throat.",
+    "Hypertension is a condition in which blood pressure is persistently elevated.",
+    "Oxygen saturation below 92 percent may indicate a respiratory problem.",
+    "A chest X-ray can show signs of pneumonia such as consolidation.",
+    "Type 2 diabetes affects the way the body regulates and uses sugar as fuel.",
+    "Migraines are recurring headaches that cause moderate to severe pain.",
+]
+PARITY_QUERIES = [
+    "What causes a high temperature?",
+    "Is the flu a virus?",
+    "What does consolidation on an X-ray mean?",
+    "How do I know if my blood pressure is too high?",
+    "Why is my oxygen level low?",
+    "What helps with a bad headache?",
+]
+
+
+def mean_pool(last_hidden_state: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+    """Attention-masked mean over tokens, then L2 normalization (as in the sentence-transformers model)."""
+    mask = attention_mask[..., None].astype(np.float32)
+    summed = (last_hidden_state * mask).sum(axis=1)
+    pooled = summed / np.clip(mask.sum(axis=1), 1e-9, None)
+    return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+
+class OnnxMiniLMEmbeddings(Embeddings):
+    """LangChain Embeddings backed by onnxruntime; a drop-in for HuggingFaceEmbeddings(MODEL_NAME)."""
+
+    def __init__(
+        self,
+        model_dir: str = ONNX_EMBEDDING_DIR,
+        model_file: str = MODEL_FILE,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        threads: int = EMBEDDING_THREADS,
+    ):
+        from tokenizers import Tokenizer
+
+        self.model_path = os.path.join(model_dir, model_file)
+        if not os.path.exists(self.model_path):
+            raise FileNotFoundError(
+                f"{self.model_path} not found; export it with `python -m app.services.onnx_embeddings`."
+            )
+        self.batch_size = max(1, batch_size)
+        self.threads = threads
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=MAX_SEQ_LENGTH)
+        self.tokenizer.enable_padding(pad_id=self.tokenizer.token_to_id("[PAD]") or 0, pad_token="[PAD]")
+        self._session = None
+        self._session_pid = None
+        self._lock = threading.Lock()
+
+    def _get_session(self):
+        if self._session_pid != os.getpid():
+            with self._lock:
+                if self._session_pid != os.getpid():
+                    import onnxruntime as ort
+
+                    options = ort.SessionOptions()
+                    options.intra_op_num_threads = self.threads
+                    options.inter_op_num_threads = 1
+                    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+                    self._session = ort.InferenceSession(self.model_path, options, providers=["CPUExecutionProvider"])
+                    self._input_names = {i.name for i in self._session.get_inputs()}
+                    self._session_pid = os.getpid()
+                    logger.info(f"Loaded ONNX embedding model {self.model_path}.")
+        return self._session
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        inputs = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        session = self._get_session()
+        last_hidden_state = session.run(
+            None, {name: value for name, value in inputs.items() if name in self._input_names}
+        )[0]
+        return mean_pool(last_hidden_state, inputs["attention_mask"])
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Embeds texts as an (n, 384) array. Batches group similar lengths to minimize padding."""
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            indices = order[start:start + self.batch_size]
+            for i, vector in zip(indices, self._embed_batch([texts[i] for i in indices])):
+                vectors[i] = vector
+        return np.stack(vectors)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed([text])[0].tolist()
+
+
+def export(output_dir: str, model_name: str = MODEL_NAME, opset: int = 14, keep_fp32: bool = False):
+    """
+    Exports the model to ONNX, then quantizes its weights to int8 (dynamic quantization).
+    The fp32 model is only an intermediate and is deleted unless `keep_fp32` is set.
+    """
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+    tokenizer.backend_tokenizer.save(os.path.join(output_dir, TOKENIZER_FILE))
+
+    sample = tokenizer(["An example sentence to trace the graph."], return_tensors="pt")
+    fp32_path = os.path.join(output_dir, FP32_MODEL_FILE)
+    names = ["input_ids", "attention_mask", "token_type_ids"]
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in names),
+            fp32_path,
+            input_names=names,
+            output_names=["last_hidden_state", "pooler_output"],
+            dynamic_axes={
+                **{name: {0: "batch", 1: "sequence"} for name in names},
+                "last_hidden_state": {0: "batch", 1: "sequence"},
+                "pooler_output": {0: "batch"},
+            },
+            opset_version=opset,
+        )
+    quantized_path = os.path.join(output_dir, MODEL_FILE)
+    quantize_dynamic(fp32_path, quantized_path, weight_type=QuantType.QInt8)
+    logger.info(
+        f"Wrote {quantized_path} ({os.path.getsize(quantized_path) / 1e6:.1f} MB, "
+        f"fp32: {os.path.getsize(fp32_path) / 1e6:.1f} MB)"
+    )
+    if not keep_fp32:
+        os.remove(fp32_path)
+
+
+def check_parity(model_dir: str, model_name: str = MODEL_NAME) -> dict:
+    """Compares the ONNX embeddings with sentence-transformers on PARITY_DOCUMENTS and PARITY_QUERIES."""
+    from sentence_transformers import SentenceTransformer
+
+    texts = PARITY_DOCUMENTS + PARITY_QUERIES
+    reference = SentenceTransformer(model_name, device="cpu").encode(texts, normalize_embeddings=True)
+    candidate = OnnxMiniLMEmbeddings(model_dir).embed(texts)
+    cosines = (reference * candidate).sum(axis=1)
+
+    def top3(vectors):
+        docs, queries = vectors[: len(PARITY_DOCUMENTS)], vectors[len(PARITY_DOCUMENTS):]
+        return [list(np.argsort(-(docs @ q))[:3]) for q in queries]
+
+    agreement = np.mean([a == b for a, b in zip(top3(reference), top3(candidate))])
+    return {
+        "min_cosine": float(cosines.min()),
+        "mean_cosine": float(cosines.mean()),
+        "top3_agreement": float(agreement),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output-dir", default=ONNX_EMBEDDING_DIR)
+    parser.add_argument("--model", default=MODEL_NAME, help="Hugging Face model id or local directory.")
+    parser.add_argument("--opset", type=int, default=14)
+    parser.add_argument("--check-only", action="store_true", help="Skip the export; only run the parity check.")
+    parser.add_argument("--keep-fp32", action="store_true", help=f"Keep the unquantized {FP32_MODEL_FILE}.")
+    parser.add_argument("--min-cosine", type=float, default=0.99)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    if not args.check_only:
+        export(args.output_dir, args.model, args.opset, args.keep_fp32)
+    parity = check_parity(args.output_dir, args.model)
+    logger.info(
+        f"Parity vs sentence-transformers: min cosine {parity['min_cosine']:.4f}, "
+        f"mean {parity['mean_cosine']:.4f}, top-3 agreement {parity['top3_agreement']:.0%}"
+    )
+    if parity["min_cosine"] < args.min_cosine or parity["top3_agreement"] < 1.0:
+        logger.error("The ONNX export does not match the reference model closely enough.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
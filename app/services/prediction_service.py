@@ -1,22 +1,26 @@
 import pandas as pd
 import joblib
 import logging
-import sqlite3
 from datetime import datetime
-from typing import Dict
-from threading import Lock
+from typing import Dict, List
 
-# Import GCS storage for data persistence
-from app.services.gcs_storage import restore_db_from_gcs, backup_db_to_gcs
+from app.services.storage import get_storage
+from app.services.symptom_index import SymptomIndex
+from app.core.metrics import set_model_loaded, track_stage
 
 logger = logging.getLogger(__name__)
 
-DB_PATH = "predictions.db"
+# Chart colors per diagnosis (shared with the analytics API)
+DIAGNOSIS_COLORS = {"Flu": "#F97316", "Cold": "#4169E1", "Pneumonia": "#EF4444",
+                    "Bronchitis": "#9333EA", "Healthy": "#22C55E"}
+DEFAULT_COLOR = "#6B7280"
 
 class PredictionService:
     _model_pipeline = None
     _symptom_binarizer = None
-    _db_lock = Lock()  # Add a lock for thread-safe database operations
+    _symptom_index = None
+    _feature_template = None
+    _storage = None
 
     def __init__(self):
         if PredictionService._model_pipeline is None:
@@ -29,48 +33,37 @@ class PredictionService:
                 logger.info("Successfully loaded model artifacts.")
             except Exception as e:
                 logger.error(f"CRITICAL ERROR loading model artifacts: {e}", exc_info=True)
+            set_model_loaded("symptom_pipeline", PredictionService._model_pipeline is not None)
 
-            # Restore database from GCS if available (for persistence across restarts)
-            restore_db_from_gcs()
+        if PredictionService._symptom_index is None and PredictionService._symptom_binarizer is not None:
+            # Built once from the binarizer's vocabulary; replaces its per-request transform()
+            PredictionService._symptom_index = SymptomIndex(PredictionService._symptom_binarizer.classes_)
+            if PredictionService._model_pipeline is not None:
+                # Every model column at 0; requests copy it and fill in their values
+                PredictionService._feature_template = dict.fromkeys(PredictionService._model_pipeline.feature_names_in_, 0)
 
-            # Initialize the database table
+        if PredictionService._storage is None:
+            # Shared storage: restores from GCS and applies schema migrations on first use
             try:
-                conn = sqlite3.connect(DB_PATH)
-                cursor = conn.cursor()
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS predictions (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        diagnosis TEXT NOT NULL,
-                        timestamp DATETIME NOT NULL
-                    )
-                """)
-                conn.commit()
-                conn.close()
-                logger.info(f"Successfully initialized database at '{DB_PATH}'.")
+                PredictionService._storage = get_storage()
             except Exception as e:
                 logger.error(f"CRITICAL ERROR initializing database: {e}", exc_info=True)
 
-    def _get_db_connection(self):
-        """Create a new database connection for each operation."""
-        return sqlite3.connect(DB_PATH)
-
     def _save_prediction(self, diagnosis: str):
         """Saves a prediction and timestamp to the SQLite database."""
-        with self._db_lock:
-            try:
-                timestamp = datetime.now()
-                conn = self._get_db_connection()
-                cursor = conn.cursor()
-                cursor.execute("INSERT INTO predictions (diagnosis, timestamp) VALUES (?, ?)", 
-                             (diagnosis, timestamp))
-                conn.commit()
-                conn.close()
-                logger.info(f"Saved prediction '{diagnosis}' to database.")
-                
-                # Backup to GCS after each save for persistence
-                backup_db_to_gcs()
-            except Exception as e:
-                logger.error(f"Failed to save prediction to database: {e}", exc_info=True)
+        if self._storage is None: return
+        try:
+            timestamp = datetime.now()
+            with track_stage("sqlite_insert"):
+                with self._storage.write() as conn:
+                    conn.execute("INSERT INTO predictions (diagnosis, timestamp) VALUES (?, ?)",
+                                 (diagnosis, timestamp))
+            logger.info(f"Saved prediction '{diagnosis}' to database.")
+
+            # Backup to GCS after each save for persistence
+            self._storage.backup_after_write()
+        except Exception as e:
+            logger.error(f"Failed to save prediction to database: {e}", exc_info=True)
 
     def predict(self, input_data: Dict) -> str:
         """Takes user input, makes a prediction, and saves the result."""
@@ -79,24 +72,12 @@ class PredictionService:
         
         try:
             logger.info("Preparing data for prediction...")
-            df = pd.DataFrame([input_data])
-            
-            if "symptoms" not in df.columns:
-                raise ValueError("'symptoms' field is missing from the input data.")
-            
-            symptoms = df.pop("symptoms")
-            symptom_encoded = self._symptom_binarizer.transform(symptoms)
-            symptom_df = pd.DataFrame(symptom_encoded, columns=self._symptom_binarizer.classes_, index=df.index)
-            final_df = pd.concat([df, symptom_df], axis=1)
-            
-            required_features = self._model_pipeline.feature_names_in_
-            for col in required_features:
-                if col not in final_df.columns:
-                    final_df[col] = 0
-            final_df = final_df[required_features]
+            with track_stage("feature_assembly"):
+                final_df = self.build_features([input_data])
             
             logger.info(f"\n--- DATA SENT TO MODEL ---\n{final_df.to_string()}\n--------------------------")
-            prediction = self._model_pipeline.predict(final_df)
+            with track_stage("sklearn_predict"):
+                prediction = self._model_pipeline.predict(final_df)
             result = prediction[0]
             logger.info(f"Prediction successful. Result: {result}")
             
@@ -109,39 +90,60 @@ class PredictionService:
             logger.error(f"Error during prediction: {e}", exc_info=True)
             raise
 
+    def build_features(self, records: List[Dict]) -> pd.DataFrame:
+        """
+        One model input row per record: the record's vitals plus a 1 in the column of each
+        recognized symptom (matched through the symptom index), 0 in every other model column.
+        """
+        if self._symptom_index is None or self._feature_template is None:
+            raise RuntimeError("Model is not available.")
+        if any("symptoms" not in record for record in records):
+            raise ValueError("'symptoms' field is missing from the input data.")
+
+        classes = self._symptom_index.classes
+        rows = []
+        for record, columns in zip(records, self._symptom_index.encode_batch(r["symptoms"] for r in records)):
+            row = dict(self._feature_template)
+            for key, value in record.items():
+                if key in row:
+                    row[key] = value
+            for column in columns:
+                if classes[column] in row:
+                    row[classes[column]] = 1
+            rows.append(row)
+        return pd.DataFrame(rows, columns=list(self._feature_template))
+
     def get_trends(self) -> Dict:
         """Fetches and aggregates prediction data for the trend chart."""
-        with self._db_lock:
-            logger.info("Fetching prediction trends from database.")
-            try:
-                conn = self._get_db_connection()
-                query = "SELECT diagnosis, timestamp FROM predictions"
-                df_trends = pd.read_sql_query(query, conn, parse_dates=['timestamp'])
-                conn.close()
-                
-                if df_trends.empty:
-                    return {"labels": [], "datasets": []}
-                
-                df_trends['date'] = df_trends['timestamp'].dt.date
-                daily_counts = df_trends.groupby(['date', 'diagnosis']).size().unstack(fill_value=0)
-                all_days = pd.date_range(start=daily_counts.index.min(), end=daily_counts.index.max(), freq='D')
-                daily_counts = daily_counts.reindex(all_days, fill_value=0)
-                
-                chart_data = {"labels": [d.strftime('%Y-%m-%d') for d in daily_counts.index], "datasets": []}
-                colors = {"Flu": "#F97316", "Cold": "#4169E1", "Pneumonia": "#EF4444", 
-                         "Bronchitis": "#9333EA", "Healthy": "#22C55E"}
-                
-                for diagnosis in daily_counts.columns:
-                    chart_data["datasets"].append({
-                        "label": diagnosis, 
-                        "data": daily_counts[diagnosis].tolist(),
-                        "borderColor": colors.get(diagnosis, "#6B7280"), 
-                        "fill": False, 
-                        "tension": 0.1
-                    })
-                
-                return chart_data
-                
-            except Exception as e:
-                logger.error(f"Error fetching trend data: {e}", exc_info=True)
-                raise
\ No newline at end of file
+        if self._storage is None: raise RuntimeError("Database is not available.")
+        logger.info("Fetching prediction trends from database.")
+        try:
+            # The daily rollup outlives the raw rows removed by the retention job
+            query = "SELECT day, diagnosis, count FROM predictions_daily"
+            with self._storage.read() as conn:
+                df_trends = pd.read_sql_query(query, conn, parse_dates=['day'])
+            
+            if df_trends.empty:
+                return {"labels": [], "datasets": []}
+            
+            daily_counts = df_trends.pivot_table(index='day', columns='diagnosis', values='count',
+                                                 aggfunc='sum', fill_value=0)
+            all_days = pd.date_range(start=daily_counts.index.min(), end=daily_counts.index.max(), freq='D')
+            daily_counts = daily_counts.reindex(all_days, fill_value=0)
+            
+            chart_data = {"labels": [d.strftime('%Y-%m-%d') for d in daily_counts.index], "datasets": []}
+            
+            for diagnosis in daily_counts.columns:
+                chart_data["datasets"].append({
+                    "label": diagnosis, 
+                    "data": daily_counts[diagnosis].tolist(),
+                    "borderColor": DIAGNOSIS_COLORS.get(diagnosis, DEFAULT_COLOR), 
+                    "fill": False, 
+                    "tension": 0.1
+                })
+            
+            return chart_data
+            
+        except Exception as e:
+            logger.error(f"Error fetching trend data: {e}", exc_info=True)
+            raise
\ No newline at end of file
@@ -0,0 +1,538 @@
+"""
+Shared SQLite storage for every service that touches predictions.db.
+
+- WAL journal mode: readers never block the writer and the writer never blocks readers,
+  so trend/analytics/export reads can run while predictions are being saved.
+- One writer connection behind a lock (SQLite allows a single writer anyway) plus a small
+  pool of read-only connections. Connections are long-lived, so sqlite3's per-connection
+  statement cache keeps the hot INSERT/SELECT statements prepared.
+- Schema migrations live here, in order, tracked with PRAGMA user_version.
+- GCS restore runs once per process, before the first connection opens: up front by default,
+  or on a background thread (DB_RESTORE_MODE=lazy) so the models load meanwhile and database
+  calls wait for it. Backups upload a consistent snapshot taken with the SQLite backup API, so
+  writers are never blocked during an upload; only its changed blocks are sent (gcs_storage).
+- Fork-safe: a forked child (gunicorn worker) drops the inherited connections and opens
+  its own. When a leader process runs periodic backups (see gunicorn.conf.py), workers
+  skip the per-write backup.
+- Retention (off unless RETENTION_DAYS is set): raw event rows older than RETENTION_DAYS are
+  deleted in small batches (their daily rollups stay) and the freed pages are returned with
+  incremental VACUUM, so the file that every backup uploads and every cold start downloads
+  stops growing. Run it with `python -m app.services.storage --retention-days N` or let the
+  leader process schedule it. Deleted rows are gone from the export as well.
+"""
+import argparse
+import logging
+import os
+import queue
+import sqlite3
+import tempfile
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from datetime import date, timedelta
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from app.core.config import (
+    DB_BACKUP_INTERVAL_SECONDS,
+    DB_PATH,
+    DB_RESTORE_MODE,
+    DB_RESTORE_WAIT_SECONDS,
+    RETENTION_DAYS,
+    RETENTION_DELETE_BATCH,
+    RETENTION_INTERVAL_SECONDS,
+    STORAGE_BUSY_TIMEOUT_MS,
+    STORAGE_READERS,
+    STORAGE_READER_WAIT_SECONDS,
+)
+from app.services.gcs_storage import backup_db_to_gcs, restore_db_from_gcs
+
+logger = logging.getLogger(__name__)
+
+# Held around SQLite calls made by background threads, and taken by os.fork() itself, so no
+# process is forked while another thread is inside SQLite (the child would inherit SQLite's
+# internal mutexes locked, and hang on its first connect).
+_FORK_GUARD = threading.Lock()
+os.register_at_fork(
+    before=_FORK_GUARD.acquire,
+    after_in_parent=_FORK_GUARD.release,
+    after_in_child=_FORK_GUARD.release,
+)
+
+
+# --- Schema migrations (append only; each runs once, in its own transaction) ---
+
+def _m001_base_tables(conn: sqlite3.Connection):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS predictions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            diagnosis TEXT NOT NULL,
+            timestamp DATETIME NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS chatbot_queries (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            topic TEXT NOT NULL,
+            timestamp DATETIME NOT NULL
+        )
+    """)
+
+
+def _m002_timestamp_indexes(conn: sqlite3.Connection):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_predictions_timestamp ON predictions (timestamp, diagnosis)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_chatbot_queries_timestamp ON chatbot_queries (timestamp)")
+
+
+def _m003_predictions_daily_rollup(conn: sqlite3.Connection):
+    # Databases restored from older backups may already have the rollup; only backfill a new one
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'predictions_daily'"
+    ).fetchone()
+    if not exists:
+        conn.execute("""
+            CREATE TABLE predictions_daily (
+                day TEXT NOT NULL,
+                diagnosis TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (day, diagnosis)
+            ) WITHOUT ROWID
+        """)
+        conn.execute("""
+            INSERT INTO predictions_daily (day, diagnosis, count)
+            SELECT substr(timestamp, 1, 10), diagnosis, COUNT(*) FROM predictions GROUP BY 1, 2
+        """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_predictions_daily AFTER INSERT ON predictions
+        BEGIN
+            INSERT INTO predictions_daily (day, diagnosis, count)
+            VALUES (substr(NEW.timestamp, 1, 10), NEW.diagnosis, 1)
+            ON CONFLICT (day, diagnosis) DO UPDATE SET count = count + 1;
+        END
+    """)
+
+
+def _m004_chatbot_queries_daily_rollup(conn: sqlite3.Connection):
+    # Same shape as predictions_daily: the topics chart survives deletion of old raw rows
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chatbot_queries_daily'"
+    ).fetchone()
+    if not exists:
+        conn.execute("""
+            CREATE TABLE chatbot_queries_daily (
+                day TEXT NOT NULL,
+                topic TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (day, topic)
+            ) WITHOUT ROWID
+        """)
+        conn.execute("""
+            INSERT INTO chatbot_queries_daily (day, topic, count)
+            SELECT substr(timestamp, 1, 10), topic, COUNT(*) FROM chatbot_queries GROUP BY 1, 2
+        """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_chatbot_queries_daily AFTER INSERT ON chatbot_queries
+        BEGIN
+            INSERT INTO chatbot_queries_daily (day, topic, count)
+            VALUES (substr(NEW.timestamp, 1, 10), NEW.topic, 1)
+            ON CONFLICT (day, topic) DO UPDATE SET count = count + 1;
+        END
+    """)
+
+
+MIGRATIONS: List[Tuple[int, Callable[[sqlite3.Connection], None]]] = [
+    (1, _m001_base_tables),
+    (2, _m002_timestamp_indexes),
+    (3, _m003_predictions_daily_rollup),
+    (4, _m004_chatbot_queries_daily_rollup),
+]
+
+# Raw event tables covered by retention. Deleting their rows leaves the daily rollups intact:
+# the insert triggers have already counted them, and there are no delete triggers.
+RETAINED_TABLES = ("predictions", "chatbot_queries")
+# Pause between delete batches, so writers in other processes get the lock in between
+_RETENTION_BATCH_PAUSE_SECONDS = 0.05
+
+
+class Storage:
+    """Connection pool and schema owner for one SQLite database file."""
+
+    def __init__(
+        self,
+        db_path: str = DB_PATH,
+        readers: int = STORAGE_READERS,
+        restore: bool = False,
+        lazy: bool = False,
+        reader_wait: float = STORAGE_READER_WAIT_SECONDS,
+    ):
+        self.db_path = db_path
+        self._max_readers = max(1, readers)
+        self._reader_wait = reader_wait
+        self._backup_leader_pid = None
+        self._inherited = []
+        self._ready = threading.Event()
+        self._prepare_error = None
+        self._open_pool()
+        _instances.add(self)
+
+        if lazy:
+            thread = threading.Thread(target=self._prepare, args=(restore, True), name="db-restore", daemon=True)
+            thread.start()
+        else:
+            self._prepare(restore, lazy=False)
+
+    def _prepare(self, restore: bool, lazy: bool):
+        """Restores from GCS (if asked) and migrates; in lazy mode, on a background thread."""
+        try:
+            if restore and restore_db_from_gcs(self.db_path):
+                # A freshly downloaded file must not be paired with another database's WAL
+                for suffix in ("-wal", "-shm"):
+                    if os.path.exists(self.db_path + suffix):
+                        os.remove(self.db_path + suffix)
+            with _FORK_GUARD:
+                self.migrate()
+            logger.info(f"Storage ready at '{self.db_path}' (WAL, {self._max_readers} readers).")
+        except Exception as e:
+            if not lazy:
+                raise
+            # Surfaced to every database call by wait_ready()
+            logger.error(f"CRITICAL ERROR preparing database: {e}", exc_info=True)
+            self._prepare_error = e
+        finally:
+            self._ready.set()
+
+    def wait_ready(self, timeout: Optional[float] = DB_RESTORE_WAIT_SECONDS):
+        """Blocks until the restore and migrations are done (returns at once unless lazy)."""
+        if not self._ready.wait(timeout):
+            raise RuntimeError("Database is still being restored.")
+        if self._prepare_error is not None:
+            raise RuntimeError(f"Database is not available: {self._prepare_error}")
+
+    def _open_pool(self):
+        self._write_lock = threading.Lock()
+        self._pool_lock = threading.Lock()
+        self._writer = None
+        self._readers = queue.LifoQueue()
+        self._reader_count = 0
+
+    def _after_fork_in_child(self):
+        # SQLite connections must never be used (or closed) across fork(): keep the parent's
+        # objects alive so they are not finalized here, and start with a fresh pool and locks
+        self._inherited.append((self._writer, self._readers))
+        self._open_pool()
+
+    def _connect(self, readonly: bool) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=STORAGE_BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,
+            cached_statements=256,
+        )
+        conn.execute(f"PRAGMA busy_timeout = {STORAGE_BUSY_TIMEOUT_MS}")
+        if readonly:
+            conn.execute("PRAGMA query_only = ON")
+        else:
+            # Only takes effect when the file is new (it must precede journal_mode); older
+            # databases are converted once by compact()
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+        return conn
+
+    @contextmanager
+    def write(self) -> Iterator[sqlite3.Connection]:
+        """
+        Serialized write transaction on the single writer connection.
+        Commits on success, rolls back on error.
+        """
+        self.wait_ready()
+        with self._write_lock:
+            if self._writer is None:
+                self._writer = self._connect(readonly=False)
+            try:
+                yield self._writer
+                self._writer.commit()
+            except Exception:
+                self._writer.rollback()
+                raise
+
+    @contextmanager
+    def read(self) -> Iterator[sqlite3.Connection]:
+        """Borrows a read-only connection from the pool (opened lazily, up to the pool size)."""
+        self.wait_ready()
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            with self._pool_lock:
+                can_open = self._reader_count < self._max_readers
+                if can_open:
+                    self._reader_count += 1
+            if can_open:
+                conn = self._connect(readonly=True)
+            else:
+                try:
+                    conn = self._readers.get(timeout=self._reader_wait)
+                except queue.Empty:
+                    # Surfaces as a 503 instead of tying up a threadpool thread indefinitely
+                    raise RuntimeError("All database read connections are busy; try again shortly.")
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._readers.put(conn)
+
+    @contextmanager
+    def dedicated_reader(self) -> Iterator[sqlite3.Connection]:
+        """A read-only connection outside the pool, for long scans such as exports."""
+        self.wait_ready()
+        conn = self._connect(readonly=True)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def migrate(self):
+        """Applies pending MIGRATIONS in order, each in its own IMMEDIATE transaction."""
+        with self._write_lock:
+            if self._writer is None:
+                self._writer = self._connect(readonly=False)
+            conn = self._writer
+            for version, migration in MIGRATIONS:
+                current = conn.execute("PRAGMA user_version").fetchone()[0]
+                if version <= current:
+                    continue
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    # Re-check: another process may have migrated while we waited for the lock
+                    if conn.execute("PRAGMA user_version").fetchone()[0] < version:
+                        migration(conn)
+                        conn.execute(f"PRAGMA user_version = {version}")
+                    conn.commit()
+                    logger.info(f"Applied storage migration {version}: {migration.__name__}")
+                except Exception:
+                    conn.rollback()
+                    raise
+
+    def snapshot(self, dest_path: str):
+        """Writes a transactionally consistent copy of the database to `dest_path`."""
+        with self.read() as source:
+            dest = sqlite3.connect(dest_path)
+            try:
+                source.backup(dest)
+            finally:
+                dest.close()
+
+    def backup(self) -> bool:
+        """Uploads a consistent snapshot to GCS (no-op if GCS is not configured)."""
+        self.wait_ready()
+        fd, snapshot_path = tempfile.mkstemp(suffix=".db", dir=os.path.dirname(os.path.abspath(self.db_path)))
+        os.close(fd)
+        try:
+            with _FORK_GUARD:
+                self.snapshot(snapshot_path)
+            return backup_db_to_gcs(snapshot_path)
+        except Exception as e:
+            logger.error(f"Failed to snapshot database for backup: {e}", exc_info=True)
+            return False
+        finally:
+            os.remove(snapshot_path)
+
+    def backup_after_write(self) -> bool:
+        """Backs up after a write, unless a leader process owns backups (multi-worker mode)."""
+        if self._backup_leader_pid not in (None, os.getpid()):
+            return False
+        return self.backup()
+
+    def start_backup_leader(self, interval: float = DB_BACKUP_INTERVAL_SECONDS):
+        """
+        Makes this process the backup leader: a daemon thread uploads a snapshot every
+        `interval` seconds if any process committed since the last one. Processes forked
+        afterwards see a foreign leader and skip their per-write backups.
+        """
+        self._backup_leader_pid = os.getpid()
+        thread = threading.Thread(target=self._backup_loop, args=(interval,), name="db-backup-leader", daemon=True)
+        thread.start()
+        logger.info(f"Database backup leader started (pid {self._backup_leader_pid}, every {interval}s).")
+
+    def _backup_loop(self, interval: float):
+        self.wait_ready(timeout=None)
+        # data_version changes whenever another connection (in any process) commits
+        with _FORK_GUARD:
+            conn = self._connect(readonly=True)
+            last_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        while True:
+            time.sleep(interval)
+            with _FORK_GUARD:
+                version = conn.execute("PRAGMA data_version").fetchone()[0]
+            if version != last_version and self.backup():
+                last_version = version
+
+    def file_bytes(self) -> int:
+        """Size of the database file plus its WAL, in bytes."""
+        return sum(
+            os.path.getsize(path) for path in (self.db_path, self.db_path + "-wal") if os.path.exists(path)
+        )
+
+    def compact(
+        self,
+        retention_days: int = RETENTION_DAYS,
+        batch_size: int = RETENTION_DELETE_BATCH,
+        today: Optional[date] = None,
+    ) -> Dict:
+        """
+        Deletes RETAINED_TABLES rows from days older than `retention_days`, `batch_size` rows per
+        transaction, then returns the freed pages to the filesystem with incremental VACUUM.
+        Returns a report including the bytes reclaimed.
+        """
+        if retention_days <= 0:
+            raise ValueError("retention_days must be positive.")
+        cutoff = ((today or date.today()) - timedelta(days=retention_days)).isoformat()
+        self.wait_ready()
+        bytes_before = self.file_bytes()
+
+        converted = False
+        with _FORK_GUARD, self._write_lock:
+            if self._writer is None:
+                self._writer = self._connect(readonly=False)
+            if self._writer.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                # Databases created before incremental auto-vacuum: one full VACUUM switches them
+                logger.info(f"Converting '{self.db_path}' to incremental auto-vacuum (one-time VACUUM).")
+                self._writer.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                self._writer.execute("VACUUM")
+                converted = True
+
+        deleted = {}
+        for table in RETAINED_TABLES:
+            deleted[table] = 0
+            while True:
+                # Short transactions: the timestamp index finds the oldest rows, and the lock is
+                # released between batches
+                with _FORK_GUARD, self.write() as conn:
+                    count = conn.execute(
+                        f"DELETE FROM {table} WHERE id IN "
+                        f"(SELECT id FROM {table} WHERE timestamp < ? ORDER BY timestamp LIMIT ?)",
+                        (cutoff, batch_size),
+                    ).rowcount
+                deleted[table] += count
+                if count < batch_size:
+                    break
+                time.sleep(_RETENTION_BATCH_PAUSE_SECONDS)
+
+        with _FORK_GUARD, self._write_lock:
+            # executescript steps the pragma to completion (execute() frees a single page)
+            self._writer.executescript("PRAGMA incremental_vacuum")
+            self._writer.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+        bytes_after = self.file_bytes()
+
+        report = {
+            "cutoff": cutoff,
+            "deleted": deleted,
+            "converted_to_incremental_vacuum": converted,
+            "bytes_before": bytes_before,
+            "bytes_after": bytes_after,
+            "bytes_reclaimed": max(0, bytes_before - bytes_after),
+        }
+        logger.info(
+            f"Compacted '{self.db_path}': deleted {deleted} rows before {cutoff}, "
+            f"reclaimed {report['bytes_reclaimed'] / 1e6:.2f} MB ({bytes_after / 1e6:.2f} MB left)."
+        )
+        return report
+
+    def start_retention_job(
+        self,
+        interval: float = RETENTION_INTERVAL_SECONDS,
+        retention_days: int = RETENTION_DAYS,
+    ):
+        """
+        Runs compact() every `interval` seconds on a daemon thread. Started by the backup leader,
+        so one process per deployment compacts; the next periodic backup uploads the smaller file.
+        """
+        if interval <= 0 or retention_days <= 0:
+            logger.info("Database retention job disabled.")
+            return
+        thread = threading.Thread(
+            target=self._retention_loop, args=(interval, retention_days), name="db-retention", daemon=True
+        )
+        thread.start()
+        logger.info(f"Database retention job started (keeping {retention_days} days, every {interval}s).")
+
+    def _retention_loop(self, interval: float, retention_days: int):
+        while True:
+            time.sleep(interval)
+            try:
+                self.compact(retention_days)
+            except Exception as e:
+                logger.error(f"Database compaction failed: {e}", exc_info=True)
+
+    def close(self):
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+        self._reader_count = 0
+
+
+# Every Storage in this process, reset by a single post-fork handler (without keeping them alive)
+_instances = weakref.WeakSet()
+
+
+def _reset_in_child():
+    for instance in list(_instances):
+        instance._after_fork_in_child()
+
+
+os.register_at_fork(after_in_child=_reset_in_child)
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_storage() -> Storage:
+    """
+    Returns the process-wide Storage (shared by every service), restoring from GCS and
+    migrating on first use, so the database is downloaded at most once per process.
+    """
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = Storage(DB_PATH, restore=True, lazy=DB_RESTORE_MODE == "lazy")
+    return _storage
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Deletes raw rows older than the retention period and reclaims the space."
+    )
+    parser.add_argument("--db-path", default=DB_PATH)
+    parser.add_argument("--retention-days", type=int, default=RETENTION_DAYS)
+    parser.add_argument("--batch-size", type=int, default=RETENTION_DELETE_BATCH)
+    parser.add_argument("--backup", action="store_true", help="Upload a snapshot to GCS afterwards.")
+    args = parser.parse_args()
+    if args.retention_days <= 0:
+        parser.error("set --retention-days (or RETENTION_DAYS) to a positive number of days.")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    storage = Storage(args.db_path)
+    try:
+        report = storage.compact(args.retention_days, args.batch_size)
+        print(
+            f"Deleted {sum(report['deleted'].values())} rows before {report['cutoff']}; "
+            f"{report['bytes_before']:,} -> {report['bytes_after']:,} bytes "
+            f"({report['bytes_reclaimed']:,} reclaimed)."
+        )
+        if args.backup:
+            storage.backup()
+    finally:
+        storage.close()
+
+
+if __name__ == "__main__":
+    main()
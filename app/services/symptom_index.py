@@ -0,0 +1,110 @@
+"""
+Maps the free-text symptom names of a prediction request onto the symptom binarizer's vocabulary.
+
+MultiLabelBinarizer.transform() only matches exact strings: "cough", "Runny Nose" or "sore throat "
+are dropped with a warning, and every call builds a dense indicator row. SymptomIndex is built once
+from `symptom_binarizer.classes_` and resolves each name, in order, by:
+
+1. the raw string (cached, so repeated spellings cost one dictionary lookup);
+2. its normalized form: lowercased, punctuation, "-" and "_" turned into spaces, whitespace
+   collapsed; the same form without spaces ("runnynose") also matches;
+3. a clinical or colloquial alias from SYMPTOM_ALIASES ("dyspnea", "tiredness");
+4. difflib's closest vocabulary entry, if at least SYMPTOM_FUZZY_CUTOFF similar
+   ("shortnes of breath", "feverr").
+
+Names that resolve to nothing are dropped, as before, and logged. encode() returns the sorted
+column indices of the matched symptoms, which PredictionService writes straight into the feature
+row; encode_batch() does the same for many requests at once.
+"""
+import difflib
+import logging
+import re
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from app.core.config import SYMPTOM_FUZZY_CUTOFF
+
+logger = logging.getLogger(__name__)
+
+# Alternative names per vocabulary entry (normalized form). Entries for symptoms the binarizer
+# was not trained on are ignored.
+SYMPTOM_ALIASES: Dict[str, List[str]] = {
+    "body ache": ["body aches", "body pain", "aches", "muscle ache", "muscle aches", "muscle pain", "myalgia"],
+    "cough": ["coughing", "dry cough", "wet cough"],
+    "fatigue": ["tired", "tiredness", "exhaustion", "exhausted", "weakness", "lethargy"],
+    "fever": ["high temperature", "temperature", "pyrexia", "febrile", "feverish"],
+    "headache": ["head ache", "head pain", "headaches"],
+    "runny nose": ["running nose", "rhinorrhea", "rhinorrhoea", "nasal discharge", "stuffy nose"],
+    "shortness of breath": [
+        "short of breath", "breathlessness", "difficulty breathing", "trouble breathing", "dyspnea", "dyspnoea",
+    ],
+    "sore throat": ["throat pain", "scratchy throat", "pharyngitis"],
+}
+# Raw spellings remembered per index; past this, new spellings are still resolved but not cached
+_MAX_CACHED_SPELLINGS = 4096
+_SEPARATORS = re.compile(r"[^0-9a-z]+")
+
+
+def normalize_symptom(name: str) -> str:
+    """Lowercase words separated by single spaces: ' Shortness-of_Breath!' -> 'shortness of breath'."""
+    return _SEPARATORS.sub(" ", str(name).lower()).strip()
+
+
+class SymptomIndex:
+    """Lookup from symptom names (and their variants) to binarizer column indices."""
+
+    def __init__(
+        self,
+        classes: Sequence[str],
+        aliases: Dict[str, List[str]] = SYMPTOM_ALIASES,
+        fuzzy_cutoff: float = SYMPTOM_FUZZY_CUTOFF,
+    ):
+        self.classes = [str(c) for c in classes]
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self._keys: Dict[str, int] = {}
+        for column, name in enumerate(self.classes):
+            self._add_key(normalize_symptom(name), column)
+        for canonical, alternatives in aliases.items():
+            column = self._keys.get(normalize_symptom(canonical))
+            if column is None:
+                continue
+            for alias in alternatives:
+                self._add_key(normalize_symptom(alias), column)
+        self._fuzzy_keys = list(self._keys)
+        self._resolved: Dict[str, Optional[int]] = {name: column for column, name in enumerate(self.classes)}
+        self._lock = threading.Lock()
+
+    def _add_key(self, key: str, column: int):
+        # The first vocabulary entry to claim a spelling keeps it
+        for variant in (key, key.replace(" ", "")):
+            if variant:
+                self._keys.setdefault(variant, column)
+
+    def lookup(self, name: str) -> Optional[int]:
+        """Column index for `name`, or None if it matches no symptom in the vocabulary."""
+        try:
+            return self._resolved[name]
+        except (KeyError, TypeError):
+            pass
+        key = normalize_symptom(name)
+        column = self._keys.get(key)
+        if column is None:
+            column = self._keys.get(key.replace(" ", ""))
+        if column is None and key and self.fuzzy_cutoff < 1:
+            match = difflib.get_close_matches(key, self._fuzzy_keys, n=1, cutoff=self.fuzzy_cutoff)
+            if match:
+                column = self._keys[match[0]]
+                logger.info(f"Matched symptom '{name}' to '{self.classes[column]}'.")
+        if column is None:
+            logger.warning(f"Unknown symptom '{name}' ignored.")
+        if isinstance(name, str) and len(self._resolved) < _MAX_CACHED_SPELLINGS:
+            with self._lock:
+                self._resolved[name] = column
+        return column
+
+    def encode(self, symptoms: Iterable[str]) -> List[int]:
+        """Sorted, de-duplicated column indices of the recognized symptoms."""
+        return sorted({column for column in map(self.lookup, symptoms) if column is not None})
+
+    def encode_batch(self, batch: Iterable[Iterable[str]]) -> List[List[int]]:
+        return [self.encode(symptoms) for symptoms in batch]
@@ -0,0 +1,85 @@
+"""
+Per-call latency of the CNN: Keras predict() vs. the compiled tf.function path used by ImageService.
+
+    python -m benchmarks.cnn_inference                          # ml_models/cnn19.h5 if present
+    python -m benchmarks.cnn_inference --batch 1 32 --repeat 200 --intra-op 2
+
+Without ml_models/cnn19.h5, a randomly initialised CNN of similar shape (conv/pool stacks
+and a dense head on 150x150x3 input) is used; timings are about the call path, not accuracy.
+Requires TensorFlow.
+"""
+import argparse
+import os
+
+import numpy as np
+
+from benchmarks.common import print_table, save_results, time_calls
+
+MODEL_PATH = os.path.join("ml_models", "cnn19.h5")
+
+
+def build_stand_in_model(tf, img_size):
+    layers = tf.keras.layers
+    model = tf.keras.Sequential([
+        layers.Input(shape=(img_size[1], img_size[0], 3)),
+        layers.Conv2D(32, 3, activation="relu"),
+        layers.MaxPooling2D(),
+        layers.Conv2D(64, 3, activation="relu"),
+        layers.MaxPooling2D(),
+        layers.Conv2D(128, 3, activation="relu"),
+        layers.MaxPooling2D(),
+        layers.Flatten(),
+        layers.Dense(128, activation="relu"),
+        layers.Dense(1, activation="sigmoid"),
+    ])
+    return model
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 32])
+    parser.add_argument("--repeat", type=int, default=100)
+    parser.add_argument("--intra-op", type=int, help="TensorFlow intra-op threads (default: app setting)")
+    parser.add_argument("--inter-op", type=int, help="TensorFlow inter-op threads (default: app setting)")
+    parser.add_argument("--output", help="Result JSON path (default: benchmarks/results/cnn_inference-<commit>-<time>.json)")
+    args = parser.parse_args()
+
+    import tensorflow as tf
+
+    from app.core.config import TF_INTER_OP_THREADS, TF_INTRA_OP_THREADS
+    from app.services.image_preprocessing import IMG_SIZE
+    from app.services.image_service import compile_inference, configure_tensorflow_threads
+
+    configure_tensorflow_threads(args.intra_op or TF_INTRA_OP_THREADS, args.inter_op or TF_INTER_OP_THREADS)
+    if os.path.exists(MODEL_PATH):
+        model = tf.keras.models.load_model(MODEL_PATH)
+        print(f"Using {MODEL_PATH}")
+    else:
+        model = build_stand_in_model(tf, IMG_SIZE)
+        print(f"{MODEL_PATH} not found; using a stand-in CNN")
+    infer = compile_inference(model, IMG_SIZE)
+
+    rng = np.random.default_rng(0)
+    results = {}
+    for batch_size in args.batch:
+        images = rng.random((batch_size, IMG_SIZE[1], IMG_SIZE[0], 3), dtype=np.float32)
+        # Same outputs either way, so the comparison is only about call overhead
+        np.testing.assert_allclose(model.predict(images, verbose=0), infer(images).numpy(), rtol=1e-4, atol=1e-5)
+
+        results[f"keras_predict[batch={batch_size}]"] = time_calls(
+            lambda: model.predict(images, batch_size=batch_size, verbose=0), args.repeat, warmup=3
+        )
+        results[f"compiled_tf_function[batch={batch_size}]"] = time_calls(
+            lambda: infer(tf.convert_to_tensor(images)).numpy(), args.repeat, warmup=3
+        )
+
+    print_table(results)
+    for batch_size in args.batch:
+        before = results[f"keras_predict[batch={batch_size}]"]["p50_ms"]
+        after = results[f"compiled_tf_function[batch={batch_size}]"]["p50_ms"]
+        print(f"batch={batch_size}: p50 {before:.2f} ms -> {after:.2f} ms ({before / after:.1f}x)")
+    save_results("cnn_inference", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
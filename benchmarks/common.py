@@ -0,0 +1,106 @@
+"""
+Shared helpers for the benchmark suite: timing, latency summaries and result files.
+Results are written as JSON under benchmarks/results/ so runs can be compared across commits.
+"""
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+DATA_DIR = os.path.join(REPO_ROOT, "benchmarks", ".data")
+
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(pct / 100 * len(sorted_values))
+    return sorted_values[max(0, min(len(sorted_values), rank) - 1)]
+
+
+def summarize_latencies(latencies: List[float], wall_seconds: float = None) -> Dict:
+    """Summarizes latencies (seconds) as milliseconds plus throughput."""
+    values = sorted(latencies)
+    count = len(values)
+    total = sum(values)
+    summary = {
+        "count": count,
+        "mean_ms": (total / count * 1000) if count else 0.0,
+        "min_ms": values[0] * 1000 if count else 0.0,
+        "p50_ms": percentile(values, 50) * 1000,
+        "p95_ms": percentile(values, 95) * 1000,
+        "p99_ms": percentile(values, 99) * 1000,
+        "max_ms": values[-1] * 1000 if count else 0.0,
+    }
+    elapsed = wall_seconds if wall_seconds is not None else total
+    summary["ops_per_sec"] = count / elapsed if elapsed else 0.0
+    return summary
+
+
+def time_calls(fn: Callable, repeat: int, warmup: int = 1) -> Dict:
+    """Calls `fn` `warmup` times untimed, then `repeat` times timed, and summarizes."""
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - t0)
+    return summarize_latencies(latencies, time.perf_counter() - start)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return "unknown"
+
+
+def save_results(suite: str, results: Dict, output: str = None) -> str:
+    """Writes results plus run metadata to a JSON file and returns its path."""
+    commit = git_commit()
+    payload = {
+        "suite": suite,
+        "commit": commit,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"{suite}-{commit}-{stamp}.json")
+    with open(output, "w") as f:
+        json.dump(payload, f, indent=2)
+    print(f"Results written to {output}")
+    return output
+
+
+def print_table(rows: Dict[str, Dict]):
+    """Prints {name: summary} as an aligned table."""
+    header = f"{'benchmark':<44} {'n':>6} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'ops/s':>10}"
+    print(header)
+    print("-" * len(header))
+    for name, s in rows.items():
+        if "error" in s:
+            print(f"{name:<44} {s['error']}")
+            continue
+        print(
+            f"{name:<44} {s['count']:>6} {s['p50_ms']:>10.3f} {s['p95_ms']:>10.3f} "
+            f"{s['p99_ms']:>10.3f} {s['ops_per_sec']:>10.1f}"
+        )
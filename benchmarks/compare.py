@@ -0,0 +1,60 @@
+"""
+Compares two benchmark result files and flags regressions.
+
+    python -m benchmarks.compare benchmarks/results/micro-abc123-....json benchmarks/results/micro-def456-....json
+    python -m benchmarks.compare base.json head.json --threshold 10 --metric p95_ms
+
+Exits with status 1 if any benchmark's metric got worse by more than --threshold percent.
+"""
+import argparse
+import json
+import sys
+
+LOWER_IS_BETTER = ("mean_ms", "p50_ms", "p95_ms", "p99_ms")
+
+
+def _load(path: str) -> tuple:
+    with open(path) as f:
+        payload = json.load(f)
+    results = payload["results"]
+    # Load-test files nest per-scenario summaries one level down
+    return payload.get("commit", "?"), results.get("scenarios", results)
+
+
+def compare(base: dict, head: dict, metric: str, threshold: float) -> list:
+    """Returns rows of (name, base_value, head_value, change_pct, regressed)."""
+    rows = []
+    for name in sorted(set(base) & set(head)):
+        if metric not in base[name] or metric not in head[name]:
+            continue
+        old, new = base[name][metric], head[name][metric]
+        change = ((new - old) / old * 100) if old else 0.0
+        worse = change if metric in LOWER_IS_BETTER else -change
+        rows.append((name, old, new, change, worse > threshold))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--metric", default="p50_ms", choices=[*LOWER_IS_BETTER, "ops_per_sec"])
+    parser.add_argument("--threshold", type=float, default=10.0, help="Allowed regression in percent.")
+    args = parser.parse_args()
+
+    base_commit, base = _load(args.base)
+    head_commit, head = _load(args.head)
+    rows = compare(base, head, args.metric, args.threshold)
+
+    print(f"{args.metric}: {base_commit} -> {head_commit}")
+    print(f"{'benchmark':<44} {'base':>12} {'head':>12} {'change':>9}")
+    for name, old, new, change, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{name:<44} {old:>12.3f} {new:>12.3f} {change:>+8.1f}%{flag}")
+
+    if any(regressed for *_, regressed in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
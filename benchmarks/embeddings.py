@@ -0,0 +1,101 @@
+"""
+Embedding backends: HuggingFaceEmbeddings (PyTorch) vs. the int8 ONNX export (EMBEDDING_BACKEND=onnx).
+
+    python -m benchmarks.embeddings                                   # ml_models/minilm-onnx
+    python -m benchmarks.embeddings --onnx-dir /tmp/minilm-onnx --repeat 500
+
+Measures, per backend:
+- startup:   import + model load + first embedding, in a fresh interpreter, and its peak RSS (Linux)
+- query:     embed_query latency (one short question, as the retriever does per chat turn)
+- documents: embed_documents over --docs texts (batching)
+plus the cosine similarity between the two backends' vectors.
+Requires both backends' dependencies and an export from `python -m app.services.onnx_embeddings`.
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+import numpy as np
+
+from benchmarks.common import REPO_ROOT, print_table, save_results, time_calls
+from benchmarks.fakes import MEDICAL_CORPUS
+
+_STARTUP_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+if sys.argv[1] == "onnx":
+    from app.services.onnx_embeddings import OnnxMiniLMEmbeddings
+    embeddings = OnnxMiniLMEmbeddings(sys.argv[2])
+else:
+    from langchain_huggingface import HuggingFaceEmbeddings
+    embeddings = HuggingFaceEmbeddings(model_name=sys.argv[2])
+embeddings.embed_query("What is a fever?")
+elapsed = time.perf_counter() - start
+with open("/proc/self/status") as f:  # VmHWM: peak RSS of this process image
+    peak_kib = next(int(line.split()[1]) for line in f if line.startswith("VmHWM:"))
+print(json.dumps({"startup_s": elapsed, "max_rss_mib": peak_kib / 1024}))
+"""
+
+
+def measure_startup(backend: str, model: str) -> dict:
+    output = subprocess.check_output([sys.executable, "-c", _STARTUP_SCRIPT, backend, model], cwd=REPO_ROOT)
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def main():
+    from app.core.config import ONNX_EMBEDDING_DIR
+    from app.services.onnx_embeddings import MODEL_NAME
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=MODEL_NAME, help="Reference model for HuggingFaceEmbeddings.")
+    parser.add_argument("--onnx-dir", default=ONNX_EMBEDDING_DIR)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--docs", type=int, default=64, help="Texts per embed_documents call.")
+    parser.add_argument("--output", help="Result JSON path (default: benchmarks/results/embeddings-<commit>-<time>.json)")
+    args = parser.parse_args()
+
+    results = {}
+    # Before this process loads anything, so the child interpreters start from a small parent
+    startup = {}
+    for backend, model in (("huggingface", args.model), ("onnx", args.onnx_dir)):
+        startup[backend] = results[f"{backend}.startup"] = measure_startup(backend, model)
+
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    from app.services.onnx_embeddings import OnnxMiniLMEmbeddings
+
+    backends = {
+        "huggingface": HuggingFaceEmbeddings(model_name=args.model),
+        "onnx_int8": OnnxMiniLMEmbeddings(args.onnx_dir),
+    }
+    documents = [MEDICAL_CORPUS[i % len(MEDICAL_CORPUS)] + f" (note {i})" for i in range(args.docs)]
+
+    vectors = {}
+    for name, embeddings in backends.items():
+        vectors[name] = np.array(embeddings.embed_documents(documents))
+        results[f"{name}.embed_query"] = time_calls(
+            lambda: embeddings.embed_query("Is a fever of 38.5 C dangerous?"), args.repeat, warmup=5
+        )
+        results[f"{name}.embed_documents[{args.docs}]"] = time_calls(
+            lambda: embeddings.embed_documents(documents), max(1, args.repeat // 10), warmup=1
+        )
+    print_table({name: r for name, r in results.items() if "p50_ms" in r})
+
+    reference = vectors["huggingface"] / np.linalg.norm(vectors["huggingface"], axis=1, keepdims=True)
+    cosines = (reference * vectors["onnx_int8"]).sum(axis=1)
+    results["parity"] = {"min_cosine": float(cosines.min()), "mean_cosine": float(cosines.mean())}
+    print(f"\nCosine similarity onnx_int8 vs huggingface: min {cosines.min():.4f}, mean {cosines.mean():.4f}")
+
+    print(f"\n{'backend':<12} {'startup s':>10} {'peak RSS MiB':>13}")
+    for backend, s in startup.items():
+        print(f"{backend:<12} {s['startup_s']:>10.2f} {s['max_rss_mib']:>13.0f}")
+
+    query = {name: results[f"{name}.embed_query"]["p50_ms"] for name in backends}
+    print(f"\nembed_query p50: {query['huggingface']:.2f} ms -> {query['onnx_int8']:.2f} ms "
+          f"({query['huggingface'] / query['onnx_int8']:.1f}x)")
+    save_results("embeddings", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""
+Deterministic local stand-ins for the external services and model artifacts,
+so benchmarks and load tests run offline and give comparable numbers between runs.
+
+- Gemini is replaced by the fake LLM server (app/services/fake_llm.py), reached through the
+  same FakeServerChatModel and resilience layer the app uses with LLM_BACKEND=fake.
+- FakeQAChain / FakeSummarizeChain replace the LangChain chains around it.
+- FakeRetriever replaces the Pinecone retriever.
+- FakeBucket replaces the GCS bucket with a local directory (LocalDirBucket plus latency).
+- FakeImageModel / FakeSymptomPipeline replace the CNN and sklearn artifacts when
+  ml_models/ is not available (or when --fake-models is requested).
+
+Latencies are drawn from a seeded log-normal distribution, so every run sees the
+same sequence of delays.
+"""
+import math
+import os
+import random
+import sqlite3
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from app.services.gcs_storage import LocalDirBucket
+
+MEDICAL_CORPUS = [
+    "Fever is a temporary increase in body temperature, often due to an illness.",
+    "Influenza is a viral infection that attacks the respiratory system.",
+    "Pneumonia is an infection that inflames the air sacs in one or both lungs.",
+    "Bronchitis is an inflammation of the lining of the bronchial tubes.",
+    "The common cold is a viral infection of the nose and throat.",
+    "Hypertension is a condition in which blood pressure is persistently elevated.",
+    "Oxygen saturation below 92 percent may indicate a respiratory problem.",
+    "A chest X-ray can show signs of pneumonia such as consolidation.",
+]
+
+SYMPTOMS = ["Body ache", "Cough", "Fatigue", "Fever", "Headache", "Runny nose", "Shortness of breath", "Sore throat"]
+DIAGNOSES = ["Bronchitis", "Cold", "Flu", "Healthy", "Pneumonia"]
+
+
+class SeededLatency:
+    """Log-normal latency generator (median in ms) with a fixed seed."""
+
+    def __init__(self, median_ms: float, sigma: float = 0.4, seed: int = 0):
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def next_seconds(self) -> float:
+        if self.median_ms <= 0:
+            return 0.0
+        with self._lock:
+            factor = self._rng.lognormvariate(0.0, self.sigma)
+        return self.median_ms * factor / 1000
+
+    def sleep(self):
+        delay = self.next_seconds()
+        if delay:
+            time.sleep(delay)
+
+
+class FakeRetriever:
+    """Stand-in for the Pinecone retriever: ranks a small corpus by word overlap."""
+
+    def __init__(self, latency_ms: float = 60, k: int = 3, seed: int = 2):
+        self.latency = SeededLatency(latency_ms, seed=seed)
+        self.k = k
+
+    def invoke(self, query: str) -> list:
+        self.latency.sleep()
+        words = set(query.lower().split())
+        ranked = sorted(MEDICAL_CORPUS, key=lambda doc: (-len(words & set(doc.lower().split())), doc))
+        return [SimpleNamespace(page_content=doc, metadata={}) for doc in ranked[: self.k]]
+
+
+class FakeQAChain:
+    """Stand-in for ConversationalRetrievalChain: condense (if history), retrieve, answer."""
+
+    def __init__(self, llm, retriever: FakeRetriever):
+        self.llm = llm
+        self.retriever = retriever
+
+    def invoke(self, inputs: dict, config: dict = None) -> dict:
+        question = inputs["question"]
+        if inputs.get("chat_history"):
+            question = self.llm.invoke(f"Condense: {inputs['chat_history']} {question}").content
+        docs = self.retriever.invoke(question)
+        context = " ".join(d.page_content for d in docs)
+        answer = self.llm.invoke(f"Context: {context} Question: {inputs['question']}").content
+        return {"answer": answer, "source_documents": docs}
+
+
+class FakeSummarizeChain:
+    """Stand-in for the stuff summarization chain."""
+
+    def __init__(self, llm):
+        self.llm = llm
+
+    def invoke(self, docs: list, config: dict = None) -> dict:
+        text = " ".join(d.page_content for d in docs)
+        return {"output_text": self.llm.invoke(f"Summarize: {text}").content}
+
+
+class FakeBucket(LocalDirBucket):
+    """LocalDirBucket with a simulated GCS round-trip latency on every transfer."""
+
+    def __init__(self, root: str, latency_ms: float = 30, seed: int = 3):
+        super().__init__(root)
+        self.latency = SeededLatency(latency_ms, seed=seed)
+
+    def on_request(self, operation: str, name: str):
+        self.latency.sleep()
+
+
+class FakeImageModel:
+    """Stand-in for the Keras CNN: a sigmoid of the mean pixel value, with a fixed compute cost."""
+
+    def __init__(self, latency_ms: float = 0):
+        self.latency = SeededLatency(latency_ms, seed=4)
+
+    def predict(self, batch, batch_size=None, verbose=0):
+        self.latency.sleep()
+        means = np.asarray(batch, dtype=np.float32).reshape(len(batch), -1).mean(axis=1)
+        return (1 / (1 + np.exp(-(means - 0.5) * 8))).reshape(-1, 1)
+
+
+class FakeSymptomPipeline:
+    """Stand-in for the sklearn pipeline: deterministic diagnosis from the feature row."""
+
+    def __init__(self, symptoms=SYMPTOMS):
+        self.feature_names_in_ = np.array(
+            ["Age", "Gender", "Heart_Rate_bpm", "Body_Temperature_C", "Oxygen_Saturation_%",
+             "Systolic_BP", "Diastolic_BP", *symptoms],
+            dtype=object,
+        )
+
+    def predict(self, df):
+        row = df.iloc[0]
+        score = int(row["Age"]) + int(row["Heart_Rate_bpm"]) + int(math.floor(row["Body_Temperature_C"]))
+        return np.array([DIAGNOSES[score % len(DIAGNOSES)]])
+
+
+def build_fake_symptom_binarizer(symptoms=SYMPTOMS):
+    from sklearn.preprocessing import MultiLabelBinarizer
+
+    binarizer = MultiLabelBinarizer()
+    binarizer.fit([symptoms])
+    return binarizer
+
+
+def ensure_tables(db_path: str):
+    """
+    Creates the base tables without opening a Storage (so bulk loads skip WAL and the
+    rollup trigger). Storage applies the remaining migrations when it first opens the file.
+    """
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS predictions (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+        "diagnosis TEXT NOT NULL, timestamp DATETIME NOT NULL)"
+    )
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS chatbot_queries (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+        "topic TEXT NOT NULL, timestamp DATETIME NOT NULL)"
+    )
+    conn.commit()
+    conn.close()
+
+
+def install_fakes(
+    db_path: str,
+    bucket_dir: str = None,
+    fake_models: bool = False,
+    llm_latency_ms: float = 400,
+    retriever_latency_ms: float = 60,
+    gcs_latency_ms: float = 30,
+    services: tuple = ("prediction", "image", "assistant"),
+):
+    """
+    Wires the fakes into the selected services. Must be called BEFORE importing app.main,
+    because the routers instantiate their services at import time and the services
+    skip their own initialization when the class-level artifacts are already set.
+    Returns the started FakeLLMServer (or None when the assistant is not selected).
+    """
+    from app.services import gcs_storage, storage
+
+    ensure_tables(db_path)
+    storage.DB_PATH = db_path
+    storage._storage = None  # reopened (and migrated) on first use at db_path
+    if bucket_dir:
+        gcs_storage._bucket = FakeBucket(bucket_dir, latency_ms=gcs_latency_ms)
+        gcs_storage._gcs_available = True
+
+    if "prediction" in services:
+        from app.services import prediction_service
+
+        if fake_models or not os.path.exists(os.path.join("ml_models", "best_pipeline_LogisticRegression.joblib")):
+            prediction_service.PredictionService._model_pipeline = FakeSymptomPipeline()
+            prediction_service.PredictionService._symptom_binarizer = build_fake_symptom_binarizer()
+
+    if "image" in services and (fake_models or not os.path.exists(os.path.join("ml_models", "cnn19.h5"))):
+        from app.services.image_service import ImageService
+
+        ImageService._model = FakeImageModel()
+
+    if "assistant" not in services:
+        return None
+
+    from app.services import chatbot_service
+    from app.services.fake_llm import FakeLLMServer
+    from app.services.llm_client import ResilientLLMClient
+
+    server = FakeLLMServer(median_ms=llm_latency_ms, seed=1).start()
+    llm = chatbot_service.ResilientChatModel(
+        inner=chatbot_service.FakeServerChatModel(url=server.url, timeout=chatbot_service.LLM_TIMEOUT_SECONDS),
+        client=ResilientLLMClient("fake"),
+    )
+    chatbot_service.ChatbotService._llm = llm
+    chatbot_service.ChatbotService._qa_chain = FakeQAChain(llm, FakeRetriever(latency_ms=retriever_latency_ms))
+    chatbot_service.ChatbotService._summarize_chain = FakeSummarizeChain(llm)
+    return server
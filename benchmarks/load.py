@@ -0,0 +1,139 @@
+"""
+Concurrent HTTP load harness for the API endpoints.
+
+    python -m benchmarks.load                                   # all scenarios, local server with fakes
+    python -m benchmarks.load --scenario predict analyze --concurrency 32 --requests 1000
+    python -m benchmarks.load --url http://localhost:8000 --scenario trends --duration 30
+
+Without --url, the app is started in-process on a free port (real HTTP via uvicorn)
+with Gemini, Pinecone and GCS replaced by the deterministic fakes in benchmarks/fakes.py.
+Reports p50/p95/p99 latency, requests/sec and status counts per scenario, and writes
+them to a JSON file for comparison between commits (see benchmarks/compare.py).
+"""
+import argparse
+import asyncio
+import base64
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import httpx
+
+from benchmarks.common import print_table, save_results, summarize_latencies
+from benchmarks.fakes import install_fakes
+from benchmarks.micro import PREDICT_PAYLOAD, xray_like_png
+
+_XRAY = xray_like_png(512)
+
+SCENARIOS = {
+    "predict": ("POST", "/predict/", {"json": PREDICT_PAYLOAD}),
+    "analyze": ("POST", "/analyze/", {"json": {"image_base64": base64.b64encode(_XRAY).decode()}}),
+    "analyze_raw": ("POST", "/analyze/raw", {"content": _XRAY, "headers": {"Content-Type": "image/png"}}),
+    "trends": ("GET", "/predict/trends", {}),
+    "chat": ("POST", "/assistant/chat", {"json": {"question": "What is a fever?", "chat_history": []}}),
+    "summarize": ("POST", "/assistant/summarize", {"json": {"raw_text": "Chest X-ray shows mild consolidation."}}),
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_local_server(workdir: str, args) -> str:
+    """Installs the fakes, imports the app and serves it from a background thread."""
+    install_fakes(
+        os.path.join(workdir, "predictions.db"),
+        bucket_dir=os.path.join(workdir, "bucket"),
+        fake_models=args.fake_models,
+        llm_latency_ms=args.llm_latency_ms,
+        retriever_latency_ms=args.retriever_latency_ms,
+        gcs_latency_ms=args.gcs_latency_ms,
+    )
+    import logging
+
+    import uvicorn
+
+    from app.main import app
+
+    logging.getLogger().setLevel(logging.WARNING)
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+
+async def run_scenario(base_url: str, name: str, concurrency: int, total: int, duration: float) -> dict:
+    method, path, request_kwargs = SCENARIOS[name]
+    latencies, statuses = [], Counter()
+    issued = 0
+    deadline = time.perf_counter() + duration if duration else None
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+
+        async def worker():
+            nonlocal issued
+            while True:
+                if deadline is not None:
+                    if time.perf_counter() >= deadline:
+                        return
+                elif issued >= total:
+                    return
+                issued += 1
+                t0 = time.perf_counter()
+                try:
+                    response = await client.request(method, path, **request_kwargs)
+                    statuses[str(response.status_code)] += 1
+                except httpx.HTTPError as e:
+                    statuses[type(e).__name__] += 1
+                latencies.append(time.perf_counter() - t0)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall = time.perf_counter() - started
+
+    summary = summarize_latencies(latencies, wall)
+    summary["concurrency"] = concurrency
+    summary["statuses"] = dict(statuses)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Target an already running server instead of starting one with fakes.")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), nargs="+")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario.")
+    parser.add_argument("--duration", type=float, default=0, help="Seconds per scenario (overrides --requests).")
+    parser.add_argument("--fake-models", action="store_true", help="Use fake models even if ml_models/ exists.")
+    parser.add_argument("--llm-latency-ms", type=float, default=400)
+    parser.add_argument("--retriever-latency-ms", type=float, default=60)
+    parser.add_argument("--gcs-latency-ms", type=float, default=30)
+    parser.add_argument("--output", help="Result JSON path (default: benchmarks/results/load-<commit>-<time>.json)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench-load-")
+    try:
+        base_url = args.url or start_local_server(workdir, args)
+        results = {}
+        for name in args.scenario or list(SCENARIOS):
+            print(f"Running '{name}' against {base_url} ...")
+            results[name] = asyncio.run(
+                run_scenario(base_url, name, args.concurrency, args.requests, args.duration)
+            )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print_table(results)
+    save_results("load", {"target": args.url or "local-fakes", "scenarios": results}, args.output)
+
+
+if __name__ == "__main__":
+    main()
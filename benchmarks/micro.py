@@ -0,0 +1,150 @@
+"""
+Microbenchmarks for the hot service functions.
+
+    python -m benchmarks.micro                           # default sizes
+    python -m benchmarks.micro --rows 10000 1000000 10000000 --only trends
+    python -m benchmarks.micro --fake-models --output before.json
+
+Benchmarks:
+- predict:   PredictionService.predict, including the SQLite insert (GCS is faked)
+- validate:  ImageValidator.validate_image_bytes on PNGs of several sizes
+- trends:    PredictionService.get_trends on synthetic DBs of --rows rows
+- analytics: AnalyticsService.get_trends (full history and one week) on the same DBs
+"""
+import argparse
+import io
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from PIL import Image
+
+from benchmarks.common import print_table, save_results, time_calls
+from benchmarks.fakes import FakeBucket, install_fakes
+from benchmarks.synthetic_db import build_synthetic_db
+
+PREDICT_PAYLOAD = {
+    "Age": 52,
+    "Gender": "Female",
+    "Heart_Rate_bpm": 90,
+    "Body_Temperature_C": 38.5,
+    "Oxygen_Saturation_%": 94.0,
+    "Systolic_BP": 140,
+    "Diastolic_BP": 90,
+    "symptoms": ["Cough", "Fever", "Body ache"],
+}
+
+
+def xray_like_png(size: int, seed: int = 0) -> bytes:
+    """A grayscale gradient with noise that passes ImageValidator's checks."""
+    rng = np.random.default_rng(seed)
+    gradient = np.linspace(20, 220, size, dtype=np.float32)[None, :].repeat(size, axis=0)
+    pixels = np.clip(gradient + rng.normal(0, 15, (size, size)), 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels, mode="L").convert("RGB").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def bench_predict(workdir: str, repeat: int, with_gcs: bool) -> dict:
+    from app.services import gcs_storage
+    from app.services.prediction_service import PredictionService
+
+    results = {}
+    service = PredictionService()
+    results["predict"] = time_calls(lambda: service.predict(dict(PREDICT_PAYLOAD)), repeat)
+    if with_gcs:
+        gcs_storage._bucket = FakeBucket(os.path.join(workdir, "bucket"))
+        gcs_storage._gcs_available = True
+        results["predict+gcs_backup"] = time_calls(lambda: service.predict(dict(PREDICT_PAYLOAD)), repeat)
+        gcs_storage._gcs_available = False
+    return results
+
+
+def bench_validate(repeat: int) -> dict:
+    from app.services.image_validator import ImageValidator
+
+    validator = ImageValidator()
+    results = {}
+    for size in (256, 1024, 2048):
+        data = xray_like_png(size)
+        results[f"validate_image_bytes[{size}px]"] = time_calls(
+            lambda: validator.validate_image_bytes(data), repeat
+        )
+    return results
+
+
+def bench_trends(rows_list: list, repeat: int) -> dict:
+    from app.services.prediction_service import PredictionService
+    from app.services.storage import Storage
+
+    service = PredictionService()
+    original_storage = PredictionService._storage
+    results = {}
+    try:
+        for rows in rows_list:
+            PredictionService._storage = Storage(build_synthetic_db(rows))
+            # Large tables are slow by design (that's what we measure), so scale repeats down
+            scaled_repeat = max(3, repeat if rows <= 100_000 else repeat // 10)
+            results[f"get_trends[{rows}]"] = time_calls(service.get_trends, scaled_repeat)
+            PredictionService._storage.close()
+    finally:
+        PredictionService._storage = original_storage
+    return results
+
+
+def bench_analytics(rows_list: list, repeat: int) -> dict:
+    from datetime import date, timedelta
+
+    from app.services.analytics_service import AnalyticsService
+    from app.services.storage import Storage
+
+    results = {}
+    for rows in rows_list:
+        storage = Storage(build_synthetic_db(rows))
+        service = AnalyticsService(storage)
+        results[f"analytics_full_history[{rows}]"] = time_calls(lambda: service.get_trends(), repeat)
+        week_end = date.today()
+        results[f"analytics_one_week[{rows}]"] = time_calls(
+            lambda: service.get_trends(week_end - timedelta(days=6), week_end), repeat
+        )
+        storage.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--only", choices=["predict", "validate", "trends", "analytics"], nargs="+")
+    parser.add_argument("--fake-models", action="store_true", help="Use fake models even if ml_models/ exists.")
+    parser.add_argument("--with-gcs", action="store_true", help="Also time predict with the fake GCS backup.")
+    parser.add_argument("--output", help="Result JSON path (default: benchmarks/results/micro-<commit>-<time>.json)")
+    args = parser.parse_args()
+    selected = set(args.only or ["predict", "validate", "trends", "analytics"])
+
+    workdir = tempfile.mkdtemp(prefix="bench-micro-")
+    try:
+        install_fakes(
+            os.path.join(workdir, "predictions.db"),
+            fake_models=args.fake_models,
+            services=("prediction",),
+        )
+        results = {}
+        if "predict" in selected:
+            results.update(bench_predict(workdir, args.repeat, args.with_gcs))
+        if "validate" in selected:
+            results.update(bench_validate(args.repeat))
+        if "trends" in selected:
+            results.update(bench_trends(args.rows, args.repeat))
+        if "analytics" in selected:
+            results.update(bench_analytics(args.rows, args.repeat))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print_table(results)
+    save_results("micro", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Builds synthetic predictions.db files for benchmarking trend and analytics queries.
+
+    python -m benchmarks.synthetic_db --rows 1000000
+
+Rows are spread evenly over `--days` days ending today, with a fixed seed,
+so the same row count always produces the same database. Files are cached
+under benchmarks/.data/ and reused by later runs.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import DATA_DIR
+from benchmarks.fakes import DIAGNOSES, ensure_tables
+
+TOPICS = ["Fever", "Flu", "Pneumonia", "Asthma", "Diabetes", "Hypertension", "Migraine", "Covid"]
+INSERT_BATCH = 50_000
+
+
+def synthetic_db_path(rows: int) -> str:
+    return os.path.join(DATA_DIR, f"predictions_{rows}.db")
+
+
+def build_synthetic_db(rows: int, days: int = 3 * 365, path: str = None, seed: int = 42) -> str:
+    """Creates (or reuses) a database with `rows` predictions and rows/10 chatbot queries."""
+    path = path or synthetic_db_path(rows)
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    ensure_tables(tmp_path)
+
+    rng = random.Random(seed)
+    end = datetime.now().replace(microsecond=0)
+    start = end - timedelta(days=days)
+    span = (end - start).total_seconds()
+
+    def _rows(count, labels):
+        step = span / max(count, 1)
+        for i in range(count):
+            ts = start + timedelta(seconds=i * step)
+            yield rng.choice(labels), ts.strftime("%Y-%m-%d %H:%M:%S.%f")
+
+    conn = sqlite3.connect(tmp_path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    began = time.perf_counter()
+    for table, column, count, labels in (
+        ("predictions", "diagnosis", rows, DIAGNOSES),
+        ("chatbot_queries", "topic", max(rows // 10, 1), TOPICS),
+    ):
+        generator = _rows(count, labels)
+        while True:
+            batch = [row for _, row in zip(range(INSERT_BATCH), generator)]
+            if not batch:
+                break
+            conn.executemany(f"INSERT INTO {table} ({column}, timestamp) VALUES (?, ?)", batch)
+        conn.commit()
+    conn.close()
+    os.replace(tmp_path, path)
+    print(f"Built {path} with {rows:,} predictions in {time.perf_counter() - began:.1f}s")
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000])
+    parser.add_argument("--days", type=int, default=3 * 365)
+    args = parser.parse_args()
+    for rows in args.rows:
+        print(build_synthetic_db(rows, days=args.days))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Per-worker memory under gunicorn with preloaded (copy-on-write shared) models.
+
+    python -m benchmarks.worker_memory                       # 1, 2 and 4 workers, real models if present
+    python -m benchmarks.worker_memory --workers 1 8 --fake-models --requests 200
+
+For each worker count, gunicorn is started with gunicorn.conf.py (Gemini, Pinecone and GCS
+replaced by the fakes in benchmarks/fakes.py), warmed up with /predict and /analyze requests,
+then every process is measured from /proc/<pid>/smaps_rollup (Linux only):
+
+- rss:     resident memory, counting shared pages in full (the naive "per worker" number)
+- pss:     proportional share; summing PSS over master + workers gives the real footprint
+- private: pages only this process holds (what each additional worker costs)
+"""
+import argparse
+import base64
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.common import REPO_ROOT, save_results
+from benchmarks.micro import PREDICT_PAYLOAD, xray_like_png
+
+_FIELDS = {"Rss": "rss", "Pss": "pss", "Private_Clean": "private", "Private_Dirty": "private"}
+
+
+def __getattr__(name):
+    """
+    `gunicorn benchmarks.worker_memory:app` entry point: installs the fakes (configured via
+    BENCH_* environment variables) before importing the real app, in the master.
+    """
+    if name != "app":
+        raise AttributeError(name)
+    from benchmarks.fakes import install_fakes
+
+    workdir = os.environ["BENCH_WORKDIR"]
+    install_fakes(
+        os.path.join(workdir, "predictions.db"),
+        bucket_dir=os.path.join(workdir, "bucket"),
+        fake_models=os.getenv("BENCH_FAKE_MODELS") == "1",
+        llm_latency_ms=0,
+        retriever_latency_ms=0,
+        gcs_latency_ms=0,
+    )
+    from app.main import app
+
+    return app
+
+
+def read_memory(pid: int) -> dict:
+    """Returns rss/pss/private in MiB for one process."""
+    totals = {"rss": 0, "pss": 0, "private": 0}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in _FIELDS:
+                totals[_FIELDS[key]] += int(rest.split()[0])
+    return {k: v / 1024 for k, v in totals.items()}
+
+
+def child_pids(parent: int) -> list:
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name may contain spaces; fields after it are fixed
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == parent:
+            children.append(int(entry))
+    return children
+
+
+def measure(workers: int, args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="bench-workers-")
+    port = 18000 + workers
+    env = dict(
+        os.environ,
+        WEB_CONCURRENCY=str(workers),
+        PORT=str(port),
+        BENCH_WORKDIR=workdir,
+        BENCH_FAKE_MODELS="1" if args.fake_models else "0",
+        PROMETHEUS_MULTIPROC_DIR=os.path.join(workdir, "prometheus"),
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--access-logfile", "/dev/null",
+         "benchmarks.worker_memory:app"],
+        cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.time() + args.startup_timeout
+        with httpx.Client(base_url=base_url, timeout=60) as client:
+            while True:
+                try:
+                    client.get("/")
+                    break
+                except httpx.TransportError:
+                    if server.poll() is not None or time.time() > deadline:
+                        raise RuntimeError(f"gunicorn with {workers} workers did not start")
+                    time.sleep(0.5)
+            # Let every worker touch the models so copy-on-write has happened before measuring
+            image = {"image_base64": base64.b64encode(xray_like_png(512)).decode()}
+            for _ in range(args.requests * workers):
+                client.post("/predict/", json=PREDICT_PAYLOAD)
+                client.post("/analyze/", json=image)
+        time.sleep(1)
+
+        master = read_memory(server.pid)
+        per_worker = [read_memory(pid) for pid in child_pids(server.pid)]
+        mean = {k: sum(w[k] for w in per_worker) / len(per_worker) for k in ("rss", "pss", "private")}
+        return {
+            "workers": len(per_worker),
+            "master_rss_mib": master["rss"],
+            "worker_rss_mib": mean["rss"],
+            "worker_pss_mib": mean["pss"],
+            "worker_private_mib": mean["private"],
+            "rss_sum_mib": master["rss"] + sum(w["rss"] for w in per_worker),
+            "total_pss_mib": master["pss"] + sum(w["pss"] for w in per_worker),
+        }
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=60)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--requests", type=int, default=50, help="Warm-up requests per worker and endpoint.")
+    parser.add_argument("--fake-models", action="store_true", help="Use fake models even if ml_models/ exists.")
+    parser.add_argument("--startup-timeout", type=float, default=300)
+    parser.add_argument("--output", help="Result JSON path (default: benchmarks/results/worker_memory-<commit>-<time>.json)")
+    args = parser.parse_args()
+
+    results = {f"workers[{n}]": measure(n, args) for n in args.workers}
+
+    header = f"{'workers':>7} {'master RSS':>11} {'worker RSS':>11} {'worker PSS':>11} {'private':>9} {'RSS sum':>9} {'total PSS':>10}"
+    print(header)
+    print("-" * len(header))
+    for r in results.values():
+        print(
+            f"{r['workers']:>7} {r['master_rss_mib']:>11.1f} {r['worker_rss_mib']:>11.1f} {r['worker_pss_mib']:>11.1f} "
+            f"{r['worker_private_mib']:>9.1f} {r['rss_sum_mib']:>9.1f} {r['total_pss_mib']:>10.1f}"
+        )
+    print("(MiB; total PSS is the real footprint, RSS sum double-counts shared model pages)")
+    save_results("worker_memory", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
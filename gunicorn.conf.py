@@ -0,0 +1,88 @@
+"""
+Gunicorn settings for multi-worker serving:
+
+    gunicorn -c gunicorn.conf.py app.main:app
+
+- The app (and with it the sklearn pipeline and symptom binarizer) is imported once in the
+  master before forking, so workers share that memory copy-on-write. The Keras CNN is the
+  exception: TensorFlow's runtime hangs when initialized in the master and used in a forked
+  worker, so each worker loads (and warms up) its own CNN right after the fork. The Gemini
+  (gRPC) and Pinecone clients are also built per worker, after the fork.
+- The master restores the SQLite database from GCS once (during that import, or alongside it
+  with DB_RESTORE_MODE=lazy; workers are forked only after it finishes) and is the
+  backup leader: it uploads a snapshot periodically and on shutdown, instead of every
+  worker uploading after each write. With RETENTION_DAYS set, it also runs the daily retention
+  job (old raw rows are deleted; the daily rollups behind the charts are kept).
+- Prometheus metrics from all workers are aggregated through PROMETHEUS_MULTIPROC_DIR.
+
+Every setting can be overridden with the environment variables below.
+"""
+import gc
+import os
+import shutil
+import tempfile
+
+# --- Prometheus multiprocess mode (must be set before prometheus_client is imported) ---
+_metrics_dir = os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "healthcare-prometheus")
+)
+shutil.rmtree(_metrics_dir, ignore_errors=True)
+os.makedirs(_metrics_dir, exist_ok=True)
+
+# --- Server ---
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+# The app sizes TensorFlow's per-process thread pools from this (see app/core/config.py)
+os.environ["WEB_CONCURRENCY"] = str(workers)
+os.environ["CNN_LOAD_AFTER_FORK"] = "true"
+os.environ["LLM_LOAD_AFTER_FORK"] = "true"
+worker_class = "uvicorn.workers.UvicornWorker"
+# Load models and restore the database once, in the master
+preload_app = True
+# Model loading and LLM calls can be slow; Cloud Run enforces its own request timeout
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "300"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+accesslog = "-"
+
+
+def when_ready(server):
+    """Runs in the master after the app is loaded, before any worker is forked."""
+    from app.services.storage import get_storage
+
+    storage = get_storage()
+    # A lazy restore overlapped with the model loading; workers must not fork before it is done
+    storage.wait_ready(timeout=None)
+    storage.start_backup_leader()
+    # Retention runs next to the backups, in this process only
+    storage.start_retention_job()
+    # Move everything loaded so far out of the GC's reach, so collections in the workers
+    # don't touch (and copy) the shared pages holding the preloaded models
+    gc.freeze()
+    server.log.info(f"Preloaded app; forking {server.num_workers} workers.")
+
+
+def post_fork(server, worker):
+    """Runs in each worker right after fork. Storage resets its connections on its own."""
+    from app.services.chatbot_service import ChatbotService
+    from app.services.image_service import ImageService
+
+    # A process pool belongs to the process that created it
+    ImageService._bulk_pool = None
+    if ImageService._model is None:
+        ImageService().load_model()
+    if ChatbotService._qa_chain is None:
+        ChatbotService().load_chains()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def on_exit(server):
+    """Final backup from the leader so writes since the last interval are not lost."""
+    from app.services.storage import get_storage
+
+    get_storage().backup()
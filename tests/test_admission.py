@@ -0,0 +1,110 @@
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.core.admission import AdmissionControlMiddleware, AdmissionRejected, RouteLimit, RouteLimiter
+
+
+def make_limiter(concurrency=1, queue_size=1, deadline_seconds=5.0) -> RouteLimiter:
+    return RouteLimiter(RouteLimit("test", ("/slow",), concurrency, queue_size, deadline_seconds))
+
+
+# --- Test 1: Limiter
+def test_limiter_queues_in_order_and_rejects_when_full():
+    """Tests that waiters get slots in FIFO order and a full queue is rejected with 429."""
+    async def scenario():
+        limiter = make_limiter(concurrency=1, queue_size=2)
+        order = []
+
+        async def request(i):
+            await limiter.acquire(time.monotonic())
+            admitted_at = time.monotonic()
+            order.append(i)
+            await asyncio.sleep(0.01)
+            limiter.release(admitted_at)
+
+        first = asyncio.create_task(request(0))
+        await asyncio.sleep(0)
+        queued = [asyncio.create_task(request(i)) for i in (1, 2)]
+        await asyncio.sleep(0)
+        assert limiter.in_flight == 1 and limiter.waiting == 2
+
+        with pytest.raises(AdmissionRejected) as rejected:
+            await limiter.acquire(time.monotonic())
+        assert rejected.value.status_code == 429
+        assert rejected.value.retry_after >= 1
+
+        await asyncio.gather(first, *queued)
+        assert order == [0, 1, 2]
+        assert limiter.in_flight == 0 and limiter.waiting == 0
+        assert limiter.service_time > 0
+
+    asyncio.run(scenario())
+
+
+def test_limiter_sheds_requests_that_cannot_meet_their_deadline():
+    """Tests that a waiter is rejected with 503 at its deadline, and early once service time is known."""
+    async def scenario():
+        limiter = make_limiter(concurrency=1, queue_size=4, deadline_seconds=0.05)
+        await limiter.acquire(time.monotonic())
+        admitted_at = time.monotonic()
+
+        with pytest.raises(AdmissionRejected) as rejected:
+            await limiter.acquire(time.monotonic())
+        assert rejected.value.status_code == 503
+        assert limiter.waiting == 0
+
+        await asyncio.sleep(0.06)
+        limiter.release(admitted_at)  # observed service time (~0.11s) now exceeds the deadline
+        await limiter.acquire(time.monotonic())
+        start = time.monotonic()
+        with pytest.raises(AdmissionRejected) as rejected:
+            await limiter.acquire(time.monotonic())
+        assert rejected.value.status_code == 503
+        assert time.monotonic() - start < 0.01  # shed without waiting
+        limiter.release(time.monotonic())
+        assert limiter.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+# --- Test 2: Middleware
+def test_middleware_limits_only_configured_routes():
+    """Tests that an overloaded route answers 429 with Retry-After while other routes still respond."""
+    app = FastAPI()
+    release = asyncio.Event()
+
+    @app.post("/slow")
+    async def slow():
+        await release.wait()
+        return {"ok": True}
+
+    @app.get("/fast")
+    async def fast():
+        return {"ok": True}
+
+    app.add_middleware(AdmissionControlMiddleware, limits=(RouteLimit("test", ("/slow",), 1, 0, 5.0),))
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            in_flight = asyncio.create_task(client.post("/slow"))
+            await asyncio.sleep(0.05)
+
+            rejected = await client.post("/slow")
+            assert rejected.status_code == 429
+            assert int(rejected.headers["Retry-After"]) >= 1
+            assert (await client.get("/fast")).status_code == 200
+
+            release.set()
+            assert (await in_flight).status_code == 200
+            assert (await client.post("/slow")).status_code == 200
+
+    asyncio.run(scenario())
@@ -0,0 +1,87 @@
+import os
+import sys
+import sqlite3
+from datetime import date, datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.services.storage import Storage
+from app.services.analytics_service import AnalyticsService, choose_granularity, count_buckets
+
+
+@pytest.fixture
+def service(tmp_path):
+    """An AnalyticsService pointed at a temporary predictions database."""
+    db_path = str(tmp_path / "predictions.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "CREATE TABLE predictions (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+        "diagnosis TEXT NOT NULL, timestamp DATETIME NOT NULL)"
+    )
+    start = datetime(2023, 1, 1, 9, 30)
+    rows = [("Flu" if i % 3 else "Cold", start + timedelta(hours=12 * i)) for i in range(2 * 365 * 2)]
+    conn.executemany("INSERT INTO predictions (diagnosis, timestamp) VALUES (?, ?)", rows)
+    conn.commit()
+    conn.close()
+    storage = Storage(db_path)
+    yield AnalyticsService(storage)
+    storage.close()
+
+
+# --- Test 1: Bucketing helpers
+def test_count_buckets_and_downsampling():
+    """Tests bucket counting and that long ranges coarsen to fit the point budget."""
+    start, end = date(2023, 1, 1), date(2024, 12, 31)
+    assert count_buckets(start, end, "day") == 731
+    assert count_buckets(start, end, "month") == 24
+    assert choose_granularity(start, end, "day", max_points=400) == "week"
+    assert choose_granularity(start, end, "day", max_points=50) == "month"
+    assert choose_granularity(start, start + timedelta(days=6), "day", max_points=400) == "day"
+    with pytest.raises(ValueError):
+        choose_granularity(date(1, 1, 1), end, "day", max_points=400)
+
+
+def test_range_ending_at_the_last_representable_day(service):
+    """Tests that buckets up to 9999-12-31 are labelled without stepping past date.max."""
+    for granularity in ("day", "week", "month"):
+        data = service.get_trends(date(9999, 11, 1), date(9999, 12, 31), granularity)
+        assert data["labels"][-1] <= "9999-12-31"
+    assert len(service.get_trends(date(9999, 11, 1), date(9999, 12, 31), "day")["labels"]) == 61
+    with pytest.raises(ValueError):
+        service.get_trends(date(1, 1, 1), date(9999, 12, 31), "day")
+
+
+# --- Test 2: SQL aggregation
+def test_daily_trends_for_date_range(service):
+    """Tests day-level counts over an inclusive date range, with zero-filled labels."""
+    data = service.get_trends(date(2023, 1, 1), date(2023, 1, 7), "day")
+    assert data["labels"][0] == "2023-01-01"
+    assert len(data["labels"]) == 7
+    assert data["granularity"] == "day" and not data["downsampled"]
+    totals = [sum(values) for values in zip(*(d["data"] for d in data["datasets"]))]
+    assert totals == [2] * 7
+
+
+def test_full_history_is_downsampled(service):
+    """Tests that a multi-year request without bounds is downsampled and keeps every prediction."""
+    data = service.get_trends(granularity="day", max_points=100)
+    assert data["granularity"] == "month"
+    assert data["downsampled"]
+    assert sum(sum(d["data"]) for d in data["datasets"]) == 2 * 365 * 2
+
+
+def test_weekly_buckets_start_on_monday(service):
+    """Tests that week buckets are labelled with their Monday."""
+    data = service.get_trends(date(2023, 1, 4), date(2023, 1, 20), "week")
+    assert data["labels"] == ["2023-01-02", "2023-01-09", "2023-01-16"]
+    assert [sum(v) for v in zip(*(d["data"] for d in data["datasets"]))] == [10, 14, 10]
+
+
+def test_new_predictions_update_rollup(service):
+    """Tests that rows inserted after startup are counted through the insert trigger."""
+    with service.storage.write() as conn:
+        conn.execute("INSERT INTO predictions (diagnosis, timestamp) VALUES (?, ?)", ("Pneumonia", datetime(2023, 1, 3, 8)))
+    data = service.get_trends(date(2023, 1, 3), date(2023, 1, 3), "day")
+    assert {d["label"]: d["data"] for d in data["datasets"]}["Pneumonia"] == [1]
@@ -1,7 +1,9 @@
 from fastapi.testclient import TestClient
 import os
 import sys
+import json
 import base64
+import zipfile
 from PIL import Image
 import io
 
@@ -86,6 +88,89 @@ def test_scan_analyzer_success():
     assert isinstance(data["confidence_score"], float)
 
 
+def create_xray_like_image_bytes() -> bytes:
+    """Helper function to create a grayscale gradient PNG that passes the X-ray validator."""
+    img = Image.linear_gradient("L").resize((200, 200)).convert("RGB")
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_scan_analyzer_upload_success():
+    """
+    Tests the /analyze/upload endpoint with a multipart image upload.
+    """
+    files = {"file": ("scan.png", create_xray_like_image_bytes(), "image/png")}
+    response = client.post("/analyze/upload", files=files)
+    assert response.status_code == 200
+    data = response.json()
+    assert isinstance(data["predicted_condition"], str)
+    assert isinstance(data["confidence_score"], float)
+
+
+def test_scan_analyzer_raw_success():
+    """
+    Tests the /analyze/raw endpoint with the image bytes as the request body.
+    """
+    response = client.post(
+        "/analyze/raw",
+        content=create_xray_like_image_bytes(),
+        headers={"Content-Type": "image/png"},
+    )
+    assert response.status_code == 200
+    assert "predicted_condition" in response.json()
+
+
+def test_scan_analyzer_raw_too_large(monkeypatch):
+    """
+    Tests that /analyze/raw rejects bodies above the configured size limit with 413.
+    """
+    from app.api import scan_analyzer
+
+    monkeypatch.setattr(scan_analyzer, "MAX_UPLOAD_BYTES", 16)
+    response = client.post(
+        "/analyze/raw",
+        content=create_xray_like_image_bytes(),
+        headers={"Content-Type": "image/png"},
+    )
+    assert response.status_code == 413
+
+
+def test_scan_analyzer_repeat_submission_is_cached():
+    """
+    Tests that re-submitting the same image returns the identical result from the cache.
+    """
+    image = create_xray_like_image_bytes()
+    first = client.post("/analyze/raw", content=image, headers={"Content-Type": "image/png"})
+    second = client.post("/analyze/raw", content=image, headers={"Content-Type": "image/png"})
+    assert first.status_code == second.status_code == 200
+    assert first.json() == second.json()
+    metrics = client.get("/metrics").text
+    assert 'healthcare_cache_requests_total{cache="image_results",result="hit"}' in metrics
+
+
+def test_scan_analyzer_bulk_zip_streams_ndjson():
+    """
+    Tests the /analyze/bulk endpoint with a zip archive holding one valid and one
+    invalid image: both get a result line and the invalid one is reported inline.
+    """
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("valid.png", create_xray_like_image_bytes())
+        zf.writestr("tiny.png", base64.b64decode(create_dummy_image_base64()))
+    response = client.post(
+        "/analyze/bulk",
+        content=archive.getvalue(),
+        headers={"Content-Type": "application/zip"},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    results = {r["filename"]: r for r in map(json.loads, response.text.splitlines())}
+    assert set(results) == {"valid.png", "tiny.png"}
+    assert isinstance(results["valid.png"]["predicted_condition"], str)
+    assert "error" in results["tiny.png"]
+
+
 # --- Test 4: AI Assistant (Chatbot) Module 
 def test_ai_assistant_chat_success():
     """
@@ -103,3 +188,17 @@ def test_ai_assistant_chat_success():
     # The 'text' attribute will contain the concatenated streamed content
     assert len(response.text) > 0
     assert isinstance(response.text, str)
+
+
+# --- Test 5: Metrics Endpoint
+def test_metrics_endpoint_exposes_stage_histograms():
+    """
+    Tests that /metrics serves Prometheus text with the stage latency histogram
+    populated after a prediction request.
+    """
+    client.post("/analyze/raw", content=create_xray_like_image_bytes(), headers={"Content-Type": "image/png"})
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'healthcare_stage_duration_seconds_count{stage="image_validation"}' in response.text
+    assert "healthcare_model_loaded" in response.text
@@ -0,0 +1,61 @@
+import io
+import os
+import sys
+import sqlite3
+from datetime import date, datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.services.storage import Storage
+from app.services.export_service import ExportService
+
+
+@pytest.fixture
+def service(tmp_path):
+    """An ExportService pointed at a temporary database with 25 predictions over 25 days."""
+    db_path = str(tmp_path / "predictions.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "CREATE TABLE predictions (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+        "diagnosis TEXT NOT NULL, timestamp DATETIME NOT NULL)"
+    )
+    start = datetime(2024, 3, 1, 10, 0, 0, 123456)
+    conn.executemany(
+        "INSERT INTO predictions (diagnosis, timestamp) VALUES (?, ?)",
+        [("Flu", start + timedelta(days=i)) for i in range(25)],
+    )
+    conn.commit()
+    conn.close()
+    storage = Storage(db_path)
+    yield ExportService(storage)
+    storage.close()
+
+
+# --- Test 1: Chunked reads
+def test_rows_are_read_in_fixed_size_chunks(service):
+    """Tests that pages never exceed the chunk size and cover the date range exactly."""
+    chunks = list(service.iter_row_chunks("predictions", date(2024, 3, 5), date(2024, 3, 20), chunk_rows=4))
+    assert all(len(chunk) <= 4 for chunk in chunks)
+    rows = [row for chunk in chunks for row in chunk]
+    assert len(rows) == 16
+    assert rows[0][2].startswith("2024-03-05") and rows[-1][2].startswith("2024-03-20")
+
+
+# --- Test 2: CSV and Parquet output
+def test_csv_export(service):
+    """Tests the CSV export has a header and one line per row."""
+    lines = b"".join(service.stream_csv("predictions")).decode().splitlines()
+    assert lines[0] == "id,diagnosis,timestamp"
+    assert len(lines) == 26
+
+
+def test_parquet_export_row_groups(service):
+    """Tests the Parquet export is readable and written as one row group per page."""
+    pq = pytest.importorskip("pyarrow.parquet")
+    data = b"".join(service.stream_parquet("predictions", chunk_rows=10))
+    parquet_file = pq.ParquetFile(io.BytesIO(data))
+    assert parquet_file.metadata.num_rows == 25
+    assert parquet_file.metadata.num_row_groups == 3
+    assert str(parquet_file.schema_arrow.field("timestamp").type) == "timestamp[us]"
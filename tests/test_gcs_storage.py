@@ -0,0 +1,195 @@
+import os
+import sys
+import sqlite3
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.services import gcs_storage
+from app.services.gcs_storage import GCS_DB_PATH, LocalDirBucket, backup_db_to_gcs, restore_db_from_gcs
+from app.services.storage import Storage
+
+BLOCK_SIZE = 16 * 1024
+
+
+class RecordingBucket(LocalDirBucket):
+    """Records every transfer; `gate`, when set, holds downloads until it is released."""
+
+    def __init__(self, root: str):
+        super().__init__(root)
+        self.requests = []
+        self.gate = None
+
+    def on_request(self, operation: str, name: str):
+        if self.gate is not None and operation == "download":
+            self.gate.wait()
+        self.requests.append((operation, name))
+
+    def count(self, operation: str) -> int:
+        return sum(1 for op, name in self.requests if op == operation and "/blocks/" in name)
+
+
+def make_db(path: str, rows: int):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE IF NOT EXISTS notes (id INTEGER PRIMARY KEY, body TEXT NOT NULL)")
+    conn.executemany("INSERT INTO notes (body) VALUES (?)", [(f"note {i} " + "x" * 200,) for i in range(rows)])
+    conn.commit()
+    conn.close()
+
+
+def read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+@pytest.fixture
+def bucket(tmp_path):
+    return RecordingBucket(str(tmp_path / "bucket"))
+
+
+# --- Test 1: Block layout
+def test_backup_and_restore_round_trip(bucket, tmp_path):
+    """Tests that a block backup restores to a byte-identical file."""
+    source = str(tmp_path / "source.db")
+    make_db(source, 2000)
+    assert backup_db_to_gcs(source, bucket=bucket, block_size=BLOCK_SIZE)
+
+    dest = str(tmp_path / "restored.db")
+    assert restore_db_from_gcs(dest, bucket=bucket)
+    assert read_file(dest) == read_file(source)
+
+
+def test_only_changed_blocks_are_transferred(bucket, tmp_path):
+    """Tests that a small write uploads a few blocks, and a stale local copy downloads only those."""
+    source = str(tmp_path / "source.db")
+    make_db(source, 2000)
+    backup_db_to_gcs(source, bucket=bucket, block_size=BLOCK_SIZE)
+    stale = str(tmp_path / "stale.db")
+    restore_db_from_gcs(stale, bucket=bucket)
+    total_blocks = bucket.count("upload")
+
+    make_db(source, 20)
+    bucket.requests.clear()
+    backup_db_to_gcs(source, bucket=bucket, block_size=BLOCK_SIZE)
+    changed = bucket.count("upload")
+    assert 0 < changed < total_blocks / 4
+
+    bucket.requests.clear()
+    assert restore_db_from_gcs(stale, bucket=bucket)
+    assert bucket.count("download") == changed
+    assert read_file(stale) == read_file(source)
+
+
+def test_superseded_blocks_are_deleted_one_backup_later(bucket, tmp_path):
+    """Tests that blocks only the previous manifest used survive one backup and are then removed."""
+    source = str(tmp_path / "source.db")
+    make_db(source, 500)
+    backup_db_to_gcs(source, bucket=bucket, block_size=BLOCK_SIZE)
+    blocks_dir = os.path.join(bucket.root, "analytics", "blocks")
+    first = set(os.listdir(blocks_dir))
+
+    make_db(source, 5)
+    backup_db_to_gcs(source, bucket=bucket, block_size=BLOCK_SIZE)
+    assert first <= set(os.listdir(blocks_dir))  # still referenced by the previous manifest
+
+    make_db(source, 5)
+    backup_db_to_gcs(source, bucket=bucket, block_size=BLOCK_SIZE)
+    manifest, _ = gcs_storage._read_manifest(bucket)
+    assert bucket.count("delete") > 0
+    assert set(os.listdir(blocks_dir)) == set(manifest["blocks"]) | set(manifest["superseded"])
+
+
+def test_legacy_single_file_backup_is_restored(bucket, tmp_path):
+    """Tests that a bucket holding only the older whole-file backup still restores."""
+    source = str(tmp_path / "source.db")
+    make_db(source, 10)
+    bucket.blob(GCS_DB_PATH).upload_from_filename(source)
+
+    dest = str(tmp_path / "restored.db")
+    assert restore_db_from_gcs(dest, bucket=bucket)
+    assert read_file(dest) == read_file(source)
+    assert not restore_db_from_gcs(str(tmp_path / "other.db"), bucket=RecordingBucket(str(tmp_path / "empty")))
+
+
+# --- Test 2: Lazy restore
+def test_lazy_restore_runs_in_background_and_database_calls_wait(bucket, tmp_path, monkeypatch):
+    """Tests that a lazy Storage returns before the restore finishes and reads see the restored rows."""
+    source = Storage(str(tmp_path / "source.db"))
+    with source.write() as conn:
+        conn.execute("INSERT INTO predictions (diagnosis, timestamp) VALUES ('Flu', '2024-01-01 09:00:00')")
+    source.snapshot(str(tmp_path / "snapshot.db"))
+    source.close()
+    backup_db_to_gcs(str(tmp_path / "snapshot.db"), bucket=bucket, block_size=BLOCK_SIZE)
+
+    monkeypatch.setattr(gcs_storage, "_bucket", bucket)
+    monkeypatch.setattr(gcs_storage, "_gcs_available", True)
+    bucket.gate = threading.Event()
+    storage = Storage(str(tmp_path / "predictions.db"), restore=True, lazy=True)
+    try:
+        with pytest.raises(RuntimeError):
+            storage.wait_ready(timeout=0.05)  # downloads are still held by the gate
+        bucket.gate.set()
+        with storage.read() as conn:
+            assert conn.execute("SELECT diagnosis FROM predictions").fetchall() == [("Flu",)]
+    finally:
+        bucket.gate.set()
+        storage.close()
+
+
+# --- Test 3: Concurrent backups
+class RacingBucket(RecordingBucket):
+    """Runs `interloper()` once, just before the first request of `operation` on a matching object."""
+
+    def __init__(self, root: str, operation: str, marker: str):
+        super().__init__(root)
+        self.operation, self.marker = operation, marker
+        self.interloper = None
+
+    def on_request(self, operation: str, name: str):
+        super().on_request(operation, name)
+        if self.interloper is not None and operation == self.operation and self.marker in name:
+            interloper, self.interloper = self.interloper, None
+            interloper()
+
+
+def versions(tmp_path, counts):
+    """Successive states of one growing database, each copied to its own file."""
+    source, paths = str(tmp_path / "source.db"), []
+    for i, rows in enumerate(counts):
+        make_db(source, rows)
+        paths.append(str(tmp_path / f"v{i}.db"))
+        with open(paths[-1], "wb") as f:
+            f.write(read_file(source))
+    return paths
+
+
+def test_manifest_race_is_retried_on_the_new_manifest(tmp_path):
+    """Tests that a backup whose manifest was replaced meanwhile re-reads it instead of overwriting it."""
+    bucket = RacingBucket(str(tmp_path / "bucket"), "upload", "manifest")
+    v0, v1, v2 = versions(tmp_path, [500, 5, 5])
+    backup_db_to_gcs(v0, bucket=bucket, block_size=BLOCK_SIZE)
+
+    bucket.interloper = lambda: backup_db_to_gcs(v1, bucket=bucket, block_size=BLOCK_SIZE)
+    assert backup_db_to_gcs(v2, bucket=bucket, block_size=BLOCK_SIZE)
+    manifest, _ = gcs_storage._read_manifest(bucket)
+    assert manifest["superseded"] == sorted(set(gcs_storage._file_block_hashes(v1, BLOCK_SIZE)) - set(manifest["blocks"]))
+    dest = str(tmp_path / "restored.db")
+    assert restore_db_from_gcs(dest, bucket=bucket)
+    assert read_file(dest) == read_file(v2)
+
+
+def test_block_uploaded_again_by_another_backup_is_not_deleted(tmp_path):
+    """Tests that blocks another instance re-uploaded after our manifest was written survive our cleanup."""
+    bucket = RacingBucket(str(tmp_path / "bucket"), "delete", "/blocks/")
+    v0, v1, v2 = versions(tmp_path, [500, 5, 5])
+    backup_db_to_gcs(v0, bucket=bucket, block_size=BLOCK_SIZE)
+    backup_db_to_gcs(v1, bucket=bucket, block_size=BLOCK_SIZE)
+
+    # While this backup deletes the blocks only v0 used, another instance backs v0 up again
+    bucket.interloper = lambda: backup_db_to_gcs(v0, bucket=bucket, block_size=BLOCK_SIZE)
+    assert backup_db_to_gcs(v2, bucket=bucket, block_size=BLOCK_SIZE)
+    dest = str(tmp_path / "restored.db")
+    assert restore_db_from_gcs(dest, bucket=bucket)
+    assert read_file(dest) == read_file(v0)
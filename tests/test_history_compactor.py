@@ -0,0 +1,103 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.services.history_compactor import SUMMARY_TURN_QUESTION, HistoryCompactor, TokenCounter
+
+
+class WordCounter(TokenCounter):
+    """One token per word, so budgets in the tests don't depend on the tiktoken encoding."""
+
+    def count(self, text: str) -> int:
+        return len(text.split())
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        return " ".join(text.split()[:max_tokens])
+
+
+class RecordingSummarizer:
+    def __init__(self, fail: bool = False):
+        self.calls = []
+        self.fail = fail
+
+    def __call__(self, previous, turns):
+        self.calls.append((previous, list(turns)))
+        if self.fail:
+            raise RuntimeError("LLM backend is unavailable")
+        return f"{previous or ''} +{len(turns)} turns".strip()
+
+
+def make_compactor(summarizer, **overrides) -> HistoryCompactor:
+    settings = dict(budget_tokens=200, reserve_tokens=50, recent_turns=2, summary_max_tokens=20, counter=WordCounter())
+    settings.update(overrides)
+    return HistoryCompactor(summarizer, **settings)
+
+
+def conversation(turns: int, words: int = 20) -> list:
+    return [[f"question {i} " + "q " * words, f"answer {i} " + "a " * words] for i in range(turns)]
+
+
+def history_tokens(compactor: HistoryCompactor, history: list) -> int:
+    return sum(compactor.turn_tokens(turn) for turn in history)
+
+
+# --- Test 1: Budget
+def test_short_history_is_passed_through():
+    """Tests that a history within budget is returned verbatim (as tuples) without summarizing."""
+    summarizer = RecordingSummarizer()
+    compactor = make_compactor(summarizer)
+    history = conversation(2)
+    assert compactor.compact(history, "What now?") == [tuple(turn) for turn in history]
+    assert summarizer.calls == []
+
+
+def test_long_history_keeps_recent_turns_and_fits_budget():
+    """Tests that older turns become one summary turn, the latest turns stay verbatim, and the budget holds."""
+    summarizer = RecordingSummarizer()
+    compactor = make_compactor(summarizer)
+    history = conversation(10)
+    compacted = compactor.compact(history, "What now?")
+
+    assert compacted[0][0] == SUMMARY_TURN_QUESTION
+    assert compacted[1:] == [tuple(turn) for turn in history[-2:]]
+    assert history_tokens(compactor, compacted) <= compactor.history_budget("What now?")
+    assert summarizer.calls == [(None, [tuple(turn) for turn in history[:8]])]
+
+
+# --- Test 2: Rolling summary
+def test_summary_is_extended_incrementally_and_cached():
+    """Tests that the next request only folds the newly aged-out turn into the cached summary."""
+    summarizer = RecordingSummarizer()
+    compactor = make_compactor(summarizer)
+    history = conversation(11)
+    compactor.compact(history[:10], "first")
+    first_summary = summarizer.calls[-1]
+
+    compacted = compactor.compact(history, "second")
+    previous, turns = summarizer.calls[-1]
+    assert previous == "+8 turns" and turns == [tuple(history[8])]
+    assert compacted[0] == (SUMMARY_TURN_QUESTION, "+8 turns +1 turns")
+
+    compactor.compact(history, "second")  # same turns: served from the cache
+    assert len(summarizer.calls) == 2 and summarizer.calls[0] == first_summary
+
+
+def test_failed_summary_drops_older_turns():
+    """Tests that a summarization error degrades to dropping older turns instead of failing the chat."""
+    compactor = make_compactor(RecordingSummarizer(fail=True))
+    history = conversation(10)
+    assert compactor.compact(history, "What now?") == [tuple(turn) for turn in history[-2:]]
+
+
+# --- Test 3: Malformed history
+@pytest.mark.parametrize("turn", [["hi"], [], ["q", "a", "extra"]])
+def test_turns_that_are_not_pairs_are_rejected(turn):
+    """Tests that short and long turns raise ValueError (a 400) instead of an IndexError (a 500)."""
+    summarizer = RecordingSummarizer()
+    compactor = make_compactor(summarizer)
+    with pytest.raises(ValueError):
+        compactor.compact(conversation(1) + [turn], "What now?")
+    assert summarizer.calls == []
@@ -0,0 +1,70 @@
+import io
+import os
+import sys
+
+from PIL import Image
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.core.metrics import CACHE_REQUESTS
+from app.services.image_cache import ImageResultCache, exact_key, perceptual_key
+
+
+def create_xray_like_image(seed: int = 0) -> Image.Image:
+    """Helper function to create a grayscale gradient, rotated per seed so images differ."""
+    return Image.linear_gradient("L").rotate(seed * 90).resize((200, 200))
+
+
+def encode(img: Image.Image, fmt: str) -> bytes:
+    buffer = io.BytesIO()
+    img.save(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+# --- Test 1: LRU bounds
+def test_lru_eviction_by_entries_and_memory():
+    """Tests that the least recently used entry is evicted first and the memory cap holds."""
+    cache = ImageResultCache(max_entries=2, max_bytes=10**6, name="test_lru")
+    cache.put("a", ("NORMAL", 0.9))
+    cache.put("b", ("Pneumonia", 0.8))
+    assert cache.get("a") == ("NORMAL", 0.9)  # "a" is now most recent
+    cache.put("c", ("NORMAL", 0.7))
+    assert cache.get("b") is None
+    assert len(cache) == 2
+
+    small = ImageResultCache(max_entries=100, max_bytes=1000, name="test_lru")
+    for i in range(50):
+        small.put(f"key-{i}", ("NORMAL", 0.5))
+    assert 0 < small.size_bytes <= 1000
+    assert small.get("key-49") is not None and small.get("key-0") is None
+
+
+def test_disabled_cache_and_metrics():
+    """Tests that max_entries=0 disables caching and that lookups are counted."""
+    disabled = ImageResultCache(max_entries=0, name="test_disabled")
+    disabled.put("a", ("NORMAL", 0.9))
+    assert disabled.get("a") is None
+
+    cache = ImageResultCache(name="test_metrics")
+    cache.put("a", ("NORMAL", 0.9))
+    cache.get("a")
+    cache.get("missing")
+    assert CACHE_REQUESTS.labels(cache="test_metrics", result="hit")._value.get() == 1
+    assert CACHE_REQUESTS.labels(cache="test_metrics", result="miss")._value.get() == 1
+
+
+# --- Test 2: Keys
+def test_exact_key_accepts_memoryview():
+    """Tests that exact keys depend only on the bytes, not on the buffer type."""
+    data = encode(create_xray_like_image(), "PNG")
+    assert exact_key(data) == exact_key(memoryview(data))
+    assert exact_key(data) != exact_key(encode(create_xray_like_image(), "JPEG"))
+
+
+def test_perceptual_key_matches_reencoded_copies_only():
+    """Tests that a JPEG re-encode shares the PNG's perceptual key while a different scan does not."""
+    png = Image.open(io.BytesIO(encode(create_xray_like_image(), "PNG")))
+    jpeg = Image.open(io.BytesIO(encode(create_xray_like_image(), "JPEG")))
+    other = Image.open(io.BytesIO(encode(create_xray_like_image(seed=1), "PNG")))
+    assert perceptual_key(png) == perceptual_key(jpeg)
+    assert perceptual_key(png) != perceptual_key(other)
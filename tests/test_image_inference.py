@@ -0,0 +1,51 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+tf = pytest.importorskip("tensorflow")
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.services.image_preprocessing import IMG_SIZE
+from app.services.image_service import compile_inference
+
+
+def build_tiny_model():
+    """A small stand-in for the CNN: same input shape and sigmoid head, a few hundred weights."""
+    layers = tf.keras.layers
+    tf.keras.utils.set_random_seed(0)
+    return tf.keras.Sequential([
+        layers.Input(shape=(IMG_SIZE[1], IMG_SIZE[0], 3)),
+        layers.Conv2D(4, 3, activation="relu"),
+        layers.MaxPooling2D(4),
+        layers.GlobalAveragePooling2D(),
+        layers.Dense(1, activation="sigmoid"),
+    ])
+
+
+# --- Test 1: The compiled path gives the same predictions as Keras predict()
+def test_compiled_inference_matches_keras_predict():
+    """
+    Tests that compile_inference(model, IMG_SIZE) returns what model.predict does,
+    for a single image and for a bulk batch.
+    """
+    model = build_tiny_model()
+    infer = compile_inference(model, IMG_SIZE)
+    rng = np.random.default_rng(0)
+
+    for batch_size in (1, 5):
+        images = rng.random((batch_size, IMG_SIZE[1], IMG_SIZE[0], 3), dtype=np.float32)
+        np.testing.assert_allclose(model.predict(images, verbose=0), infer(images).numpy(), rtol=1e-4, atol=1e-5)
+
+
+# --- Test 2: One traced graph serves every batch size
+def test_compiled_inference_traces_once():
+    """Tests that the open batch dimension keeps different batch sizes from retracing the function."""
+    infer = compile_inference(build_tiny_model(), IMG_SIZE)
+
+    for batch_size in (1, 3, 8):
+        infer(np.zeros((batch_size, IMG_SIZE[1], IMG_SIZE[0], 3), dtype=np.float32))
+
+    assert infer.experimental_get_tracing_count() == 1
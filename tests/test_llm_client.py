@@ -0,0 +1,81 @@
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.services.fake_llm import FakeLLMServer, generate
+from app.services.llm_client import (
+    CircuitBreaker,
+    CircuitOpenError,
+    LLMUnavailableError,
+    ResilientLLMClient,
+)
+
+
+def make_client(**overrides) -> ResilientLLMClient:
+    """A client with short timings and no hedging unless overridden."""
+    settings = dict(timeout=1.0, max_attempts=1, backoff_base=0.01, backoff_max=0.02, hedge=False)
+    settings.update(overrides)
+    return ResilientLLMClient("test", **settings)
+
+
+# --- Test 1: Tail latency
+def test_hedged_request_beats_slow_first_attempt():
+    """Tests that a duplicate sent after the hedge delay answers while the first request is still stuck."""
+    with FakeLLMServer(script_ms=[2000, 20]) as server:
+        client = make_client(timeout=5.0, hedge=True, hedge_min_samples=0, hedge_min_delay=0.1)
+        start = time.monotonic()
+        answer = client.call(generate, server.url, "What is a fever?", timeout=5.0)
+        elapsed = time.monotonic() - start
+    assert "Fake answer" in answer
+    assert server.requests == 2
+    assert elapsed < 1.0
+
+
+def test_timed_out_attempt_is_retried():
+    """Tests that an attempt exceeding the timeout is abandoned and retried."""
+    with FakeLLMServer(script_ms=[2000, 10]) as server:
+        client = make_client(timeout=0.3, max_attempts=2)
+        start = time.monotonic()
+        assert client.call(generate, server.url, "Question: flu? Topic:", timeout=5.0) in ("Fever", "Flu", "Pneumonia", "None")
+        assert time.monotonic() - start < 1.0
+    assert server.requests == 2
+
+
+# --- Test 2: Failures
+def test_circuit_opens_after_failures_and_recovers():
+    """Tests that repeated 503s open the circuit, calls then fail fast, and a trial call closes it."""
+    with FakeLLMServer(median_ms=1, error_rate=1.0) as server:
+        breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=0.2)
+        client = make_client(max_attempts=2, breaker=breaker)
+        with pytest.raises(LLMUnavailableError):
+            client.call(generate, server.url, "hello", timeout=1.0)
+        assert breaker.is_open and server.requests == 2
+
+        with pytest.raises(CircuitOpenError) as rejected:
+            client.call(generate, server.url, "hello", timeout=1.0)
+        assert rejected.value.retry_after >= 1
+        assert server.requests == 2  # failed fast, backend not called
+
+        time.sleep(0.25)
+        server.error_rate = 0.0
+        assert "Fake answer" in client.call(generate, server.url, "hello", timeout=1.0)
+        assert not breaker.is_open
+
+
+def test_non_retryable_errors_propagate_without_retry():
+    """Tests that a rejected request is raised as-is after one attempt and does not trip the breaker."""
+    calls = []
+
+    def bad_request():
+        calls.append(1)
+        raise ValueError("prompt too long")
+
+    client = make_client(max_attempts=3, breaker=CircuitBreaker("test", failure_threshold=1))
+    with pytest.raises(ValueError):
+        client.call(bad_request)
+    assert len(calls) == 1
+    assert not client.breaker.is_open
@@ -0,0 +1,101 @@
+import os
+import sys
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.services.onnx_embeddings import OnnxMiniLMEmbeddings, mean_pool
+
+DIM = 4
+# Hidden state emitted at padded positions: any leak into the pooled vector is obvious
+PAD_STATE = 1000.0
+
+
+class StubTokenizer:
+    """One token per word (id = word length), padded to the longest text in the batch."""
+
+    def __init__(self):
+        self.batches = []
+
+    def encode_batch(self, texts):
+        self.batches.append(list(texts))
+        ids = [[len(word) for word in text.split()] or [1] for text in texts]
+        width = max(len(row) for row in ids)
+        return [
+            SimpleNamespace(
+                ids=row + [0] * (width - len(row)),
+                attention_mask=[1] * len(row) + [0] * (width - len(row)),
+                type_ids=[0] * width,
+            )
+            for row in ids
+        ]
+
+
+class StubSession:
+    """Maps token id t to the hidden state [t, 1, 0, ...]; padding (id 0) to PAD_STATE everywhere."""
+
+    def run(self, output_names, inputs):
+        ids = inputs["input_ids"].astype(np.float32)
+        states = np.zeros(ids.shape + (DIM,), dtype=np.float32)
+        states[..., 0] = ids
+        states[..., 1] = 1.0
+        states[ids == 0] = PAD_STATE
+        return [states]
+
+
+def make_embeddings(batch_size: int) -> OnnxMiniLMEmbeddings:
+    """An OnnxMiniLMEmbeddings wired to the stubs, without a model file or onnxruntime."""
+    embeddings = OnnxMiniLMEmbeddings.__new__(OnnxMiniLMEmbeddings)
+    embeddings.model_path = "stub.onnx"
+    embeddings.batch_size = batch_size
+    embeddings.threads = 1
+    embeddings.tokenizer = StubTokenizer()
+    embeddings._session = StubSession()
+    embeddings._session_pid = os.getpid()
+    embeddings._input_names = {"input_ids", "attention_mask"}
+    embeddings._lock = threading.Lock()
+    return embeddings
+
+
+def expected_vector(text: str) -> np.ndarray:
+    lengths = [len(word) for word in text.split()] or [1]
+    vector = np.array([np.mean(lengths), 1.0] + [0.0] * (DIM - 2))
+    return vector / np.linalg.norm(vector)
+
+
+# --- Test 1: Pooling
+def test_mean_pool_ignores_padding_and_normalizes():
+    """Tests that masked positions do not contribute and every pooled vector has unit length."""
+    hidden = np.array([
+        [[2.0, 0.0], [4.0, 0.0], [PAD_STATE, PAD_STATE]],
+        [[0.0, 3.0], [PAD_STATE, PAD_STATE], [PAD_STATE, PAD_STATE]],
+    ])
+    mask = np.array([[1, 1, 0], [1, 0, 0]])
+    pooled = mean_pool(hidden, mask)
+    np.testing.assert_allclose(pooled, [[1.0, 0.0], [0.0, 1.0]])
+    np.testing.assert_allclose(np.linalg.norm(pooled, axis=1), 1.0)
+
+
+# --- Test 2: Batching
+def test_embed_documents_keeps_order_across_batches():
+    """Tests that length-sorted batching returns vectors in input order with the right shape."""
+    texts = [f"{'word ' * (i % 5 + 1)}{'x' * (i + 1)}" for i in range(7)]
+    embeddings = make_embeddings(batch_size=3)
+    vectors = embeddings.embed_documents(texts)
+
+    assert len(vectors) == len(texts) and all(len(v) == DIM for v in vectors)
+    assert [len(batch) for batch in embeddings.tokenizer.batches] == [3, 3, 1]
+    for text, vector in zip(texts, vectors):
+        np.testing.assert_allclose(vector, expected_vector(text), rtol=1e-5)
+    np.testing.assert_allclose(make_embeddings(batch_size=1).embed_documents(texts), vectors, rtol=1e-5)
+
+
+def test_embed_query_returns_one_vector():
+    """Tests that a query embeds to a single flat vector of floats."""
+    vector = make_embeddings(batch_size=32).embed_query("Is a fever of 38.5 C dangerous?")
+    assert isinstance(vector, list) and len(vector) == DIM
+    assert all(isinstance(x, float) for x in vector)
+    np.testing.assert_allclose(vector, expected_vector("Is a fever of 38.5 C dangerous?"), rtol=1e-5)
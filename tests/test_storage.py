@@ -0,0 +1,181 @@
+import gc
+import os
+import sys
+import sqlite3
+import threading
+import time
+from datetime import date, datetime
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.services import storage as storage_module
+from app.services.storage import MIGRATIONS, Storage
+
+
+@pytest.fixture
+def storage(tmp_path):
+    """A Storage on a fresh temporary database."""
+    storage = Storage(str(tmp_path / "predictions.db"), readers=2)
+    yield storage
+    storage.close()
+
+
+# --- Test 1: Migrations
+def test_migrations_create_schema_in_wal_mode(storage):
+    """Tests that all migrations are applied once and the database uses WAL."""
+    with storage.read() as conn:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == MIGRATIONS[-1][0]
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert {"predictions", "chatbot_queries", "predictions_daily", "chatbot_queries_daily"} <= tables
+
+    storage.migrate()  # re-running is a no-op
+    with storage.write() as conn:
+        conn.execute("INSERT INTO predictions (diagnosis, timestamp) VALUES (?, ?)", ("Flu", datetime(2024, 1, 2)))
+    with storage.read() as conn:
+        assert conn.execute("SELECT count FROM predictions_daily").fetchall() == [(1,)]
+
+
+def test_existing_database_is_upgraded(tmp_path):
+    """Tests that a pre-migration database keeps its rows and gets its rollup backfilled."""
+    db_path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE predictions (id INTEGER PRIMARY KEY AUTOINCREMENT, diagnosis TEXT NOT NULL, timestamp DATETIME NOT NULL)")
+    conn.executemany("INSERT INTO predictions (diagnosis, timestamp) VALUES (?, ?)", [("Cold", "2024-01-01 10:00:00")] * 3)
+    conn.commit()
+    conn.close()
+
+    storage = Storage(db_path)
+    with storage.read() as conn:
+        assert conn.execute("SELECT day, diagnosis, count FROM predictions_daily").fetchall() == [("2024-01-01", "Cold", 3)]
+    storage.close()
+
+
+# --- Test 2: Pooling
+def test_readers_are_read_only_and_see_committed_writes(storage):
+    """Tests that pooled readers reject writes and observe writes committed by other threads."""
+    with storage.read() as conn:
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("INSERT INTO chatbot_queries (topic, timestamp) VALUES ('x', '2024-01-01')")
+
+    def write(i):
+        with storage.write() as conn:
+            conn.execute("INSERT INTO chatbot_queries (topic, timestamp) VALUES (?, ?)", (f"t{i}", "2024-01-01"))
+
+    threads = [threading.Thread(target=write, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    with storage.read() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM chatbot_queries").fetchone()[0] == 8
+
+
+def test_snapshot_contains_uncheckpointed_writes(storage, tmp_path):
+    """Tests that a snapshot includes rows still sitting in the WAL."""
+    with storage.write() as conn:
+        conn.execute("INSERT INTO predictions (diagnosis, timestamp) VALUES (?, ?)", ("Flu", "2024-01-01 09:00:00"))
+    snapshot_path = str(tmp_path / "snapshot.db")
+    storage.snapshot(snapshot_path)
+    conn = sqlite3.connect(snapshot_path)
+    assert conn.execute("SELECT COUNT(*) FROM predictions").fetchone()[0] == 1
+    conn.close()
+
+
+def test_read_fails_fast_when_every_reader_is_busy(tmp_path):
+    """Tests that a read waits at most reader_wait for a pooled connection, then raises RuntimeError."""
+    storage = Storage(str(tmp_path / "predictions.db"), readers=1, reader_wait=0.05)
+    try:
+        with storage.read():
+            started = time.monotonic()
+            with pytest.raises(RuntimeError):
+                with storage.read():
+                    pass
+            assert time.monotonic() - started < 2
+        with storage.read() as conn:  # the connection went back to the pool
+            assert conn.execute("SELECT 1").fetchone() == (1,)
+    finally:
+        storage.close()
+
+
+# --- Test 3: Multi-process serving
+def test_instances_share_one_fork_handler(tmp_path):
+    """Tests that Storage instances are tracked weakly for the single post-fork handler."""
+    storage = Storage(str(tmp_path / "predictions.db"))
+    assert storage in storage_module._instances
+    storage.close()
+    count = len(storage_module._instances)
+    del storage
+    gc.collect()
+    assert len(storage_module._instances) == count - 1
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="requires fork()")
+def test_forked_child_uses_own_connections_and_skips_leader_backups(storage):
+    """Tests that a forked worker can write with fresh connections and leaves backups to the leader."""
+    with storage.read() as conn:  # the parent has open connections before the fork
+        conn.execute("SELECT 1")
+    storage._backup_leader_pid = os.getpid()
+
+    pid = os.fork()
+    if pid == 0:
+        try:
+            with storage.write() as conn:
+                conn.execute("INSERT INTO predictions (diagnosis, timestamp) VALUES (?, ?)", ("Cold", "2024-01-01 09:00:00"))
+            os._exit(0 if storage.backup_after_write() is False else 1)
+        except BaseException:
+            os._exit(2)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    with storage.read() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM predictions").fetchone()[0] == 1
+
+
+# --- Test 4: Retention
+def test_compact_deletes_old_rows_but_keeps_rollups(storage):
+    """Tests that rows older than the retention are deleted in batches while the daily counts survive."""
+    old = [("Flu", f"2024-01-{day:02d} 10:00:00") for day in range(1, 11) for _ in range(30)]
+    with storage.write() as conn:
+        conn.executemany("INSERT INTO predictions (diagnosis, timestamp) VALUES (?, ?)", old)
+        conn.executemany("INSERT INTO predictions (diagnosis, timestamp) VALUES (?, ?)", [("Cold", "2024-03-30 08:00:00")] * 5)
+        conn.executemany("INSERT INTO chatbot_queries (topic, timestamp) VALUES (?, ?)", [("Fever", "2024-01-05 12:00:00")] * 7)
+
+    report = storage.compact(retention_days=30, batch_size=40, today=date(2024, 4, 1))
+
+    assert report["cutoff"] == "2024-03-02"
+    assert report["deleted"] == {"predictions": 300, "chatbot_queries": 7}
+    with storage.read() as conn:
+        assert conn.execute("SELECT diagnosis FROM predictions").fetchall() == [("Cold",)] * 5
+        assert conn.execute("SELECT SUM(count) FROM predictions_daily WHERE diagnosis = 'Flu'").fetchone()[0] == 300
+        assert conn.execute("SELECT topic, count FROM chatbot_queries_daily").fetchall() == [("Fever", 7)]
+
+
+def test_retention_is_off_by_default(storage):
+    """Tests that without RETENTION_DAYS no retention job starts, so no raw rows are ever deleted."""
+    storage.start_retention_job(interval=0.01)
+    assert "db-retention" not in [thread.name for thread in threading.enumerate()]
+    with pytest.raises(ValueError):
+        storage.compact()
+
+
+def test_compact_converts_old_database_and_reclaims_space(tmp_path):
+    """Tests that a database without incremental auto-vacuum is converted and shrinks after deletes."""
+    db_path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE chatbot_queries (id INTEGER PRIMARY KEY AUTOINCREMENT, topic TEXT NOT NULL, timestamp DATETIME NOT NULL)")
+    conn.executemany("INSERT INTO chatbot_queries (topic, timestamp) VALUES (?, ?)", [("x" * 200, "2023-06-01 10:00:00")] * 5000)
+    conn.commit()
+    conn.close()
+
+    storage = Storage(db_path)
+    report = storage.compact(retention_days=30, today=date(2024, 1, 1))
+    with storage.read() as conn:
+        assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2  # incremental
+        assert conn.execute("PRAGMA freelist_count").fetchone()[0] == 0
+    assert report["converted_to_incremental_vacuum"]
+    assert report["bytes_reclaimed"] > 500_000
+    assert report["bytes_after"] == storage.file_bytes()
+    assert storage.compact(retention_days=30, today=date(2024, 1, 1))["converted_to_incremental_vacuum"] is False
+    storage.close()
@@ -0,0 +1,96 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.preprocessing import MultiLabelBinarizer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.services.prediction_service import PredictionService
+from app.services.symptom_index import SymptomIndex, normalize_symptom
+
+SYMPTOMS = ["Body ache", "Cough", "Fatigue", "Fever", "Headache", "Runny nose", "Shortness of breath", "Sore throat"]
+VITALS = ["Age", "Gender", "Heart_Rate_bpm", "Body_Temperature_C", "Oxygen_Saturation_%", "Systolic_BP", "Diastolic_BP"]
+
+
+class StubPipeline:
+    """Only the attribute PredictionService reads from the sklearn pipeline when building features."""
+
+    feature_names_in_ = np.array(VITALS + SYMPTOMS, dtype=object)
+
+
+def make_binarizer() -> MultiLabelBinarizer:
+    return MultiLabelBinarizer().fit([SYMPTOMS])
+
+
+@pytest.fixture
+def index():
+    return SymptomIndex(make_binarizer().classes_)
+
+
+@pytest.fixture
+def service(monkeypatch):
+    """A PredictionService on a stub pipeline and a small binarizer, without storage."""
+    monkeypatch.setattr(PredictionService, "_model_pipeline", StubPipeline())
+    monkeypatch.setattr(PredictionService, "_symptom_binarizer", make_binarizer())
+    monkeypatch.setattr(PredictionService, "_symptom_index", None)
+    monkeypatch.setattr(PredictionService, "_feature_template", None)
+    monkeypatch.setattr(PredictionService, "_storage", object())
+    return PredictionService()
+
+
+# --- Test 1: Name resolution
+def test_variants_aliases_and_typos_resolve_to_the_vocabulary(index):
+    """Tests that casing, separators, aliases and misspellings map to the trained symptom names."""
+    column = {name: i for i, name in enumerate(index.classes)}
+    assert normalize_symptom("  Shortness-of_Breath! ") == "shortness of breath"
+    assert index.lookup("Cough") == column["Cough"]
+    assert index.lookup("  sore THROAT ") == column["Sore throat"]
+    assert index.lookup("runnynose") == column["Runny nose"]
+    assert index.lookup("Dyspnea") == column["Shortness of breath"]
+    assert index.lookup("tiredness") == column["Fatigue"]
+    # The fuzzy examples in the module docstring, at the default cutoff
+    assert index.lookup("Feverr") == column["Fever"]
+    assert index.lookup("shortnes of breath") == column["Shortness of breath"]
+    assert index.lookup("Headahce") == column["Headache"]
+    assert index.lookup("Broken leg") is None
+    assert index.lookup("") is None
+
+
+def test_exact_matching_only_when_fuzzy_is_disabled(index):
+    """Tests that a cutoff of 1 turns off the fuzzy fallback but keeps aliases."""
+    strict = SymptomIndex(index.classes, fuzzy_cutoff=1.0)
+    assert strict.lookup("Feverr") is None
+    assert strict.lookup("pyrexia") == index.classes.index("Fever")
+
+
+# --- Test 2: Encoding
+def test_batch_encoding_matches_multilabel_binarizer(index):
+    """Tests that the index lists mark the same columns as the binarizer's rows, and dedupe variants."""
+    batch = [["Cough", "Fever", "Body ache"], [], list(SYMPTOMS), ["Fatigue", "Headache"]]
+    binarizer = MultiLabelBinarizer(classes=index.classes).fit([])
+    expected = [list(np.flatnonzero(row)) for row in binarizer.transform(batch)]
+    assert index.encode_batch(batch) == expected
+    assert index.encode(["cough", "Cough", "COUGHING", "unknown"]) == [index.classes.index("Cough")]
+
+
+def test_features_match_the_binarizer_path(service):
+    """Tests that build_features produces the same model input as transform() + concat did."""
+    record = {
+        "Age": 52, "Gender": "Female", "Heart_Rate_bpm": 90, "Body_Temperature_C": 38.5,
+        "Oxygen_Saturation_%": 94.0, "Systolic_BP": 140, "Diastolic_BP": 90,
+        "symptoms": ["Cough", "Fever", "Body ache"],
+    }
+    df = pd.DataFrame([record])
+    symptoms = df.pop("symptoms")
+    binarizer = service._symptom_binarizer
+    expected = pd.concat([df, pd.DataFrame(binarizer.transform(symptoms), columns=binarizer.classes_)], axis=1)
+    expected = expected[service._model_pipeline.feature_names_in_]
+
+    features = service.build_features([record, dict(record, symptoms=["cough", "FEVER", "body aches"])])
+    pd.testing.assert_frame_equal(features.iloc[[0]], expected, check_dtype=False)
+    pd.testing.assert_frame_equal(features.iloc[[1]].reset_index(drop=True), expected, check_dtype=False)
+    with pytest.raises(ValueError):
+        service.build_features([{"Age": 52}])
@@ -0,0 +1,79 @@
+import asyncio
+import io
+import os
+import sys
+import zipfile
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.core.uploads import UploadTooLargeError, iter_zip_images, read_stream_limited
+
+
+def make_zip(entries: dict) -> bytearray:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data in entries.items():
+            zf.writestr(name, data)
+    return bytearray(buffer.getvalue())
+
+
+def entry_offsets(archive: bytearray, name: str) -> tuple:
+    """Offsets of an entry's local header and of its compressed data."""
+    info = zipfile.ZipFile(io.BytesIO(bytes(archive))).getinfo(name)
+    return info.header_offset, info.header_offset + 30 + len(info.filename) + len(info.extra)
+
+
+async def stream(*chunks: bytes):
+    for chunk in chunks:
+        yield chunk
+
+
+def read(*chunks: bytes, limit: int, size_hint=None) -> memoryview:
+    return asyncio.run(read_stream_limited(stream(*chunks), limit=limit, size_hint=size_hint))
+
+
+# --- Test 1: Streamed bodies
+def test_declared_size_is_not_preallocated():
+    """Tests that a client claiming a large body only costs the bytes it actually sends."""
+    body = read(b"abc", b"", b"de", limit=20 * 1024 * 1024, size_hint=20 * 1024 * 1024)
+    assert bytes(body) == b"abcde"
+    assert len(body.obj) == 5  # the buffer behind the view holds only what was received
+    assert bytes(read(b"abc", b"defgh", limit=100, size_hint=3)) == b"abcdefgh"  # hint too small
+
+
+def test_limit_is_enforced_on_declared_and_received_size():
+    """Tests that an over-limit declared size is rejected up front and a lying client mid-stream."""
+    with pytest.raises(UploadTooLargeError):
+        read(b"a", limit=10, size_hint=11)
+    with pytest.raises(UploadTooLargeError):
+        read(b"12345", b"678901", limit=10, size_hint=4)
+
+
+# --- Test 2: Unreadable entries are reported per file
+def test_corrupt_and_encrypted_entries_are_yielded_as_errors():
+    """Tests that entries that cannot be extracted yield an error and the other entries still read."""
+    archive = make_zip({"a.png": b"first" * 100, "corrupt.png": b"x" * 5000, "locked.png": b"y" * 100, "b.png": b"last"})
+    _, data_start = entry_offsets(archive, "corrupt.png")
+    for i in range(data_start + 2, data_start + 12):
+        archive[i] ^= 0xFF
+    # Mark locked.png as encrypted in its local and central headers
+    header, _ = entry_offsets(archive, "locked.png")
+    archive[header + 6] |= 0x1
+    central = archive.rfind(b"locked.png") - 46  # the central directory follows all entries
+    archive[central + 8] |= 0x1
+
+    results = dict(iter_zip_images(bytes(archive), max_files=10))
+    assert results["a.png"] == b"first" * 100
+    assert results["b.png"] == b"last"
+    for name in ("corrupt.png", "locked.png"):
+        assert isinstance(results[name], ValueError)
+        assert str(results[name]).startswith("Could not extract file from archive")
+
+
+def test_oversized_entries_are_yielded_as_errors():
+    """Tests that an entry over the per-file limit yields UploadTooLargeError without being read."""
+    results = dict(iter_zip_images(bytes(make_zip({"big.png": b"z" * 2048, "ok.png": b"ok"})), 10, max_entry_bytes=1024))
+    assert isinstance(results["big.png"], UploadTooLargeError)
+    assert results["ok.png"] == b"ok"